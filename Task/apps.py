@@ -7,3 +7,6 @@ class TaskConfig(AppConfig):
 
     def ready(self):
         import Task.signals
+        from django.db.models.signals import post_migrate
+        from Task.search import ensure_sqlite_search_triggers
+        post_migrate.connect(ensure_sqlite_search_triggers, sender=self)
@@ -0,0 +1,258 @@
+"""
+Hot/cold archival of completed tasks.
+
+Tasks completed more than TASK_ARCHIVE_AFTER_DAYS days ago are moved, with
+their collaborators, history and notifications, into the Archived* tables
+by `archive_completed_tasks` (cron/celery beat or the `archive_tasks`
+management command). Everything that reads Tasks (the board, search,
+stats, exports) then only pays for live rows; the task list and search
+read both tables with `?include_archived=true`, and `unarchive_tasks`
+(POST /api/tasks/<pk>/unarchive/) moves tasks back.
+
+Rows keep their primary keys. Tasks ids come from a sequence that never
+hands an id out twice, so a task has the same id in either table and the
+two can be paginated as one list. Archived tasks leave the task counters
+(GET /api/tasks/stats/ counts live tasks) and the full-text index, so
+include_archived search matches them with icontains.
+"""
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField, Q, Value
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .cache import bulk_invalidation, invalidate_users
+from .fastpath import TaskRowSerializer, task_row_serializer
+from .models import (
+    ArchivedNotification, ArchivedTask, ArchivedTaskHistory, Notification, TaskCounter, TaskHistory, Tasks,
+)
+from .serializers import ArchivedTaskSerializer
+
+ARCHIVE_AFTER_DAYS = 90
+TASK_COLUMNS = [field.attname for field in Tasks._meta.concrete_fields]
+# (live model, archive model), moved along with their tasks.
+TASK_RELATIONS = [(TaskHistory, ArchivedTaskHistory), (Notification, ArchivedNotification)]
+
+
+def archive_cutoff(now=None, days=None):
+    if days is None:
+        days = getattr(settings, "TASK_ARCHIVE_AFTER_DAYS", ARCHIVE_AFTER_DAYS)
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def archive_completed_tasks(older_than=None, now=None, batch_size=500, pause=0.0):
+    """
+    Archive every task completed before `older_than` (default: the
+    TASK_ARCHIVE_AFTER_DAYS cutoff), oldest first, except those unarchived
+    since then. Each batch is found on the partial completed_at index and
+    moved in its own short transaction; `pause` seconds between batches let
+    other writers in on SQLite's single write lock. Safe to interrupt and
+    re-run.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    cutoff = older_than or archive_cutoff(now)
+    candidates = Tasks.objects.filter(
+        Q(unarchived_at__isnull=True) | Q(unarchived_at__lte=cutoff), status="completed", completed_at__lte=cutoff,
+    ).order_by("completed_at", "id")
+
+    totals = {"tasks": 0, "collaborators": 0, "history": 0, "notifications": 0}
+    batches = 0
+    while True:
+        ids = list(candidates.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        for key, moved in archive_tasks(ids, now=now).items():
+            totals[key] += moved
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "cutoff": cutoff,
+        **totals,
+        "batches": batches,
+        "seconds": round(elapsed, 4),
+        "tasks_per_second": round(totals["tasks"] / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def archive_tasks(ids, now=None):
+    """
+    Move the given tasks and their related rows into the archive in one
+    transaction, whatever their status. Returns the rows moved per kind.
+    """
+    now = now or timezone.now()
+    with transaction.atomic(), bulk_invalidation():
+        tasks = list(Tasks.objects.select_for_update().filter(pk__in=ids))
+        ids = [task.pk for task in tasks]
+        if not ids:
+            return {"tasks": 0, "collaborators": 0, "history": 0, "notifications": 0}
+        # The successor's link to this task is nulled by the delete below;
+        # remember it so unarchiving can restore it.
+        successors = dict(ArchivedTask.objects.filter(previous_occurrence_id__in=ids).values_list(
+            "previous_occurrence_id", "id"
+        ))
+        successors.update(Tasks.objects.filter(previous_occurrence_id__in=ids).values_list("previous_occurrence_id", "id"))
+        ArchivedTask.objects.bulk_create([
+            ArchivedTask(
+                **{name: getattr(task, name) for name in TASK_COLUMNS},
+                next_occurrence_id=successors.get(task.pk),
+                archived_at=now,
+            )
+            for task in tasks
+        ])
+        moved = {"tasks": len(tasks), "collaborators": _copy_collaborators(Tasks, ArchivedTask, ids)}
+        for (model, archive_model), key in zip(TASK_RELATIONS, ("history", "notifications")):
+            moved[key] = len(_copy_rows(model.objects.filter(task_id__in=ids), archive_model))
+        audience = {task.user_id for task in tasks} | set(ArchivedTask.collaborators.through.objects.filter(
+            archivedtask_id__in=ids
+        ).values_list("customuser_id", flat=True))
+
+        Tasks.objects.filter(pk__in=ids).delete()
+        TaskCounter.objects.record((task.counted_state(), None) for task in tasks)
+        invalidate_users(audience)
+    return moved
+
+
+def unarchive_tasks(ids, user=None):
+    """
+    Move archived tasks (only `user`'s, if given) back into Tasks with their
+    related rows and recurrence links, stamped with unarchived_at so the
+    next archive_completed_tasks run leaves them alone. Returns the ids
+    restored.
+    """
+    now = timezone.now()
+    with transaction.atomic(), bulk_invalidation():
+        archived = ArchivedTask.objects.select_for_update().filter(pk__in=ids)
+        if user is not None:
+            archived = archived.filter(user=user)
+        archived = list(archived)
+        ids = [task.pk for task in archived]
+        if not ids:
+            return []
+
+        # A predecessor link is kept if the predecessor comes back too, or is
+        # live and has not had another successor meanwhile.
+        restoring = set(ids)
+        predecessors = {task.previous_occurrence_id for task in archived} - restoring - {None}
+        linkable = restoring | set(Tasks.objects.filter(
+            pk__in=predecessors, next_occurrence__isnull=True
+        ).values_list("pk", flat=True))
+        rows = []
+        for task in archived:
+            row = {name: getattr(task, name) for name in TASK_COLUMNS}
+            row["unarchived_at"] = now
+            if row["previous_occurrence_id"] not in linkable:
+                row["previous_occurrence_id"] = None
+            rows.append(row)
+        _insert_rows(Tasks, rows)
+        for task in archived:
+            if task.next_occurrence_id is not None:
+                Tasks.objects.filter(pk=task.next_occurrence_id, previous_occurrence__isnull=True).update(
+                    previous_occurrence_id=task.pk
+                )
+
+        _copy_collaborators(ArchivedTask, Tasks, ids)
+        for model, archive_model in TASK_RELATIONS:
+            _copy_rows(archive_model.objects.filter(task_id__in=ids), model)
+        audience = {task.user_id for task in archived} | set(Tasks.collaborators.through.objects.filter(
+            tasks_id__in=ids
+        ).values_list("customuser_id", flat=True))
+
+        ArchivedTask.objects.filter(pk__in=ids).delete()
+        TaskCounter.objects.record((None, task.counted_state()) for task in archived)
+        invalidate_users(audience)
+    return ids
+
+
+def _copy_collaborators(source, target, ids):
+    """Copy the collaborator rows of tasks `ids` from `source`'s M2M table to `target`'s."""
+    source_field, target_field = (model._meta.get_field("collaborators") for model in (source, target))
+    rows = source_field.remote_field.through.objects.filter(
+        **{f"{source_field.m2m_field_name()}_id__in": ids}
+    ).values_list(f"{source_field.m2m_field_name()}_id", f"{source_field.m2m_reverse_field_name()}_id")
+    through = target_field.remote_field.through
+    task_column, user_column = f"{target_field.m2m_field_name()}_id", f"{target_field.m2m_reverse_field_name()}_id"
+    return len(through.objects.bulk_create([
+        through(**{task_column: task_id, user_column: user_id}) for task_id, user_id in rows
+    ]))
+
+
+def _copy_rows(queryset, model):
+    """Insert the rows of `queryset` into `model`'s table, primary keys included."""
+    names = [field.attname for field in model._meta.concrete_fields]
+    return _insert_rows(model, [dict(zip(names, row)) for row in queryset.values_list(*names)])
+
+
+def _insert_rows(model, rows):
+    """
+    bulk_create `rows` ({attname: value}) as `model` instances. auto_now and
+    auto_now_add fields are overwritten on insert, so those are written
+    again afterwards.
+    """
+    objs = model.objects.bulk_create([model(**row) for row in rows])
+    stamped = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    if stamped and objs:
+        for obj, row in zip(objs, rows):
+            for name in stamped:
+                setattr(obj, name, row[name])
+        model.objects.bulk_update(objs, stamped, batch_size=500)
+    return objs
+
+
+def include_archived(request):
+    value = request.query_params.get("include_archived", "")
+    return value.lower() in ("1", "true", "yes")
+
+
+archived_row_serializer = TaskRowSerializer(ArchivedTaskSerializer)
+
+
+class ArchivedListMixin:
+    """
+    `?include_archived=true` for the task list: live tasks and those of
+    get_archived_queryset() filtered, ordered and keyset-paginated as one
+    list, through the fast path. Every row then has archived_at, null for
+    live tasks.
+    """
+    def list(self, request, *args, **kwargs):
+        if not include_archived(request):
+            return super().list(request, *args, **kwargs)
+        return self.list_with_archived(request)
+
+    async def alist(self, request, *args, **kwargs):
+        if not include_archived(request):
+            return await super().alist(request, *args, **kwargs)
+        return await sync_to_async(self.list_with_archived)(request)
+
+    def get_archived_queryset(self):
+        raise NotImplementedError
+
+    def list_with_archived(self, request):
+        live = self.filter_queryset(self.get_queryset()).annotate(archived_at=Value(None, output_field=DateTimeField()))
+        archived = self.filter_queryset(self.get_archived_queryset())
+        querysets = [archived_row_serializer.rows(live), archived_row_serializer.rows(archived)]
+        if self.paginator is None:
+            rows = [row for queryset in querysets for row in queryset]
+        else:
+            rows = self.paginator.paginate_querysets(querysets, request, view=self)
+
+        collaborators = task_row_serializer.collaborator_map([row.id for row in rows if row.archived_at is None])
+        collaborators.update(archived_row_serializer.collaborator_map(
+            [row.id for row in rows if row.archived_at is not None]
+        ))
+        data = archived_row_serializer.convert_rows(rows, collaborators)
+        if self.paginator is None:
+            return Response(data)
+        return self.get_paginated_response(data)
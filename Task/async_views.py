@@ -0,0 +1,229 @@
+"""
+Async versions of the task endpoints, for Task_Management/asgi.py.
+
+TASK_ASYNC_VIEWS picks which routes use them ("*" for all); task_path()
+switches a route per request, so the setting can also be overridden in
+tests. The views reuse their sync counterparts' configuration, serializers
+and permission classes; only dispatch and the queries change. Credentials
+and the rows a response reads are loaded through Django's async ORM (aget,
+acount, async iteration), so a request waiting on the database holds no
+worker thread of its own.
+
+Writes run their validation and save in one sync_to_async call. TaskSerializer
+looks up categories and collaborators, and Tasks.save, the transition
+service and the counters all use transaction.atomic, which Django only
+supports in sync code. Model.asave() would make the same hop.
+
+Under WSGI Django runs every async view in an event loop of its own, so
+enable them only when serving asgi.py.
+"""
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.urls import URLPattern, ResolverMatch
+from django.urls.resolvers import RoutePattern
+from rest_framework import exceptions, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from .models import Tasks
+from .serializers import TaskSerializer
+from .views import TaskDetailView, TaskListCreateView
+
+
+def async_selected(name):
+    selected = getattr(settings, "TASK_ASYNC_VIEWS", ())
+    return "*" in selected or name in selected
+
+
+class TaskRoute(URLPattern):
+    """A URL pattern that resolves to `async_view` while TASK_ASYNC_VIEWS selects it."""
+
+    def __init__(self, pattern, view, async_view, name):
+        super().__init__(pattern, view, name=name)
+        self.async_view = async_view
+
+    def resolve(self, path):
+        match = super().resolve(path)
+        if match is not None and async_selected(self.name):
+            match = ResolverMatch(
+                self.async_view, match.args, match.kwargs, match.url_name, route=match.route,
+                captured_kwargs=match.captured_kwargs, extra_kwargs=match.extra_kwargs,
+            )
+        return match
+
+
+def task_path(route, view, async_view, name):
+    """path() for an endpoint with a sync and an async view."""
+    return TaskRoute(RoutePattern(route, name=name, is_endpoint=True), view, async_view, name)
+
+
+class AsyncAPIViewMixin:
+    """
+    APIView.dispatch() as a coroutine. Authentication uses an
+    authenticator's aauthenticate() when it has one; content negotiation,
+    permissions, throttles and exception handling are DRF's own and never
+    touch the database.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return await self.arender(self.response)
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        # Request._authenticate(), awaiting the authenticators.
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, "aauthenticate"):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def arender(self, response):
+        """
+        Return a plain HttpResponse. Django renders anything with a render()
+        method in a thread; JSON needs no thread, other renderers (the
+        browsable API) may query the database and still get one.
+        """
+        if not hasattr(response, "render"):
+            return response
+        if isinstance(response.accepted_renderer, JSONRenderer):
+            response.render()
+        else:
+            await sync_to_async(response.render)()
+        return HttpResponse(response.content, status=response.status_code, headers=response.headers)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except queryset.model.DoesNotExist:
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class AsyncListModelMixin:
+    """
+    End of the alist() chain. Listed after the sync view, so the
+    CachedListMixin and FastListMixin alist() run first, as their list()
+    does.
+    """
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([obj async for obj in queryset], many=True).data)
+
+    async def afilter_queryset(self, queryset):
+        # FullTextSearchFilter inspects the database's tables to pick a backend.
+        if self.request.query_params.get(api_settings.SEARCH_PARAM):
+            return await sync_to_async(self.filter_queryset)(queryset)
+        return self.filter_queryset(queryset)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+
+class AsyncTaskListCreateView(AsyncAPIViewMixin, TaskListCreateView, AsyncListModelMixin):
+    cache_namespace = "TaskListCreateView"  # pages are shared with the sync view
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.create)(request, *args, **kwargs)
+
+
+class AsyncTaskDetailView(AsyncAPIViewMixin, TaskDetailView):
+    async def get(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+    async def put(self, request, *args, **kwargs):
+        return await self.aupdate(request, partial=False)
+
+    async def patch(self, request, *args, **kwargs):
+        return await self.aupdate(request, partial=True)
+
+    async def delete(self, request, *args, **kwargs):
+        await sync_to_async(self.perform_destroy)(await self.aget_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    async def aupdate(self, request, partial):
+        instance = await self.aget_object()
+
+        def update():
+            serializer = self.get_serializer(instance, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+            if getattr(instance, "_prefetched_objects_cache", None):
+                instance._prefetched_objects_cache = {}
+            return serializer.data
+
+        return Response(await sync_to_async(update)())
+
+
+class AsyncTaskTransitionView(AsyncAPIViewMixin, APIView):
+    """The mark_task_<status> views: move one of your tasks to `target`."""
+    permission_classes = [IsAuthenticated]
+    target = None
+    not_found = "Task not found."
+
+    async def patch(self, request, pk):
+        try:
+            task = await Tasks.objects.with_related().aget(pk=pk, user=request.user)
+        except Tasks.DoesNotExist:
+            return Response({"error": self.not_found}, status=status.HTTP_404_NOT_FOUND)
+
+        # Only `status` is submitted, so validation needs no queries.
+        serializer = TaskSerializer(task, data={"status": self.target}, partial=True, context={"request": request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        def save():
+            serializer.save()
+            return serializer.data
+
+        return Response(await sync_to_async(save)())
@@ -0,0 +1,171 @@
+"""
+JWT authentication that resolves the token's user from memory.
+
+simplejwt's JWTAuthentication loads the user with a SELECT on every request.
+CachedJWTAuthentication keeps recently seen users' rows in a small
+in-process LRU for TASK_AUTH_USER_CACHE_TTL seconds, tagged with a per-user
+version kept in the response cache (see Task/cache.py). Saving or deleting
+a user bumps its version, so deactivation, password changes and deletion
+apply to the very next request in every worker sharing that cache. Writes
+that bypass model signals (queryset.update()) must call bump_user_version()
+themselves.
+
+A worker can only see another's bumps through a shared backend, so by
+default (TASK_AUTH_USER_CACHE = None) the cache is only used when
+TASK_RESPONSE_CACHE is not process-local. Set it to True to use it anyway
+in a single-process deployment.
+
+Cached entries hold field values, not instances: each request gets its own
+fresh user object.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import bump_version, get_version, is_shared_cache
+
+VERSION_KEY = "authuser:ver:{}"
+
+
+def get_user_version(user_id):
+    return get_version(VERSION_KEY.format(user_id))
+
+
+def bump_user_version(user):
+    """Drop `user` from every worker's cache, now and again once committed."""
+    user_id = getattr(user, api_settings.USER_ID_FIELD)
+    key = VERSION_KEY.format(user_id)
+    bump_version(key)
+    transaction.on_commit(lambda: bump_version(key))
+
+
+class UserCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            entry_version, expires, values = entry
+            if entry_version != version or expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def put(self, user_id, version, values):
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def user_cache_enabled():
+    enabled = getattr(settings, "TASK_AUTH_USER_CACHE", None)
+    return is_shared_cache() if enabled is None else enabled
+
+
+@lru_cache(maxsize=None)
+def get_user_cache():
+    return UserCache(
+        getattr(settings, "TASK_AUTH_USER_CACHE_SIZE", 1024),
+        getattr(settings, "TASK_AUTH_USER_CACHE_TTL", 60),
+    )
+
+
+@receiver(setting_changed)
+def reset_user_cache(setting, **kwargs):
+    if setting.startswith("TASK_AUTH_USER_CACHE"):
+        get_user_cache.cache_clear()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not user_cache_enabled():
+            return super().get_user(validated_token)
+        return self.check_user(self.load_user(self.user_id(validated_token)), validated_token)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: the user is loaded with the async ORM."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        return self.check_user(await self.aload_user(self.user_id(validated_token)), validated_token)
+
+    def user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+    def load_user(self, user_id):
+        version, user = self.cached_user(user_id)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            self.remember_user(user_id, version, user)
+        return user
+
+    async def aload_user(self, user_id):
+        version, user = self.cached_user(user_id)
+        if user is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            self.remember_user(user_id, version, user)
+        return user
+
+    def cached_user(self, user_id):
+        """(version, user or None) from the caches alone, so async views call it directly."""
+        if not user_cache_enabled():
+            return None, None
+        # Read the version before the row: a save racing with the SELECT
+        # bumps it after, so the entry stored below is already stale.
+        version = get_user_version(user_id)
+        cached = get_user_cache().get(user_id, version)
+        if cached is None:
+            return version, None
+        db, values = cached
+        return version, self.user_model.from_db(db, self.user_fields(), values)
+
+    def remember_user(self, user_id, version, user):
+        if version is not None:
+            get_user_cache().put(user_id, version, (user._state.db, tuple(getattr(user, name) for name in self.user_fields())))
+
+    def user_fields(self):
+        return [field.attname for field in self.user_model._meta.concrete_fields]
@@ -0,0 +1,1108 @@
+"""
+Benchmarks run with `python manage.py benchmark <name>`.
+
+Each benchmark seeds its own data inside a transaction that is rolled back
+afterwards, so it can be pointed at a development database safely. Those
+registered with atomic=False need their data visible to other threads; they
+commit it and delete it again when they finish.
+"""
+import asyncio
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from .models import Tasks
+
+User = get_user_model()
+BENCHMARKS = {}
+
+WORDS = [
+    "".join(random.Random(i).choice("abcdefghijklmnopqrstuvwxyz") for _ in range(random.Random(-i).randint(4, 9)))
+    for i in range(2000)
+]
+
+
+def benchmark(name, atomic=True):
+    def register(func):
+        func.atomic = atomic
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def run_benchmark(name, **options):
+    func = BENCHMARKS[name]
+    if not func.atomic:
+        return func(**options)
+    with transaction.atomic():
+        result = func(**options)
+        transaction.set_rollback(True)
+    return result
+
+
+def measure(func, repeat):
+    """Call func `repeat` times and summarise wall time in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarise(timings)
+
+
+def retry_locked(func, attempts=50, delay=0.01):
+    """
+    (func(), retries), calling func again after an OperationalError such as
+    SQLite's "database table is locked", `delay` seconds apart. The error of
+    the last of `attempts` calls is raised, so a lasting lock or a real
+    schema error still fails the benchmark.
+    """
+    for retries in range(attempts):
+        try:
+            return func(), retries
+        except OperationalError:
+            if retries == attempts - 1:
+                raise
+            time.sleep(delay)
+
+
+def summarise(timings):
+    timings = sorted(timings)
+    return {
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+    }
+
+
+LOWER_IS_BETTER = ("_ms", "_us", "_kib", "queries_per_request")
+HIGHER_IS_BETTER = ("_per_s",)
+
+
+def compare(result, baseline, tolerance=0.2, floor_ms=1.0, path="", unit=None):
+    """
+    Regressions of `result` against a stored `baseline` run of the same
+    benchmark: timings, memory and rates that got worse by more than
+    `tolerance` (timings also by more than `floor_ms`, so sub-millisecond
+    noise isn't flagged) and any increase in queries per request. A key's
+    suffix (`_ms`, `_per_s`, ...) gives its unit, or that of the values
+    under it, as in {"per_call_us": {"local": 1.5}}.
+    """
+    regressions = []
+    for key, current in result.items():
+        metric = f"{path}.{key}" if path else str(key)
+        before = baseline.get(key)
+        key_unit = key if str(key).endswith(LOWER_IS_BETTER + HIGHER_IS_BETTER) else unit
+        if isinstance(current, dict) and isinstance(before, dict):
+            regressions.extend(compare(current, before, tolerance, floor_ms, metric, key_unit))
+            continue
+        if not isinstance(current, (int, float)) or not isinstance(before, (int, float)) or isinstance(current, bool):
+            continue
+        if key_unit is None:
+            continue
+        if key_unit == "queries_per_request":
+            worse = current > before
+        elif key_unit.endswith(LOWER_IS_BETTER):
+            worse = current > before * (1 + tolerance) and (not key_unit.endswith("_ms") or current - before > floor_ms)
+        else:
+            worse = current < before * (1 - tolerance)
+        if worse:
+            change = f"{(current - before) / before:+.0%}" if before else "new"
+            regressions.append({"metric": metric, "baseline": before, "current": current, "change": change})
+    return regressions
+
+
+def sentence(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def seed_tasks(user, rows, rng, batch_size=5000, **fields):
+    now = timezone.now()
+    for start in range(0, rows, batch_size):
+        Tasks.objects.bulk_create([
+            Tasks(
+                title=sentence(rng, 4),
+                description=sentence(rng, 16),
+                due_date=now + timedelta(minutes=rng.randint(1, 60 * 24 * 365)),
+                user=user,
+                **fields,
+            )
+            for _ in range(min(batch_size, rows - start))
+        ])
+
+
+def seed_user(username="bench"):
+    return User.objects.create(username=username, email=f"{username}@example.com")
+
+
+@benchmark("search")
+def search_benchmark(rows=100_000, repeat=20, seed=0):
+    """
+    icontains SearchFilter path vs. the full-text index for one user's tasks.
+    "hit" searches a word from the vocabulary, "miss" one that never occurs
+    (icontains then has to read every row); "ranked" is the type-ahead
+    endpoint query on a 4-letter prefix.
+    """
+    from .search import IContainsSearchBackend, get_search_backend
+
+    rng = random.Random(seed)
+    user = seed_user()
+    seed_tasks(user, rows, rng)
+    queryset = Tasks.objects.filter(user=user)
+    native = get_search_backend(queryset.db)
+    hits = [rng.choice(WORDS) for _ in range(repeat)]
+    misses = [f"zz{i}qx" for i in range(repeat)]
+
+    def first_page(backend, terms):
+        terms = iter(terms)
+        return lambda: list(backend.filter(queryset, next(terms)).order_by("due_date", "id")[:50])
+
+    def ranked(terms):
+        terms = iter(terms)
+        return lambda: native.ranked(queryset, next(terms)[:4], prefix=True, limit=20)
+
+    results = {"rows": rows, "backend": native.name}
+    for label, terms in (("hit", hits), ("miss", misses)):
+        results[label] = {
+            "icontains": measure(first_page(IContainsSearchBackend(), terms), repeat),
+            "index": measure(first_page(native, terms), repeat),
+        }
+    results["ranked_prefix"] = measure(ranked(hits), repeat)
+    return results
+
+
+@benchmark("serialization")
+def serialization_benchmark(rows=None, repeat=3, seed=0, chunk=1000):
+    """
+    TaskSerializer vs. the values_list fast path (Task/fastpath.py), both
+    including their queries. Rows are serialized `chunk` at a time, i.e. as a
+    run of large list pages; every tenth task has a collaborator.
+    """
+    from .fastpath import task_row_serializer
+    from .serializers import TaskSerializer
+
+    rng = random.Random(seed)
+    user = seed_user()
+    friend = seed_user("bench-friend")
+    results = {"chunk": chunk, "sizes": {}}
+    seeded = 0
+    for size in ([rows] if rows else [1_000, 10_000, 100_000]):
+        seed_tasks(user, size - seeded, rng)
+        seeded = size
+        ids = list(Tasks.objects.filter(user=user).order_by("id").values_list("id", flat=True))
+        Tasks.collaborators.through.objects.bulk_create(
+            [Tasks.collaborators.through(tasks_id=task_id, customuser_id=friend.pk) for task_id in ids[::10]],
+            ignore_conflicts=True,
+        )
+        chunks = [ids[start:start + chunk] for start in range(0, len(ids), chunk)]
+
+        def drf():
+            for page in chunks:
+                TaskSerializer(Tasks.objects.filter(pk__in=page).with_related(), many=True).data
+
+        def fast():
+            for page in chunks:
+                task_row_serializer.serialize(task_row_serializer.rows(Tasks.objects.filter(pk__in=page)))
+
+        sizes = {}
+        for label, func in (("serializer", drf), ("fast_path", fast)):
+            timing = measure(func, repeat)
+            timing["rows_per_second"] = round(size / (timing["p50_ms"] / 1000))
+            sizes[label] = timing
+        sizes["speedup"] = round(sizes["serializer"]["p50_ms"] / sizes["fast_path"]["p50_ms"], 2)
+        results["sizes"][size] = sizes
+    return results
+
+
+@benchmark("recurrence")
+def recurrence_benchmark(rows=10_000, repeat=3, seed=0, days=365):
+    """
+    Expand `rows` recurring tasks (mixed daily/weekly/monthly, interval 1-3)
+    over a `days` window, as GET /api/tasks/occurrences/ does, without
+    writing a row per occurrence.
+    """
+    from .services import expand_occurrences
+
+    rng = random.Random(seed)
+    user = seed_user()
+    now = timezone.now()
+    for start in range(0, rows, 5000):
+        Tasks.objects.bulk_create([
+            Tasks(
+                title=sentence(rng, 4),
+                description=sentence(rng, 8),
+                due_date=now + timedelta(minutes=rng.randint(1, 60 * 24 * 30)),
+                user=user,
+                recurrence=rng.choice(["daily", "weekly", "monthly"]),
+                recurrence_interval=rng.randint(1, 3),
+            )
+            for _ in range(min(5000, rows - start))
+        ])
+    queryset = Tasks.objects.filter(user=user)
+    end = now + timedelta(days=days)
+
+    occurrences = sum(1 for _ in expand_occurrences(queryset, now, end))
+    full = measure(lambda: sum(1 for _ in expand_occurrences(queryset, now, end)), repeat)
+    full["occurrences_per_second"] = round(occurrences / (full["p50_ms"] / 1000))
+    first_page = measure(lambda: list(expand_occurrences(queryset, now, end, limit=1000)), repeat)
+    return {"rows": rows, "days": days, "occurrences": occurrences, "full_window": full, "first_1000": first_page}
+
+
+class StreamClient:
+    """Drives one request through an ASGI app the way a server would."""
+
+    def __init__(self, app, headers=(), query=b"", path="/api/notifications/stream/"):
+        self.messages = asyncio.Queue()
+        self.closed = asyncio.Event()
+        self.status = None
+        self.body = b""
+        scope = {
+            "type": "http", "method": "GET", "path": path, "query_string": query,
+            "headers": [(name.lower(), value) for name, value in headers],
+        }
+        self.task = asyncio.create_task(app(scope, self.receive, self.messages.put))
+
+    async def receive(self):
+        await self.closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def read_until(self, marker, timeout=5):
+        async with asyncio.timeout(timeout):
+            while marker not in self.body:
+                message = await self.messages.get()
+                if message["type"] == "http.response.start":
+                    self.status = message["status"]
+                else:
+                    self.body += message.get("body", b"")
+                    if not message.get("more_body"):
+                        break
+        return self.body
+
+    async def close(self):
+        self.closed.set()
+        await self.task
+
+
+@benchmark("event_streams")
+def event_streams_benchmark(rows=1_000, repeat=5):
+    """
+    Hold `rows` idle notification streams (one user each) open on this
+    process, then time how long one published event takes to reach all of
+    them. Reports the Python heap and threads the open streams cost.
+    """
+    from asgiref.sync import async_to_sync, sync_to_async
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from .events import EventStreamApp, LocalHub, get_hub
+
+    users = User.objects.bulk_create([
+        User(username=f"stream-{i}", email=f"stream-{i}@example.com") for i in range(rows)
+    ])
+    headers = [[(b"authorization", f"Bearer {AccessToken.for_user(user)}".encode())] for user in users]
+    app = EventStreamApp(None)
+    hub = get_hub()
+    if not isinstance(hub, LocalHub):
+        raise TypeError("The event_streams benchmark needs an in-process hub.")
+
+    async def run():
+        threads = threading.active_count()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        clients = [StreamClient(app, header) for header in headers]
+        await asyncio.gather(*(client.read_until(b"retry:", timeout=60) for client in clients))
+        connect_s = time.perf_counter() - started
+        held = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        result = {
+            "streams": rows,
+            "connect_s": round(connect_s, 3),
+            "heap_per_stream_kib": round(held / rows / 1024, 2),
+            "threads_added": threading.active_count() - threads,
+            "subscribers": hub.subscriber_count(),
+        }
+
+        timings = []
+        for round_ in range(repeat):
+            marker = f"round-{round_}".encode()
+            started = time.perf_counter()
+            # Published from another thread, as a committing request would.
+            await sync_to_async(
+                lambda: [hub.publish(user.pk, [(round_, f'"round-{round_}"')]) for user in users],
+                thread_sensitive=False,
+            )()
+            await asyncio.gather(*(client.read_until(marker) for client in clients))
+            timings.append((time.perf_counter() - started) * 1000)
+        result["fanout"] = summarise(timings)
+
+        await asyncio.gather(*(client.close() for client in clients))
+        result["open_after_disconnect"] = hub.subscriber_count()
+        return result
+
+    return async_to_sync(run)()
+
+
+@benchmark("throttle")
+def throttle_benchmark(rows=1_000, repeat=10, calls=200):
+    """
+    Cost of one throttle check for a user who already has `rows` requests
+    in the window: DRF's UserRateThrottle (a timestamp list in the default
+    cache) vs. the GCRA throttle on LocalStore, CacheStore (the default
+    cache) and SQLiteStore. Rates are
+    set high enough that every call is allowed, i.e. every call writes.
+    """
+    import tempfile
+    from types import SimpleNamespace
+
+    from django.test import override_settings
+    from rest_framework import throttling as drf_throttling
+
+    from . import throttling
+
+    rate = f"{rows + repeat * calls + 1}/day"
+    request = SimpleNamespace(user=User(pk=10**9), META={})
+
+    def per_call_us(throttle_class):
+        throttle = type("BenchThrottle", (throttle_class,), {"rate": rate, "scope": "bench"})()
+        key = throttle.get_cache_key(request, None)
+        throttle.cache.delete(key)
+        for _ in range(rows):
+            throttle.allow_request(request, None)
+        history = throttle.cache.get(key)
+        timings = []
+        for _ in range(repeat):
+            if history is not None:
+                throttle.cache.set(key, history, throttle.duration)  # back to `rows` timestamps
+            started = time.perf_counter()
+            for _ in range(calls):
+                throttle.allow_request(request, None)
+            timings.append((time.perf_counter() - started) / calls * 1e6)
+        return round(statistics.median(timings), 2)
+
+    results = {"history": rows, "calls": calls, "per_call_us": {}}
+    results["per_call_us"]["drf_timestamp_list"] = per_call_us(drf_throttling.UserRateThrottle)
+    with tempfile.TemporaryDirectory() as directory:
+        for label, store, options in (
+            ("gcra_local", "Task.throttling.LocalStore", {}),
+            ("gcra_cache", "Task.throttling.CacheStore", {}),
+            ("gcra_sqlite", "Task.throttling.SQLiteStore", {"path": f"{directory}/throttle.sqlite3"}),
+        ):
+            with override_settings(TASK_THROTTLE_STORE=store, TASK_THROTTLE_STORE_OPTIONS=options):
+                results["per_call_us"][label] = per_call_us(throttling.UserRateThrottle)
+    return results
+
+
+@benchmark("auth")
+def auth_benchmark(rows=50, repeat=50):
+    """
+    Queries and wall time per request on the task endpoints with a real JWT,
+    resolving the user with a SELECT per request (TASK_AUTH_USER_CACHE off)
+    vs. from the in-process user cache. Requests go straight to the views,
+    so the numbers are for DRF's request handling without middleware.
+    """
+    from django.conf import settings
+    from django.db import connection
+    from django.test import override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import resolve
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    user = seed_user()
+    seed_tasks(user, rows, random.Random(0))
+    task_id = Tasks.objects.filter(user=user).values_list("id", flat=True).first()
+    factory = APIRequestFactory(SERVER_NAME=(settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip("."))
+    header = f"Bearer {AccessToken.for_user(user)}"
+    endpoints = ["/api/tasks/", f"/api/tasks/{task_id}/", "/api/tasks/stats/", "/api/notifications/unread-count/"]
+
+    def call(path):
+        match = resolve(path)
+        response = match.func(factory.get(path, HTTP_AUTHORIZATION=header), *match.args, **match.kwargs)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} answered {response.status_code}")
+
+    results = {}
+    for path in endpoints:
+        results[path] = {}
+        for label, enabled in (("select_per_request", False), ("user_cache", True)):
+            with override_settings(TASK_AUTH_USER_CACHE=enabled):
+                call(path)  # warm the user and response caches
+                with CaptureQueriesContext(connection) as ctx:
+                    timing = measure(lambda: call(path), repeat)
+                timing["queries_per_request"] = round(len(ctx.captured_queries) / repeat, 2)
+                results[path][label] = timing
+        results[path]["queries_saved"] = round(
+            results[path]["select_per_request"]["queries_per_request"] - results[path]["user_cache"]["queries_per_request"], 2
+        )
+    return results
+
+
+@benchmark("token_purge")
+def token_purge_benchmark(rows=1_000_000, repeat=50, seed=0, expired_share=0.9):
+    """
+    Refresh-token rotation (TokenRefreshView's serializer) with `rows`
+    accumulated outstanding tokens, nine in ten of them expired and each
+    rotated one blacklisted, before and after purge_expired_tokens.
+    """
+    import uuid
+
+    from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from .sweeps import purge_expired_tokens
+
+    rng = random.Random(seed)
+    user = seed_user()
+    now = timezone.now()
+    for start in range(0, rows, 10_000):
+        tokens = []
+        for _ in range(min(10_000, rows - start)):
+            expired = rng.random() < expired_share
+            expires_at = now + timedelta(minutes=rng.randint(1, 60 * 24 * 30)) * (-1 if expired else 1)
+            jti = uuid.UUID(int=rng.getrandbits(128)).hex
+            tokens.append(OutstandingToken(
+                user=user, jti=jti, token=f"seeded.{jti}", created_at=expires_at - timedelta(days=1), expires_at=expires_at,
+            ))
+        tokens = OutstandingToken.objects.bulk_create(tokens)
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens if token.expires_at <= now])
+
+    refresh = [RefreshToken.for_user(user)]
+
+    def rotate():
+        serializer = TokenRefreshSerializer(data={"refresh": str(refresh[0])})
+        serializer.is_valid(raise_exception=True)
+        refresh[0] = RefreshToken(serializer.validated_data["refresh"])
+
+    before = measure(rotate, repeat)
+    purge = purge_expired_tokens()
+    after = measure(rotate, repeat)
+    return {
+        "rows": rows,
+        "refresh_before_purge": before,
+        "purge": purge,
+        "refresh_after_purge": after,
+        "remaining": {"outstanding": OutstandingToken.objects.count(), "blacklisted": BlacklistedToken.objects.count()},
+    }
+
+
+@benchmark("export")
+def export_benchmark(rows=None, repeat=1, seed=0, chunk_size=2000):
+    """
+    Streams every task of one user through the CSV and NDJSON exporters
+    (Task/export.py), queries included. Time and peak traced memory are
+    measured in separate passes, as tracing slows the export down.
+    """
+    from .export import STREAMS
+
+    rng = random.Random(seed)
+    user = seed_user()
+    friend = seed_user("bench-friend")
+    queryset = Tasks.objects.filter(user=user).order_by("id")
+    results = {"chunk_size": chunk_size, "sizes": {}}
+    seeded = 0
+    for size in ([rows] if rows else [1_000, 100_000, 1_000_000]):
+        seed_tasks(user, size - seeded, rng)
+        Tasks.collaborators.through.objects.bulk_create(
+            [
+                Tasks.collaborators.through(tasks_id=task_id, customuser_id=friend.pk)
+                for task_id in queryset.values_list("id", flat=True)[seeded::10]
+            ],
+            ignore_conflicts=True,
+        )
+        seeded = size
+
+        formats = {}
+        for export_format, stream in STREAMS.items():
+            written = [0]
+
+            def export():
+                written[0] = sum(len(part) for part in stream(queryset, chunk_size))
+
+            timing = measure(export, repeat)
+            tracemalloc.start()
+            export()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            timing["rows_per_second"] = round(size / (timing["p50_ms"] / 1000))
+            timing["output_mib"] = round(written[0] / 2**20, 1)
+            timing["peak_kib"] = round(peak / 1024, 1)
+            formats[export_format] = timing
+        results["sizes"][size] = formats
+    return results
+
+
+@benchmark("import")
+def import_benchmark(rows=10_000, repeat=1, seed=0, baseline_rows=500):
+    """
+    Task import (Task/imports.py) from in-memory CSV and NDJSON files, vs.
+    creating `baseline_rows` tasks one at a time through TaskSerializer as
+    POST /api/tasks/ does. Records spread over 20 category names; every
+    tenth has a collaborator.
+    """
+    import csv
+    import io
+    import json
+
+    from .imports import import_tasks
+    from .serializers import TaskSerializer
+
+    rng = random.Random(seed)
+    baseline_rows = min(baseline_rows, rows)
+    user = seed_user()
+    seed_user("bench-friend")
+    now = timezone.now()
+    records = [
+        {
+            "title": sentence(rng, 4),
+            "description": sentence(rng, 16),
+            "due_date": (now + timedelta(minutes=rng.randint(60 * 25, 60 * 24 * 365))).isoformat(),
+            "priority": rng.choice(["low", "medium", "high"]),
+            "category": f"category {rng.randrange(20)}",
+            "collaborators": ["bench-friend"] if i % 10 == 0 else [],
+        }
+        for i in range(rows)
+    ]
+
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=list(records[0]))
+    writer.writeheader()
+    writer.writerows({**record, "collaborators": ";".join(record["collaborators"])} for record in records[:rows])
+    files = {
+        "csv": text.getvalue().encode(),
+        "ndjson": "".join(json.dumps(record) + "\n" for record in records[:rows]).encode(),
+    }
+
+    results = {"rows": rows, "formats": {}}
+    for label, content in files.items():
+        reports = []
+        timing = measure(lambda: reports.append(import_tasks(user, io.BytesIO(content), label)), repeat)
+        timing["rows_per_second"] = round(rows / (timing["p50_ms"] / 1000))
+        timing["created"] = reports[-1]["created"]
+        results["formats"][label] = timing
+
+    def one_by_one():
+        for record in records[:baseline_rows]:
+            data = {key: value for key, value in record.items() if key not in ("category", "collaborators")}
+            serializer = TaskSerializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            serializer.save(user=user)
+
+    timing = measure(one_by_one, 1)
+    timing["rows"] = baseline_rows
+    timing["rows_per_second"] = round(baseline_rows / (timing["p50_ms"] / 1000))
+    results["one_by_one_serializer"] = timing
+    return results
+
+
+@benchmark("concurrency", atomic=False)
+def concurrency_benchmark(rows=20, repeat=5, levels=(50, 200, 1_000), threads=32):
+    """
+    Requests/second and latency with 50, 200 and 1,000 clients at once, each
+    its own user with `rows` tasks, each sending `repeat` rounds of a list
+    and a detail GET and waiting for every response before the next. The
+    stacks compared are:
+
+    - wsgi_sync: WSGIHandler on a pool of `threads` worker threads, as a
+      threaded WSGI server runs it (requests queue for a free thread);
+    - asgi_sync: ASGIHandler with the sync views;
+    - asgi_async: ASGIHandler with TASK_ASYNC_VIEWS=["*"].
+
+    Requests are handed to the handlers in-process, so the numbers leave out
+    the network and the server's HTTP parsing. The response cache is off so
+    every request reaches the database.
+    """
+    import io
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    from asgiref.sync import async_to_sync
+    from django.conf import settings
+    from django.core.handlers.asgi import ASGIHandler
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    host = (settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip(".")
+    rng = random.Random(0)
+    clients, seeded = [], []
+    try:
+        for i in range(max(levels)):
+            user = seed_user(f"concurrency-{i}")
+            seeded.append(user.pk)
+            seed_tasks(user, rows, rng)
+            task_id = Tasks.objects.filter(user=user).values_list("id", flat=True).first()
+            clients.append((f"Bearer {AccessToken.for_user(user)}", ["/api/tasks/", f"/api/tasks/{task_id}/"] * repeat))
+
+        def wsgi_call(handler, path, authorization):
+            environ = {
+                "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SCRIPT_NAME": "",
+                "SERVER_NAME": host, "SERVER_PORT": "80", "HTTP_HOST": host, "HTTP_AUTHORIZATION": authorization,
+                "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+            }
+            statuses = []
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                b"".join(response)
+            finally:
+                response.close()
+            return int(statuses[0].split()[0])
+
+        async def asgi_call(handler, path, authorization):
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+                "server": (host, 80), "client": ("127.0.0.1", 0),
+                "headers": [(b"host", host.encode()), (b"authorization", authorization.encode())],
+            }
+            messages = []
+            body = [{"type": "http.request", "body": b"", "more_body": False}]
+
+            async def receive():
+                if body:
+                    return body.pop()
+                await asyncio.Future()  # the client never disconnects; Django cancels this
+
+            async def send(message):
+                messages.append(message)
+
+            await handler(scope, receive, send)
+            return messages[0]["status"]
+
+        async def drive(call, count):
+            timings = []
+            failures = 0
+
+            async def client(authorization, paths):
+                nonlocal failures
+                for path in paths:
+                    started = time.perf_counter()
+                    if await call(path, authorization) != 200:
+                        failures += 1
+                    timings.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(client(*clients[i]) for i in range(count)))
+            elapsed = time.perf_counter() - started
+            return {"requests_per_s": round(len(timings) / elapsed, 1), **summarise(timings), "failed": failures}
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            wsgi = WSGIHandler()
+            asgi = ASGIHandler()
+            stacks = {}
+            with ThreadPoolExecutor(threads) as pool:
+                stacks["wsgi_sync"] = ([], lambda path, authorization: loop.run_in_executor(pool, wsgi_call, wsgi, path, authorization))
+                stacks["asgi_sync"] = ([], lambda path, authorization: asgi_call(asgi, path, authorization))
+                stacks["asgi_async"] = (["*"], lambda path, authorization: asgi_call(asgi, path, authorization))
+                results = {}
+                for count in levels:
+                    results[count] = {}
+                    for label, (views, call) in stacks.items():
+                        with override_settings(TASK_ASYNC_VIEWS=views):
+                            results[count][label] = await drive(call, count)
+            return results
+
+        with override_settings(TASK_RESPONSE_CACHE_ENABLED=False):
+            results = async_to_sync(run)()
+        return {"rows_per_user": rows, "requests_per_client": 2 * repeat, "wsgi_threads": threads, "clients": results}
+    finally:
+        User.objects.filter(pk__in=seeded).delete()
+
+
+def endpoint_requests(context):
+    """
+    (url name, method, path, request kwargs, auth) for every route in
+    Task/urls.py, one request per name and method. `auth` is "user", "admin" or None; kwargs may be a
+    callable for bodies that can only be read once (uploads).
+    """
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    pending, active, other = context["pending"], context["in_progress"], context["other"]
+    now = timezone.now()
+    new_task = {"title": "Benchmark", "description": "Created by the benchmark", "due_date": (now + timedelta(days=3)).isoformat()}
+
+    def upload():
+        rows = "".join(f"Imported {i},Row {i},{(now + timedelta(days=i)).isoformat()},Work\n" for i in range(20))
+        file = SimpleUploadedFile("tasks.csv", f"title,description,due_date,category\n{rows}".encode(), "text/csv")
+        return {"data": {"file": file}}
+
+    def json_body(data):
+        return {"data": data, "content_type": "application/json"}
+
+    return [
+        ("user_list_create", "get", "/api/users/", {}, "admin"),
+        ("user_list_create", "post", "/api/users/", json_body({"username": "bench-new", "email": "bench-new@example.com", "password": "x"}), "admin"),
+        ("user_detail", "get", f"/api/users/{context['user'].pk}/", {}, "user"),
+        ("task_list_create", "get", "/api/tasks/", {}, "user"),
+        ("task_list_create", "post", "/api/tasks/", json_body(new_task), "user"),
+        ("task_detail", "get", f"/api/tasks/{pending.pk}/", {}, "user"),
+        ("task_detail", "patch", f"/api/tasks/{pending.pk}/", json_body({"title": "Renamed", "status": "in_progress"}), "user"),
+        ("task_detail", "delete", f"/api/tasks/{pending.pk}/", {}, "user"),
+        ("task-batch", "post", "/api/tasks/batch/", json_body({"operations": [
+            {"op": "create", "data": new_task}, {"op": "update", "id": active.pk, "data": {"priority": "high", "status": "completed"}},
+            {"op": "delete", "id": pending.pk},
+        ]}), "user"),
+        ("task-search", "get", f"/api/tasks/search/?q={context['word']}", {}, "user"),
+        ("task-export", "get", "/api/tasks/export/?format=ndjson", {}, "user"),
+        ("task-import", "post", "/api/tasks/import/", upload, "user"),
+        ("task-occurrences", "get", "/api/tasks/occurrences/?start={}&end={}".format(
+            *(moment.strftime("%Y-%m-%dT%H:%M:%SZ") for moment in (now, now + timedelta(days=30)))), {}, "user"),
+        ("task-stats", "get", "/api/tasks/stats/", {}, "user"),
+        ("task-pending", "patch", f"/api/tasks/{active.pk}/pending/", {}, "user"),
+        ("task-in-progress", "patch", f"/api/tasks/{pending.pk}/in-progress/", {}, "user"),
+        ("task-complete", "patch", f"/api/tasks/{pending.pk}/complete/", {}, "user"),
+        ("task-bulk-transition", "patch", "/api/tasks/transition/", json_body({"ids": context["batch"], "status": "completed"}), "user"),
+        ("task-unarchive", "post", f"/api/tasks/{context['archived']}/unarchive/", {}, "user"),
+        ("user-signup", "post", "/api/signup/", json_body({"username": "bench-signup", "email": "bench-signup@example.com", "password": "x"}), None),
+        ("token_obtain_pair", "post", "/api/token/", json_body({"username": context["user"].username, "password": context["password"]}), None),
+        ("token_refresh", "post", "/api/token/refresh/", json_body({"refresh": context["refresh"]}), None),
+        ("token_blacklist", "post", "/api/token/logout/", json_body({"refresh": context["refresh"]}), None),
+        ("category-list-create", "get", "/api/categories/", {}, "user"),
+        ("category-list-create", "post", "/api/categories/", json_body({"name": "Benchmark"}), "user"),
+        ("task-history", "get", "/api/tasks/history/", {}, "user"),
+        ("add-collaborator", "post", f"/api/tasks/{pending.pk}/add-collaborator/", json_body({"collaborator_id": other.pk}), "user"),
+        ("remove-collaborator", "post", f"/api/tasks/{active.pk}/remove-collaborator/", json_body({"collaborator_id": other.pk}), "user"),
+        ("list-collaborators", "get", f"/api/tasks/{active.pk}/collaborators/", {}, "user"),
+        ("notification-list", "get", "/api/notifications/", {}, "user"),
+        ("notification-unread-count", "get", "/api/notifications/unread-count/", {}, "user"),
+        ("notification-mark-read", "post", "/api/notifications/mark-read/", json_body({"until": now.isoformat()}), "user"),
+        ("notification-stream-ticket", "post", "/api/notifications/stream/ticket/", {}, "user"),
+        ("response-cache-stats", "get", "/api/cache/stats/", {}, "admin"),
+        ("metrics", "get", "/api/metrics", {}, "admin"),
+    ]
+
+
+@benchmark("endpoints")
+def endpoints_benchmark(rows=200, repeat=20, seed=0, users=50, skew=1.0):
+    """
+    Every route in Task/urls.py through the full middleware stack (Django's
+    test client), on a generated dataset (Task/datagen.py) of `users` users
+    averaging `rows` tasks. Requests are made as the user with the most
+    tasks. Each request runs in a savepoint that is rolled back, so writes
+    see the same data every time; throttle buckets start empty for each
+    route and the response cache is off, so reads reach the database (the
+    JWT user cache is on, as in a deployment with a shared cache).
+
+    Per request: wall time (p50/p95/p99), queries and the peak Python heap
+    (tracemalloc, measured on a separate call as tracing slows it down).
+    """
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.db.models import Count
+    from django.urls import URLPattern
+    from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+    from . import urls
+    from .archive import archive_tasks
+    from .datagen import PASSWORD, generate_dataset
+
+    generate_dataset(users=users, tasks=rows, skew=skew, seed=seed, prefix="endpoints")
+    user = User.objects.filter(username__startswith="endpoints-").annotate(count=Count("tasks")).order_by("-count").first()
+    other = User.objects.filter(username__startswith="endpoints-").exclude(pk=user.pk).first() or seed_user("endpoints-other")
+    admin = User.objects.create(username="endpoints-admin", email="endpoints-admin@example.com", is_staff=True)
+    due_date = timezone.now() + timedelta(days=1)
+    active = Tasks.objects.create(title="Active task", description="Benchmark", due_date=due_date, user=user, status="in_progress")
+    active.collaborators.add(other)
+    archived = Tasks.objects.create(title="Archived task", description="Benchmark", due_date=due_date, user=user, status="completed")
+    archive_tasks([archived.pk])
+    context = {
+        "user": user,
+        "other": other,
+        "password": PASSWORD,
+        "refresh": str(RefreshToken.for_user(user)),
+        "pending": Tasks.objects.create(title="Pending task", description="Benchmark", due_date=due_date, user=user),
+        "in_progress": active,
+        "archived": archived.pk,
+        "batch": list(Tasks.objects.filter(user=user, status="pending").values_list("pk", flat=True)[:50]),
+        "word": Tasks.objects.filter(user=user).values_list("title", flat=True).first().split()[0],
+    }
+    headers = {
+        "user": {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"},
+        "admin": {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(admin)}"},
+        None: {},
+    }
+    client = Client(HTTP_HOST=(settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip("."))
+
+    def call(method, path, kwargs, auth):
+        response = getattr(client, method)(path, **(kwargs() if callable(kwargs) else kwargs), **headers[auth])
+        if response.streaming:
+            b"".join(response.streaming_content)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method.upper()} {path} answered {response.status_code}: {response.content[:200]!r}")
+
+    def rolled_back(func):
+        savepoint = transaction.savepoint()
+        try:
+            return func()
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+    results = {"tasks_of_user": user.count, "endpoints": {}}
+    requests = endpoint_requests(context)
+    with override_settings(TASK_RESPONSE_CACHE_ENABLED=False, TASK_AUTH_USER_CACHE=True):
+        for name, method, path, kwargs, auth in requests:
+            with override_settings(TASK_THROTTLE_STORE="Task.throttling.LocalStore", TASK_THROTTLE_STORE_OPTIONS={}):
+                request = lambda: call(method, path, kwargs, auth)
+                rolled_back(request)  # warm up
+                timing = measure(lambda: rolled_back(request), repeat)
+                queries = []
+
+                def counted():
+                    def count(execute, sql, params, many, context):
+                        queries.append(sql)
+                        return execute(sql, params, many, context)
+                    with connection.execute_wrapper(count):
+                        request()
+
+                rolled_back(counted)
+                tracemalloc.start()
+                rolled_back(request)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            timing["queries_per_request"] = len(queries)
+            timing["peak_kib"] = round(peak / 1024, 1)
+            results["endpoints"][f"{method.upper()} {name}"] = timing
+
+    def names(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLPattern):
+                yield pattern.name
+            else:
+                yield from names(pattern.url_patterns)
+
+    measured = {name for name, *_ in requests}
+    results["unmeasured"] = sorted(set(names(urls.urlpatterns)) - measured)
+    return results
+
+
+@benchmark("metrics")
+def metrics_benchmark(rows=50, repeat=200):
+    """
+    What MetricsMiddleware adds to a request: one MetricsStore.observe()
+    call on its own, and GET /api/tasks/ and /api/tasks/stats/ through the
+    test client with and without the middleware. Rendering a scrape is
+    timed after the requests have filled the store.
+    """
+    from django.conf import settings
+    from django.test import Client, override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from .metrics import get_store, render_metrics
+
+    user = seed_user()
+    seed_tasks(user, rows, random.Random(0))
+    client = Client(
+        HTTP_HOST=(settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip("."),
+        HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}",
+    )
+    store = get_store()
+    slot = store.slot("api/tasks/", "GET")
+    started = time.perf_counter()
+    for _ in range(repeat * 50):
+        store.observe(slot, 0.012, 3, 0.002, 2048, 200)
+    results = {"observe_us": round((time.perf_counter() - started) / (repeat * 50) * 1e6, 3), "requests": {}}
+
+    without = [name for name in settings.MIDDLEWARE if name != "Task.middleware.MetricsMiddleware"]
+    with override_settings(TASK_RESPONSE_CACHE_ENABLED=False, REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_CLASSES": [],
+    }):
+        for path in ("/api/tasks/", "/api/tasks/stats/"):
+            results["requests"][path] = {}
+            for label, middleware in (("without", without), ("with", ["Task.middleware.MetricsMiddleware", *without])):
+                with override_settings(MIDDLEWARE=middleware):
+                    client.get(path)
+                    results["requests"][path][label] = measure(lambda: client.get(path), repeat)
+            results["requests"][path]["overhead_ms"] = round(
+                results["requests"][path]["with"]["p50_ms"] - results["requests"][path]["without"]["p50_ms"], 3
+            )
+    results["render_scrape"] = measure(render_metrics, 20)
+    return results
+
+
+@benchmark("archive")
+def archive_benchmark(rows=20_000, repeat=50, seed=0, cold_share=0.9, batch_size=500):
+    """
+    GET /api/tasks/ for a user whose tasks are `cold_share` long completed,
+    with those rows still in Tasks and after archive_completed_tasks has
+    moved them out: the board's first page with a count, the open tasks
+    only, and afterwards both again with ?include_archived=true. Also the
+    archival rate.
+    """
+    from django.conf import settings
+    from django.test import Client, override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from .archive import archive_completed_tasks
+    from .services import rebuild_task_counters
+
+    rng = random.Random(seed)
+    user = seed_user()
+    cold = int(rows * cold_share)
+    seed_tasks(user, rows - cold, rng)
+    seed_tasks(user, cold, rng, status="completed", completed_at=timezone.now() - timedelta(days=365))
+    rebuild_task_counters(user.pk)
+    client = Client(
+        HTTP_HOST=(settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip("."),
+        HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}",
+    )
+    paths = {"list": "/api/tasks/?count=true", "open": "/api/tasks/?status=pending&count=true"}
+
+    def timings(suffix=""):
+        timed = {}
+        for name, path in paths.items():
+            client.get(path + suffix)
+            timed[name] = measure(lambda: client.get(path + suffix), repeat)
+        return timed
+
+    results = {"rows": rows, "cold_rows": cold}
+    with override_settings(TASK_RESPONSE_CACHE_ENABLED=False, REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_CLASSES": [],
+    }):
+        results["before"] = timings()
+        results["archive"] = archive_completed_tasks(batch_size=batch_size)
+        results["after"] = timings()
+        results["after_include_archived"] = timings("&include_archived=true")
+    results["speedup"] = {
+        name: round(results["before"][name]["p50_ms"] / results["after"][name]["p50_ms"], 2) for name in paths
+    }
+    return results
+
+
+@benchmark("retention", atomic=False)
+def retention_benchmark(rows=1_000_000, repeat=50, seed=0, users=100, expired_share=0.8, chunk_size=5000, readers=2):
+    """
+    purge_retention over `rows` history rows and as many notifications,
+    spread over `users` users: `expired_share` of them past max age, and
+    the per-user limit set to half of the rest. Meanwhile `readers` threads
+    keep requesting GET /api/notifications/ and /api/tasks/history/ as
+    those users; their latency is compared with `repeat` reads made before
+    the purge. A read that hits SQLite's write lock is retried and the wait
+    counted in its latency; a purge that does is restarted and resumes.
+    Run with --rows 3000000 for a multi-million-row table. The data is
+    committed, so the readers can see it, and deleted when the benchmark
+    finishes; the purge is limited to the users it seeds.
+    """
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client, override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from .models import Notification, SweepState, TaskHistory
+    from .retention import PHASES, RetentionPolicy, purge_retention
+
+    rng = random.Random(seed)
+    host = (settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip(".")
+    now = timezone.now()
+    per_user = rows // users
+    expired = int(per_user * expired_share)
+    limit = (per_user - expired) // 2
+    people, policies = [], []
+    try:
+        for i in range(users):
+            people.append(seed_user(f"retention-{i}"))
+        tasks = Tasks.objects.bulk_create([
+            Tasks(title=sentence(rng, 3), description="Retention", due_date=now + timedelta(days=1), user=user)
+            for user in people
+        ])
+        # Expired rows first, as they would be: ids grow with time.
+        for count, changed_at in ((expired, now - timedelta(days=400)), (per_user - expired, None)):
+            for start in range(0, count, max(1, 10_000 // users)):
+                size = min(max(1, 10_000 // users), count - start)
+                with transaction.atomic():
+                    history = TaskHistory.objects.bulk_create([
+                        TaskHistory(task=task, user_id=task.user_id, status=rng.choice(["in_progress", "completed"]))
+                        for task in tasks for _ in range(size)
+                    ])
+                    notifications = Notification.objects.bulk_create([
+                        Notification(user_id=task.user_id, task=task, message="Due soon", is_read=rng.random() < 0.7)
+                        for task in tasks for _ in range(size)
+                    ])
+                    if changed_at is not None:
+                        for model, created, field in (
+                            (TaskHistory, history, "changed_at"), (Notification, notifications, "created_at"),
+                        ):
+                            model.objects.filter(
+                                user__in=people, pk__gte=created[0].pk, pk__lte=created[-1].pk,
+                            ).update(**{field: changed_at})
+        tokens = [f"Bearer {AccessToken.for_user(user)}" for user in people]
+        paths = ["/api/notifications/", "/api/tasks/history/"]
+
+        def read(client, index):
+            started = time.perf_counter()
+            response, locked = retry_locked(
+                lambda: client.get(paths[index % 2], HTTP_AUTHORIZATION=tokens[index % len(tokens)]), delay=0.001,
+            )
+            return (time.perf_counter() - started) * 1000, response.status_code, locked
+
+        def reader(stop, timings, outcome):
+            client = Client(HTTP_HOST=host)
+            index = 0
+            try:
+                while not stop.is_set():
+                    elapsed, status, locked = read(client, index)
+                    timings.append(elapsed)
+                    outcome["failed"] += status != 200
+                    outcome["locked"] += locked
+                    index += 1
+            finally:
+                connection.close()
+
+        ids = [user.pk for user in people]
+        policies = [
+            RetentionPolicy("history", max_age=timedelta(days=365), max_rows_per_user=limit, users=ids),
+            RetentionPolicy(
+                "notifications", max_age=timedelta(days=90), max_rows_per_user=limit, keep_unread=True, users=ids,
+            ),
+        ]
+        mine = {"user__in": people}
+        results = {"rows": {"history": TaskHistory.objects.filter(**mine).count(),
+                            "notifications": Notification.objects.filter(**mine).count()}}
+        with override_settings(TASK_RESPONSE_CACHE_ENABLED=False, REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_CLASSES": [],
+        }):
+            client = Client(HTTP_HOST=host)
+            results["reads_before"] = summarise([read(client, index)[0] for index in range(repeat)])
+
+            stop, timings, outcome = threading.Event(), [], {"failed": 0, "locked": 0}
+            threads = [threading.Thread(target=reader, args=(stop, timings, outcome)) for _ in range(readers)]
+            for thread in threads:
+                thread.start()
+            started = time.perf_counter()
+            try:
+                # Shared-cache SQLite (the test database) fails a write that
+                # meets a reader rather than waiting; the purge picks up
+                # after its last committed chunk.
+                _, restarts = retry_locked(lambda: purge_retention(policies, chunk_size=chunk_size))
+            finally:
+                stop.set()
+                for thread in threads:
+                    thread.join()
+            results["reads_during"] = {**summarise(timings or [0.0]), "max_ms": round(max(timings or [0.0]), 3),
+                                       "requests": len(timings), **outcome}
+        seconds = time.perf_counter() - started
+        results["remaining"] = {"history": TaskHistory.objects.filter(**mine).count(),
+                                "notifications": Notification.objects.filter(**mine).count()}
+        deleted = sum(results["rows"].values()) - sum(results["remaining"].values())
+        results["purge"] = {
+            "deleted": deleted, "restarts": restarts, "seconds": round(seconds, 4),
+            "rows_per_s": round(deleted / seconds, 1) if seconds else 0.0,
+        }
+        return results
+    finally:
+        ids = [user.pk for user in people]
+        for model in (TaskHistory, Notification):
+            model.objects.filter(user_id__in=ids)._raw_delete(model.objects.db)
+        User.objects.filter(pk__in=ids).delete()
+        SweepState.objects.filter(name__in=[
+            policy.sweep_name(phase) for policy in policies for phase in PHASES
+        ]).delete()
@@ -0,0 +1,205 @@
+"""
+Per-user response cache for the dashboard list endpoints.
+
+Entries are keyed on (view, user, generation, normalized query string). Every
+write that can change what a user sees bumps that user's generation, which
+orphans all of their cached responses in O(1); orphans age out through the
+backend's own eviction (LocMemCache's MAX_ENTRIES is an LRU bound). The
+generation is read before the response is built, so a write that races with
+a cache fill can only leave the fill under an already-dead generation.
+
+Any Django cache backend works; with several workers use a shared one
+(Redis, Memcached, database) so a bump in one worker is seen by all.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .models import Tasks
+
+_bulk = ContextVar("task_cache_bulk_invalidation", default=False)
+
+GENERATION_KEY = "taskcache:gen:{}"
+RESPONSE_KEY = "taskcache:resp:{}:{}:{}:{}"
+
+
+def get_cache():
+    return caches[getattr(settings, "TASK_RESPONSE_CACHE", "default")]
+
+
+def is_shared_cache(cache=None):
+    """False for backends that live inside one process, which other workers can't see."""
+    return not isinstance(cache or get_cache(), (LocMemCache, DummyCache))
+
+
+def get_version(key):
+    """
+    The counter at `key`, created if missing. Never started from 0: if the
+    key is evicted, a reused number could resurrect whatever was tagged
+    with it, so a fresh counter starts from the clock.
+    """
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_generation(user_id):
+    return get_version(GENERATION_KEY.format(user_id))
+
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        bump_version(GENERATION_KEY.format(user_id))
+
+
+def invalidate_users(user_ids):
+    """
+    Bump now, so the writer's own transaction never reads its old responses,
+    and again after commit, so a fill that raced with the write is dropped.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    _bump(user_ids)
+    transaction.on_commit(lambda: _bump(user_ids))
+
+
+@contextmanager
+def bulk_invalidation():
+    """
+    Inside this block the per-object signal handlers stand down; the caller
+    is expected to invalidate the whole audience once, e.g. with
+    invalidate_users(task_audience(ids)).
+    """
+    token = _bulk.set(True)
+    try:
+        yield
+    finally:
+        _bulk.reset(token)
+
+
+def in_bulk_invalidation():
+    return _bulk.get()
+
+
+def collaborator_ids(task_ids):
+    return set(
+        Tasks.collaborators.through.objects.filter(tasks_id__in=list(task_ids)).values_list("customuser_id", flat=True)
+    )
+
+
+def task_audience(task_ids):
+    """Owners and collaborators of the given tasks: everyone whose lists show them."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return set()
+    owners = set(Tasks.objects.filter(pk__in=task_ids).values_list("user_id", flat=True))
+    return owners | collaborator_ids(task_ids)
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def record(self, namespace, hit):
+        with self._lock:
+            (self.hits if hit else self.misses)[namespace] += 1
+
+    def snapshot(self):
+        with self._lock:
+            hits, misses = dict(self.hits), dict(self.misses)
+        total_hits, total_misses = sum(hits.values()), sum(misses.values())
+        lookups = total_hits + total_misses
+        return {
+            "hits": total_hits,
+            "misses": total_misses,
+            "hit_ratio": round(total_hits / lookups, 4) if lookups else None,
+            "by_view": {
+                namespace: {"hits": hits.get(namespace, 0), "misses": misses.get(namespace, 0)}
+                for namespace in sorted(set(hits) | set(misses))
+            },
+        }
+
+    def reset(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+stats = CacheStats()
+
+
+def response_key(request, namespace):
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    digest = hashlib.sha1(repr((request.get_host(), params)).encode("utf-8")).hexdigest()
+    user_id = request.user.pk
+    return RESPONSE_KEY.format(namespace, user_id, get_generation(user_id), digest)
+
+
+class CachedListMixin:
+    """
+    Serve `list()` from the per-user response cache. Caches `response.data`
+    rather than rendered bytes so every renderer/format shares one entry.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, "TASK_RESPONSE_CACHE_ENABLED", True):
+            return super().list(request, *args, **kwargs)
+        key, response = self.cached_list(request)
+        if response is None:
+            response = self.cache_list(key, super().list(request, *args, **kwargs))
+        return response
+
+    async def alist(self, request, *args, **kwargs):
+        if not getattr(settings, "TASK_RESPONSE_CACHE_ENABLED", True):
+            return await super().alist(request, *args, **kwargs)
+        key, response = self.cached_list(request)
+        if response is None:
+            response = self.cache_list(key, await super().alist(request, *args, **kwargs))
+        return response
+
+    def cached_list(self, request):
+        """(cache key, cached response or None)."""
+        namespace = self.cache_namespace or type(self).__name__
+        key = response_key(request, namespace)
+        data = get_cache().get(key)
+        stats.record(namespace, hit=data is not None)
+        if data is None:
+            return key, None
+        response = Response(data)
+        response["X-Cache"] = "HIT"
+        return key, response
+
+    def cache_list(self, key, response):
+        if response.status_code == 200:
+            get_cache().set(key, response.data, getattr(settings, "TASK_RESPONSE_CACHE_TIMEOUT", 300))
+        response["X-Cache"] = "MISS"
+        return response
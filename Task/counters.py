@@ -0,0 +1,80 @@
+"""
+Per-user task counters (the TaskCounter table) behind GET /api/tasks/stats/.
+
+Every task adds 1 to its owner's "total", "status", "priority" and "category"
+counters; open tasks also add 1 to the "due" counter of their UTC due day,
+so the overdue total is a sum over past days instead of a scan of tasks.
+Writers turn (before, after) task states into deltas with counter_deltas()
+and hand them to TaskCounter.objects.apply() in the same transaction.
+
+Nothing here imports the models, so migrations can use it too.
+"""
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Case, Count, DateField, Q, When
+from django.db.models.functions import TruncDate
+
+# The task attributes the counters depend on, in Tasks.counted_state() order.
+COUNTED_FIELDS = ("user_id", "status", "priority", "category_id", "due_date")
+OPEN_STATUSES = ("pending", "in_progress")
+
+
+def due_day(value):
+    if isinstance(value, datetime):
+        value = value.astimezone(dt_timezone.utc).date() if value.tzinfo else value.date()
+    return value.isoformat()
+
+
+def counter_keys(status, priority, category_id, due):
+    """The (dimension, key) counters one task contributes 1 to."""
+    keys = [
+        ("total", ""),
+        ("status", status),
+        ("priority", priority),
+        ("category", str(category_id) if category_id is not None else "none"),
+    ]
+    if status in OPEN_STATUSES:
+        keys.append(("due", due_day(due)))
+    return keys
+
+
+def counter_deltas(changes):
+    """
+    Sum (before, after) pairs of counted states (None for "no task") into
+    {(user_id, dimension, key): delta}, dropping the ones that cancel out.
+    """
+    deltas = Counter()
+    for before, after in changes:
+        if before == after:
+            continue
+        for state, sign in ((before, -1), (after, 1)):
+            if state is not None:
+                user_id, *fields = state
+                for dimension, key in counter_keys(*fields):
+                    deltas[user_id, dimension, key] += sign
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def aggregate_counters(tasks):
+    """
+    Recount a user's counters from their tasks with one GROUP BY query.
+    Returns {(dimension, key): count}.
+    """
+    open_day = Case(
+        When(Q(status__in=OPEN_STATUSES), then=TruncDate("due_date", tzinfo=dt_timezone.utc)),
+        default=None,
+        output_field=DateField(),
+    )
+    groups = (
+        tasks.order_by()
+        .annotate(day=open_day)
+        .values_list("status", "priority", "category_id", "day")
+        .annotate(n=Count("id"))
+    )
+    counts = Counter()
+    for status, priority, category_id, day, n in groups:
+        for key in counter_keys(status, priority, category_id, day):
+            counts[key] += n
+    return dict(counts)
+
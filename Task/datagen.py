@@ -0,0 +1,139 @@
+"""
+Synthetic datasets for benchmarks: `python manage.py generate_data`.
+
+Users get a skewed number of tasks (a few heavy users, a long tail of
+light ones, as in real task lists), a handful of categories each, and
+tasks carry the mix of statuses, priorities, due dates, collaborators,
+history rows and notifications the API serves. Everything is inserted
+with bulk_create in batches, counters included, and the same seed always
+produces the same dataset.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .benchmarks import sentence
+from .models import Category, Notification, TaskCounter, TaskHistory, Tasks
+
+User = get_user_model()
+
+PASSWORD = "generated-password"
+CATEGORY_NAMES = ["Work", "Home", "Errands", "Health", "Finance", "Study", "Travel", "Garden"]
+STATUSES = [("pending", 0.35), ("in_progress", 0.15), ("completed", 0.5)]
+PRIORITIES = [("low", 0.3), ("medium", 0.5), ("high", 0.2)]
+RECURRENCES = [("none", 0.9), ("daily", 0.03), ("weekly", 0.05), ("monthly", 0.02)]
+
+
+def _pick(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def tasks_per_user(users, mean, skew, rng):
+    """
+    Task counts for `users` users averaging `mean`, Zipf-distributed with
+    exponent `skew` (0 gives everyone the same count) and shuffled so the
+    heavy users are spread over the id range.
+    """
+    weights = [1 / (rank + 1) ** skew for rank in range(users)]
+    scale = mean * users / sum(weights)
+    counts = [max(1, round(weight * scale)) for weight in weights]
+    rng.shuffle(counts)
+    return counts
+
+
+def generate_dataset(users=100, tasks=50, skew=1.0, seed=0, prefix="gen", batch_size=5000,
+                     collaborator_share=0.1, notification_share=0.2, progress=None):
+    """
+    Insert `users` users with on average `tasks` tasks each. Usernames are
+    `<prefix>-<n>`, every password is PASSWORD. `progress(done, total)` is
+    called after each batch of users. Returns the number of rows created
+    per table.
+    """
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+    counts = tasks_per_user(users, tasks, skew, rng)
+    now = timezone.now()
+    created = {"users": 0, "categories": 0, "tasks": 0, "collaborators": 0, "history": 0, "notifications": 0}
+
+    start = 0
+    while start < users:
+        # Batches of users whose tasks add up to about batch_size rows.
+        end, rows = start, 0
+        while end < users and (end == start or rows + counts[end] <= batch_size):
+            rows += counts[end]
+            end += 1
+        with transaction.atomic():
+            _generate_batch(rng, range(start, end), counts, prefix, password, now, created,
+                            collaborator_share, notification_share)
+        start = end
+        if progress:
+            progress(end, users)
+    return created
+
+
+def _generate_batch(rng, indexes, counts, prefix, password, now, created, collaborator_share, notification_share):
+    users = User.objects.bulk_create([
+        User(username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com", password=password)
+        for i in indexes
+    ])
+    categories = Category.objects.bulk_create([
+        Category(user=user, name=name)
+        for user in users
+        for name in rng.sample(CATEGORY_NAMES, rng.randint(0, 5))
+    ])
+    by_user = {}
+    for category in categories:
+        by_user.setdefault(category.user_id, []).append(category.pk)
+
+    tasks = []
+    for index, user in zip(indexes, users):
+        user_categories = by_user.get(user.pk, [])
+        for _ in range(counts[index]):
+            status = _pick(rng, STATUSES)
+            due_date = now + timedelta(minutes=rng.randint(-60 * 24 * 180, 60 * 24 * 180))
+            tasks.append(Tasks(
+                title=sentence(rng, rng.randint(2, 6)),
+                description=sentence(rng, rng.randint(5, 30)),
+                due_date=due_date,
+                priority=_pick(rng, PRIORITIES),
+                status=status,
+                recurrence=_pick(rng, RECURRENCES),
+                completed_at=min(due_date, now) if status == "completed" else None,
+                user=user,
+                category_id=rng.choice(user_categories) if user_categories and rng.random() < 0.7 else None,
+            ))
+    tasks = Tasks.objects.bulk_create(tasks)
+    TaskCounter.objects.record((None, task.counted_state()) for task in tasks)
+
+    through = Tasks.collaborators.through
+    user_ids = [user.pk for user in users]
+    collaborators, history, notifications = [], [], []
+    for task in tasks:
+        if len(user_ids) > 1 and rng.random() < collaborator_share:
+            picked = rng.sample(user_ids, min(len(user_ids), rng.randint(1, 3) + 1))
+            for user_id in [user_id for user_id in picked if user_id != task.user_id][:len(picked) - 1]:
+                collaborators.append(through(tasks_id=task.pk, customuser_id=user_id))
+        # A row per status change: in_progress, then completed.
+        if task.status != "pending":
+            history.append(TaskHistory(task=task, user_id=task.user_id, status="in_progress"))
+        if task.status == "completed":
+            history.append(TaskHistory(task=task, user_id=task.user_id, status="completed"))
+        if rng.random() < notification_share:
+            notifications.append(Notification(
+                user_id=task.user_id, task=task, message=f"Task '{task.title}' is due soon!", is_read=rng.random() < 0.6,
+            ))
+    through.objects.bulk_create(collaborators)
+    TaskHistory.objects.bulk_create(history)
+    Notification.objects.bulk_create(notifications)
+
+    created["users"] += len(users)
+    created["categories"] += len(categories)
+    created["tasks"] += len(tasks)
+    created["collaborators"] += len(collaborators)
+    created["history"] += len(history)
+    created["notifications"] += len(notifications)
@@ -0,0 +1,395 @@
+"""
+Server-sent notification events: GET /api/notifications/stream/.
+
+The stream is served by a small ASGI app mounted in front of Django in
+Task_Management/asgi.py. Django's handler keeps a thread per open request for
+the sync middleware; an idle stream here is one coroutine and one bounded
+queue, with database work hopping onto the shared sync thread.
+
+Notification rows are the event log. An event's id is the notification's pk,
+so a client reconnecting with Last-Event-ID is replayed from the table, and
+the hub only has to carry new notifications to the streams that are open. A
+stream whose queue fills up (a slow consumer) stops taking events from the
+hub and catches up from the table once it drains, so a slow client costs a
+bounded amount of memory and still misses nothing.
+
+Clients that can set headers authenticate with their bearer token.
+Browsers' EventSource can't, and a token in the URL would end up in access
+logs and history, so they POST /api/notifications/stream/ticket/ first and
+open the stream with the short-lived, single-use ticket it returns.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connection, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .authentication import CachedJWTAuthentication
+from .cache import get_cache
+from .models import Notification
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = "/api/notifications/stream/"
+REPLAY_BATCH = 200
+RETRY_MS = 3000
+TICKET_SALT = "Task.events.stream-ticket"
+TICKET_TTL = 30
+TICKET_KEY = "streamticket:{}"
+
+
+def notification_event(notification):
+    """(event id, JSON data) for a notification."""
+    data = NotificationSerializer(notification).data
+    return notification.pk, json.dumps(data, separators=(",", ":"))
+
+
+def publish_notifications(notifications):
+    """Push new notifications to their owners' open streams once committed."""
+    by_user = defaultdict(list)
+    for notification in notifications:
+        by_user[notification.user_id].append(notification_event(notification))
+    if not by_user:
+        return
+
+    def publish():
+        hub = get_hub()
+        for user_id, events in by_user.items():
+            hub.publish(user_id, events)
+
+    transaction.on_commit(publish, robust=True)
+
+
+class Subscription:
+    """One open stream's end of the hub: a bounded queue on its event loop."""
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, events):
+        # Runs on self.loop. Once full, the stream is marked to replay from
+        # the table and further events are dropped until it has.
+        for event in events:
+            if self.overflowed:
+                return
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.overflowed = True
+
+    def drain(self):
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        self.overflowed = False
+        return events
+
+
+class LocalHub:
+    """
+    In-process pub/sub. Only streams held by the publishing worker process
+    are reached; see SQLiteHub for several workers.
+    """
+
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or getattr(settings, "TASK_EVENT_QUEUE_SIZE", 64)
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, events):
+        self.dispatch(user_id, events)
+
+    def dispatch(self, user_id, events):
+        # Safe from any thread: delivery is scheduled on each stream's loop.
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, events)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # its loop has closed
+
+
+class SQLiteHub(LocalHub):
+    """
+    Cross-process stand-in for a broker such as Redis pub/sub: publishers
+    append to a table in a shared SQLite file and every process subscribed
+    to it polls the table, dispatching new rows to its own streams. Suits
+    several workers on one host and multi-worker tests.
+    """
+
+    def __init__(self, path, poll_interval=0.2, retention=300, queue_size=None):
+        super().__init__(queue_size)
+        self.path = str(path)
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._poller = None
+        self._stopped = threading.Event()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS task_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+                "event_id INTEGER NOT NULL, data TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def publish(self, user_id, events):
+        now = time.time()
+        with self._connect() as db:
+            db.executemany(
+                "INSERT INTO task_events (user_id, event_id, data, created) VALUES (?, ?, ?, ?)",
+                [(user_id, event_id, data, now) for event_id, data in events],
+            )
+            db.execute("DELETE FROM task_events WHERE created < ?", (now - self.retention,))
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._poller is None:
+                with self._connect() as db:
+                    cursor = db.execute("SELECT COALESCE(MAX(id), 0) FROM task_events").fetchone()[0]
+                self._poller = threading.Thread(target=self._poll, args=(cursor,), daemon=True)
+                self._poller.start()
+        return super().subscribe(user_id)
+
+    def close(self):
+        self._stopped.set()
+
+    def _poll(self, cursor):
+        db = self._connect()
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                rows = db.execute(
+                    "SELECT id, user_id, event_id, data FROM task_events WHERE id > ? ORDER BY id", (cursor,)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                logger.exception("Polling %s for task events failed", self.path)
+                continue
+            if not rows:
+                continue
+            cursor = rows[-1][0]
+            by_user = defaultdict(list)
+            for _, user_id, event_id, data in rows:
+                by_user[user_id].append((event_id, data))
+            for user_id, events in by_user.items():
+                self.dispatch(user_id, events)
+
+
+@lru_cache(maxsize=None)
+def get_hub():
+    hub_class = import_string(getattr(settings, "TASK_EVENT_HUB", "Task.events.LocalHub"))
+    return hub_class(**getattr(settings, "TASK_EVENT_HUB_OPTIONS", {}))
+
+
+@receiver(setting_changed)
+def reset_hub(setting, **kwargs):
+    if setting.startswith("TASK_EVENT_"):
+        get_hub.cache_clear()
+
+
+def _database(func):
+    # All streams share one sync thread (and connection) for their queries.
+    def call(*args):
+        try:
+            return func(*args)
+        finally:
+            if not connection.in_atomic_block:
+                close_old_connections()
+    return sync_to_async(call)
+
+
+def issue_stream_ticket(user):
+    """A signed ticket that opens one stream as `user` within TICKET_TTL seconds."""
+    return signing.dumps({"user": user.pk, "nonce": secrets.token_urlsafe(12)}, salt=TICKET_SALT)
+
+
+def redeem_stream_ticket(ticket):
+    """
+    The ticket's user id, the first time it is presented, else None. Tickets
+    are checked by signature, so any worker accepts them; the used ones are
+    remembered in TASK_RESPONSE_CACHE, with add() so that only one
+    connection wins, which stops reuse in other workers if that is shared.
+    """
+    try:
+        payload = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_TTL)
+    except signing.BadSignature:
+        return None
+    if not get_cache().add(TICKET_KEY.format(payload["nonce"]), 1, timeout=TICKET_TTL):
+        return None
+    return payload["user"]
+
+
+@_database
+def authenticate(authorization, ticket):
+    """The user id for a bearer token in the header or a ?ticket=, else None."""
+    if authorization:
+        auth = CachedJWTAuthentication()
+        raw = auth.get_raw_token(authorization)
+        if not raw:
+            return None
+        try:
+            return auth.get_user(auth.get_validated_token(raw)).pk
+        except (InvalidToken, AuthenticationFailed):
+            return None
+    user_id = redeem_stream_ticket(ticket) if ticket else None
+    if user_id is None or not get_user_model()._default_manager.filter(pk=user_id, is_active=True).exists():
+        return None
+    return user_id
+
+
+@_database
+def backlog(user_id, after, limit=REPLAY_BATCH):
+    notifications = Notification.objects.filter(user_id=user_id, pk__gt=after).order_by("pk")[:limit]
+    return [notification_event(notification) for notification in notifications]
+
+
+def _frame(event_id, data):
+    return f"id: {event_id}\nevent: notification\ndata: {data}\n\n".encode()
+
+
+class EventStreamApp:
+    """ASGI app serving STREAM_PATH and handing every other request to `app`."""
+
+    def __init__(self, app, path=STREAM_PATH):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == self.path:
+            await self.stream(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def respond(self, send, status, body):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": json.dumps(body).encode()})
+
+    async def stream(self, scope, receive, send):
+        if scope["method"] != "GET":
+            return await self.respond(send, 405, {"error": "Method not allowed."})
+        headers = dict(scope["headers"])
+        query = parse_qs(scope.get("query_string", b"").decode())
+        user_id = await authenticate(headers.get(b"authorization"), query.get("ticket", [None])[0])
+        if user_id is None:
+            return await self.respond(send, 401, {"error": "Authentication credentials were not provided or are invalid."})
+
+        last_event_id = headers.get(b"last-event-id", b"").decode() or query.get("last_event_id", [""])[0]
+        try:
+            last_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return await self.respond(send, 400, {"error": "Last-Event-ID must be a notification id."})
+
+        hub = get_hub()
+        subscription = hub.subscribe(user_id)
+        streamer = asyncio.current_task()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            streamer.cancel()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": f"retry: {RETRY_MS}\n\n".encode(), "more_body": True})
+            await self.pump(send, subscription, last_id)
+        except asyncio.CancelledError:
+            if not watcher.done():
+                raise
+        finally:
+            hub.unsubscribe(subscription)
+            watcher.cancel()
+
+    async def pump(self, send, subscription, last_id):
+        heartbeat = getattr(settings, "TASK_EVENT_HEARTBEAT", 15)
+        # Subscribed before replaying, so nothing committed in between is
+        # missed; events both replayed and queued are sent once.
+        replayed = set()
+        if last_id is not None:
+            last_id, replayed = await self.replay(send, subscription.user_id, last_id)
+
+        while True:
+            try:
+                async with asyncio.timeout(heartbeat):
+                    event = await subscription.queue.get()
+            except TimeoutError:
+                await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+                continue
+
+            if subscription.overflowed:
+                queued = [event, *subscription.drain()]
+                after = last_id if last_id is not None else queued[0][0] - 1
+                last_id, replayed = await self.replay(send, subscription.user_id, after)
+                continue
+
+            event_id, data = event
+            if event_id in replayed:
+                continue
+            await send({"type": "http.response.body", "body": _frame(event_id, data), "more_body": True})
+            last_id = event_id if last_id is None else max(last_id, event_id)
+
+    async def replay(self, send, user_id, after):
+        sent = set()
+        while True:
+            events = await backlog(user_id, after)
+            if events:
+                await send({
+                    "type": "http.response.body",
+                    "body": b"".join(_frame(event_id, data) for event_id, data in events),
+                    "more_body": True,
+                })
+                sent.update(event_id for event_id, _ in events)
+                after = events[-1][0]
+            if len(events) < REPLAY_BATCH:
+                return after, sent
@@ -0,0 +1,112 @@
+"""
+Streaming task export: GET /api/tasks/export/?format=csv|ndjson.
+
+Rows are read with QuerySet.iterator() and rendered TASK_EXPORT_CHUNK_SIZE
+at a time through the list fast path (Task/fastpath.py): the category comes
+from the same query, collaborators from one query per chunk, and each chunk
+is encoded and handed to the server before the next is read. Memory use
+depends on the chunk size, not on how many tasks are exported.
+
+CSV is written to be read back by the import (Task/imports.py):
+collaborators are listed by username, which costs one more query per
+chunk, and cells that a spreadsheet would take for a formula (starting
+with =, +, -, @, tab or carriage return) are prefixed with a single quote,
+which the import strips again.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.renderers import BaseRenderer
+
+from .fastpath import task_row_serializer
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+
+def export_chunks(queryset, chunk_size=None):
+    """Yield lists of serialized tasks, reading `chunk_size` rows at a time."""
+    chunk_size = chunk_size or getattr(settings, "TASK_EXPORT_CHUNK_SIZE", 2000)
+    rows = task_row_serializer.rows(queryset).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield task_row_serializer.serialize(chunk)
+
+
+def csv_header(fields=None):
+    fields = fields or task_row_serializer.fields
+    header = []
+    for name, children in fields:
+        if children:
+            header.extend(f"{name}_{child}" for child in children)
+        else:
+            header.append(name)
+    return header
+
+
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def csv_values(task, fields, usernames):
+    values = []
+    for name, children in fields:
+        value = task[name]
+        if children:
+            values.extend(csv_cell((value or {}).get(child, "")) for child in children)
+        elif name == "collaborators":
+            values.append(";".join(usernames[user_id] for user_id in value))
+        else:
+            values.append("" if value is None else csv_cell(value))
+    return values
+
+
+def chunk_usernames(chunk):
+    """{user id: username} for the collaborators of a chunk of tasks."""
+    ids = {user_id for task in chunk for user_id in task["collaborators"]}
+    if not ids:
+        return {}
+    return dict(get_user_model()._default_manager.filter(pk__in=ids).values_list("pk", "username"))
+
+
+def stream_csv(queryset, chunk_size=None):
+    fields = task_row_serializer.fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(csv_header(fields))
+    for chunk in export_chunks(queryset, chunk_size):
+        usernames = chunk_usernames(chunk)
+        writer.writerows(csv_values(task, fields, usernames) for task in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_ndjson(queryset, chunk_size=None):
+    for chunk in export_chunks(queryset, chunk_size):
+        yield "".join(json.dumps(task, separators=(",", ":")) + "\n" for task in chunk)
+
+
+STREAMS = {
+    CSVRenderer.format: stream_csv,
+    NDJSONRenderer.format: stream_ndjson,
+}
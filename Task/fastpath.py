@@ -0,0 +1,163 @@
+"""
+Read-only fast path for task list responses.
+
+TaskSerializer builds and runs a field object per attribute per row. For
+lists we instead fetch plain tuples with values_list() (category joined in
+the same query, collaborators gathered with one extra query per page) and
+turn each tuple into a dict with a function generated once from
+TaskSerializer's own field list, so the output stays byte-for-byte the same
+and new serializer fields are picked up automatically (or fail loudly at
+compile time if their type isn't supported here).
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .serializers import TaskSerializer
+
+PASSTHROUGH_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.BooleanField,
+    serializers.ReadOnlyField,
+)
+
+
+def _datetime_to_iso(value, tz):
+    # Mirrors rest_framework.fields.DateTimeField.to_representation for the
+    # default ISO-8601 format.
+    if value is None:
+        return None
+    if tz is not None:
+        value = value.astimezone(tz)
+    value = value.isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+class TaskRowSerializer:
+    def __init__(self, serializer_class=TaskSerializer):
+        self.model = serializer_class.Meta.model
+        self.columns = []
+        self.fields = []
+        self.collaborators_field = None
+        self.converter = self.compile(serializer_class())
+
+    def column(self, name):
+        if name not in self.columns:
+            self.columns.append(name)
+        return f"row[{self.columns.index(name)}]"
+
+    def compile(self, serializer):
+        id_expr = self.column("id")
+        helpers = {"_dt": _datetime_to_iso, "_fields": {}}
+        items = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = field.source
+            children = None
+            if isinstance(field, serializers.BaseSerializer):
+                pk = self.column(f"{source}__id")
+                children = [child_name for child_name, child in field.fields.items() if not child.write_only]
+                nested = ", ".join(
+                    f"{child_name!r}: {self.column(f'{source}__{field.fields[child_name].source}')}"
+                    for child_name in children
+                )
+                expr = f"({{{nested}}} if {pk} is not None else None)"
+            elif isinstance(field, ManyRelatedField):
+                self.collaborators_field = source
+                expr = f"collaborators.get({id_expr}, [])"
+            elif isinstance(field, PrimaryKeyRelatedField):
+                expr = self.column(f"{source}_id")
+            elif isinstance(field, serializers.DateTimeField):
+                if getattr(field, "format", api_settings.DATETIME_FORMAT).lower() == "iso-8601":
+                    expr = f"_dt({self.column(source)}, tz)"
+                else:
+                    helpers["_fields"][name] = field
+                    value = self.column(source)
+                    expr = f"(_fields[{name!r}].to_representation({value}) if {value} is not None else None)"
+            elif isinstance(field, PASSTHROUGH_FIELDS):
+                expr = self.column(source)
+            else:
+                raise TypeError(f"TaskRowSerializer cannot render {name!r} ({type(field).__name__}).")
+            items.append(f"{name!r}: {expr}")
+            self.fields.append((name, children))
+
+        code = "def convert(row, collaborators, tz):\n    return {" + ", ".join(items) + "}\n"
+        namespace = dict(helpers)
+        exec(compile(code, "<TaskRowSerializer>", "exec"), namespace)
+        return namespace["convert"]
+
+    def rows(self, queryset):
+        """values_list() queryset producing the tuples `convert` expects."""
+        return queryset.prefetch_related(None).values_list(*self.columns, named=True)
+
+    def collaborator_map(self, task_ids):
+        grouped = defaultdict(list)
+        for task_id, user_id in self.collaborator_rows(task_ids):
+            grouped[task_id].append(user_id)
+        return grouped
+
+    async def acollaborator_map(self, task_ids):
+        grouped = defaultdict(list)
+        async for task_id, user_id in self.collaborator_rows(task_ids):
+            grouped[task_id].append(user_id)
+        return grouped
+
+    def collaborator_rows(self, task_ids):
+        field = self.model._meta.get_field(self.collaborators_field or "collaborators")
+        through = field.remote_field.through
+        if self.collaborators_field is None or not task_ids:
+            return through.objects.none()
+        task_column, user_column = field.m2m_field_name(), field.m2m_reverse_field_name()
+        return through.objects.filter(**{f"{task_column}__in": task_ids}).order_by("id").values_list(task_column, user_column)
+
+    def serialize(self, rows):
+        rows = list(rows)
+        return self.convert_rows(rows, self.collaborator_map([row[0] for row in rows]))
+
+    async def aserialize(self, rows):
+        """serialize() for async views; `rows` must already be fetched."""
+        return self.convert_rows(rows, await self.acollaborator_map([row[0] for row in rows]))
+
+    def convert_rows(self, rows, collaborators):
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        convert = self.converter
+        return [convert(row, collaborators, tz) for row in rows]
+
+
+task_row_serializer = TaskRowSerializer()
+
+
+class FastListMixin:
+    """
+    Serve GET list requests through TaskRowSerializer. Filtering, ordering,
+    search and keyset pagination run exactly as before, just over tuples.
+    """
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, "TASK_FAST_LIST", True):
+            return super().list(request, *args, **kwargs)
+
+        queryset = task_row_serializer.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(task_row_serializer.serialize(page))
+        return Response(task_row_serializer.serialize(queryset))
+
+    async def alist(self, request, *args, **kwargs):
+        if not getattr(settings, "TASK_FAST_LIST", True):
+            return await super().alist(request, *args, **kwargs)
+
+        queryset = task_row_serializer.rows(await self.afilter_queryset(self.get_queryset()))
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(await task_row_serializer.aserialize(page))
+        return Response(await task_row_serializer.aserialize([row async for row in queryset]))
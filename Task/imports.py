@@ -0,0 +1,216 @@
+"""
+Bulk task import: POST /api/tasks/import/ and `manage.py import_tasks`.
+
+The upload is read one record at a time (CSV with a header row, or one JSON
+object per line) and handled TASK_IMPORT_CHUNK_SIZE records at a time.
+Each record is validated with TaskSerializer's rules for new tasks. A
+chunk's category names and collaborator usernames are then resolved with
+one query each, missing categories are created with one bulk_create, and
+the chunk's valid tasks are inserted in one transaction. Invalid records
+are skipped and reported by their 1-based record number; the rest of the
+file is still imported.
+
+Records name their category (`category`, or `category_name` as written by
+the CSV export) and list collaborators by username (`;`-separated in CSV)
+or, as the NDJSON export writes them, by user id (JSON integers), so both
+exports can be imported again.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from .cache import bulk_invalidation, invalidate_users
+from .export import FORMULA_PREFIXES
+from .models import Category
+from .serializers import TaskSerializer
+from .services import bulk_create_tasks, notify_due_soon
+
+User = get_user_model()
+
+MAX_REPORTED_ERRORS = 1000
+FORMAT_EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "jsonl": "ndjson"}
+
+
+def format_from_filename(filename):
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return FORMAT_EXTENSIONS.get(extension)
+
+
+def uncsv_cell(value):
+    # Undo the export's formula neutralization (Task/export.py).
+    if isinstance(value, str) and value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def read_csv(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    for number, row in enumerate(csv.DictReader(text), 1):
+        record = {key: uncsv_cell(value) for key, value in row.items() if key is not None and value != ""}
+        if "collaborators" in record:
+            record["collaborators"] = [name.strip() for name in record["collaborators"].split(";") if name.strip()]
+        yield number, record, None
+
+
+def read_ndjson(stream):
+    number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, {"detail": f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(record, dict):
+            yield number, None, {"detail": "Each line must be a JSON object."}
+            continue
+        yield number, record, None
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def _split_relations(record):
+    """Take the category name and collaborator usernames out of a record."""
+    data = dict(record)
+    data.pop("category_id", None)  # categories are matched by name only
+    category = data.pop("category", data.pop("category_name", None))
+    if isinstance(category, dict):
+        category = category.get("name")
+    collaborators = data.pop("collaborators", [])
+    errors = {}
+    if category is not None and not isinstance(category, str):
+        errors["category"] = ["Must be a category name."]
+    elif category and len(category) > (max_length := Category._meta.get_field("name").max_length):
+        errors["category"] = [f"Category names are at most {max_length} characters."]
+    if not isinstance(collaborators, list) or not all(
+        isinstance(user, str) or (isinstance(user, int) and not isinstance(user, bool)) for user in collaborators
+    ):
+        errors["collaborators"] = ["Must be a list of usernames or user ids."]
+    return data, category or None, collaborators, errors
+
+
+class TaskImport:
+    """Runs one import and accumulates its report."""
+
+    def __init__(self, user, dry_run=False, chunk_size=None, context=None):
+        self.user = user
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size or getattr(settings, "TASK_IMPORT_CHUNK_SIZE", 1000)
+        # One serializer validates every record: building its fields is most
+        # of what constructing a serializer costs.
+        self.serializer = TaskSerializer(context=context or {})
+        self.records = 0
+        self.valid = 0
+        self.created = 0
+        self.failed = 0
+        self.categories_created = 0
+        self.errors = []
+        self._planned_categories = set()  # dry runs: names later chunks shouldn't count again
+
+    def report(self):
+        return {
+            "dry_run": self.dry_run,
+            "records": self.records,
+            "valid": self.valid,
+            "created": self.created,
+            "failed": self.failed,
+            "categories_created": self.categories_created,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+    def fail(self, number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"record": number, "errors": errors})
+
+    def run(self, stream, format):
+        records = READERS[format](stream)
+        with bulk_invalidation():
+            try:
+                while chunk := list(islice(records, self.chunk_size)):
+                    self.import_chunk(chunk)
+            except (UnicodeDecodeError, csv.Error) as e:
+                self.fail(self.records + 1, {"detail": f"Could not read the file past this record: {e}"})
+        return self.report()
+
+    def import_chunk(self, chunk):
+        valid = []
+        for number, record, errors in chunk:
+            self.records += 1
+            if errors:
+                self.fail(number, errors)
+                continue
+            data, category, collaborators, errors = _split_relations(record)
+            try:
+                validated = self.serializer.run_validation(data)
+            except serializers.ValidationError as e:
+                errors = {**serializers.as_serializer_error(e), **errors}
+            if errors:
+                self.fail(number, errors)
+                continue
+            valid.append((number, validated, category, collaborators))
+
+        # Usernames are keyed by str, ids by int, so the two never collide.
+        names = {user for _, _, _, collaborators in valid for user in collaborators}
+        usernames = {name for name in names if isinstance(name, str)}
+        ids = names - usernames
+        users = {}
+        if names:
+            for user in User.objects.filter(Q(username__in=usernames) | Q(pk__in=ids)).only("id", "username"):
+                users[user.username] = users[user.pk] = user
+        rows = []
+        for number, validated, category, collaborators in valid:
+            unknown = [name for name in collaborators if name not in users]
+            if unknown:
+                self.fail(number, {"collaborators": [
+                    f"Unknown username: {name}" if isinstance(name, str) else f"Unknown user id: {name}" for name in unknown
+                ]})
+                continue
+            rows.append((validated, category, list({users[name].pk: users[name] for name in collaborators}.values())))
+        if not rows:
+            return
+
+        with transaction.atomic():
+            categories = self.resolve_categories({category for _, category, _ in rows if category})
+            tasks = []
+            for validated, category, collaborators in rows:
+                tasks.append({**validated, "category_id": categories.get(category), "collaborators": collaborators})
+            if not self.dry_run:
+                created = bulk_create_tasks(self.user, tasks)
+                notify_due_soon(created)
+                invalidate_users({self.user.pk} | {user.pk for _, _, collaborators in rows for user in collaborators})
+                self.created += len(rows)
+        self.valid += len(rows)
+
+    def resolve_categories(self, names):
+        """{name: pk} for the user's categories, creating the missing ones."""
+        if not names:
+            return {}
+        categories = {}
+        # The oldest category wins when several share a name.
+        for pk, name in Category.objects.filter(user=self.user, name__in=names).order_by("-pk").values_list("pk", "name"):
+            categories[name] = pk
+        missing = sorted(names - categories.keys() - self._planned_categories)
+        self.categories_created += len(missing)
+        if self.dry_run:
+            self._planned_categories.update(missing)
+        elif missing:
+            for category in Category.objects.bulk_create([Category(user=self.user, name=name) for name in missing]):
+                categories[category.name] = category.pk
+        return categories
+
+
+def import_tasks(user, stream, format, dry_run=False, chunk_size=None, context=None):
+    """Import tasks for `user` from a binary stream; returns the report."""
+    return TaskImport(user, dry_run=dry_run, chunk_size=chunk_size, context=context).run(stream, format)
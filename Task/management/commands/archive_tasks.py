@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from Task.archive import archive_completed_tasks, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = "Move tasks completed more than TASK_ARCHIVE_AFTER_DAYS days ago into the archive tables in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, help="Overrides TASK_ARCHIVE_AFTER_DAYS.")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        stats = archive_completed_tasks(
+            older_than=archive_cutoff(days=options["older_than_days"]),
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Archived {tasks} tasks completed before {cutoff:%Y-%m-%d %H:%M} with {collaborators} collaborators, "
+            "{history} history rows and {notifications} notifications in {batches} batches, "
+            "{seconds}s ({tasks_per_second} tasks/s)".format(**stats)
+        ))
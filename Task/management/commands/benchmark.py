@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Task.benchmarks import BENCHMARKS, compare, run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Run a named benchmark against throwaway data and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(BENCHMARKS))
+        parser.add_argument("--rows", type=int)
+        parser.add_argument("--repeat", type=int)
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+        parser.add_argument("--compare", metavar="BASELINE", help="Fail if the results regressed against this JSON file.")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown for --compare (0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                baseline = json.load(file)
+
+        kwargs = {key: options[key] for key in ("rows", "repeat") if options[key] is not None}
+        try:
+            result = run_benchmark(options["name"], **kwargs)
+        except TypeError as exc:
+            raise CommandError(str(exc))
+        output = json.dumps(result, indent=2, default=str)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+
+        if baseline is not None:
+            # Compared as written to JSON, where dict keys are strings.
+            regressions = compare(json.loads(output), baseline, tolerance=options["tolerance"])
+            for regression in regressions:
+                self.stderr.write("{metric}: {baseline} -> {current} ({change})".format(**regression))
+            if regressions:
+                raise CommandError(f"{len(regressions)} metric(s) regressed against {options['compare']}.")
+            self.stderr.write(self.style.SUCCESS(f"No regressions against {options['compare']}."))
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Task.datagen import PASSWORD, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic dataset (users, categories, tasks, collaborators, history, notifications) for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--tasks", type=int, default=50, help="Average tasks per user.")
+        parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of tasks per user; 0 for even.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--prefix", default="gen", help="Usernames are <prefix>-<n>.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Tasks inserted per transaction.")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if get_user_model().objects.filter(username__startswith=f"{prefix}-").exists():
+            raise CommandError(f"Users named {prefix}-<n> already exist; pick another --prefix.")
+
+        def progress(done, total):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{done}/{total} users")
+
+        created = generate_dataset(
+            users=options["users"], tasks=options["tasks"], skew=options["skew"], seed=options["seed"],
+            prefix=prefix, batch_size=options["batch_size"], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Created {users} users, {categories} categories, {tasks} tasks, {collaborators} collaborators, "
+            "{history} history rows and {notifications} notifications".format(**created)
+        ))
+        self.stdout.write(f"Users log in as {prefix}-<n> with password {PASSWORD!r}.")
@@ -0,0 +1,39 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Task.imports import READERS, format_from_filename, import_tasks
+
+
+class Command(BaseCommand):
+    help = "Import tasks for a user from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--user", required=True, help="Username of the tasks' owner.")
+        parser.add_argument("--format", choices=sorted(READERS), help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--dry-run", action="store_true", help="Validate only; write nothing.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}.")
+        format = options["format"] or format_from_filename(options["path"])
+        if format is None:
+            raise CommandError("Pass --format: the file extension is neither .csv nor .ndjson.")
+
+        with open(options["path"], "rb") as stream:
+            report = import_tasks(
+                user, stream, format, dry_run=options["dry_run"], chunk_size=options["chunk_size"],
+            )
+        for error in report["errors"]:
+            self.stderr.write(f"record {error['record']}: {json.dumps(error['errors'])}")
+        verb = "Would import" if report["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['valid']} of {report['records']} tasks "
+            f"({report['failed']} failed, {report['categories_created']} new categories)"
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from Task.sweeps import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired JWT outstanding/blacklisted tokens in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        stats = purge_expired_tokens(batch_size=options["batch_size"], pause=options["pause"])
+        self.stdout.write(self.style.SUCCESS(
+            "Purged {outstanding} outstanding and {blacklisted} blacklisted tokens "
+            "in {batches} batches, {seconds}s ({rows_per_second} rows/s)".format(**stats)
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from Task.retention import purge_retention
+
+
+class Command(BaseCommand):
+    help = "Delete task history and notifications past their TASK_RETENTION policy in small, resumable chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between chunks.")
+        parser.add_argument("--max-seconds", type=float, help="Stop after this long; the next run resumes.")
+
+    def handle(self, *args, **options):
+        def progress(table, phase, deleted):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{table} ({phase}): {deleted} rows deleted")
+
+        stats = purge_retention(
+            chunk_size=options["chunk_size"], pause=options["pause"], max_seconds=options["max_seconds"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Purged {deleted} rows in {chunks} chunks, {seconds}s ({rows_per_second} rows/s)".format(**stats)
+        ))
+        for table in ("history", "notifications"):
+            if table in stats:
+                self.stdout.write("  {table}: {age} past max age, {per_user} over the per-user limit".format(
+                    table=table, **stats[table]
+                ))
+        if not stats["complete"]:
+            self.stdout.write("Stopped at --max-seconds; the next run resumes where this one left off.")
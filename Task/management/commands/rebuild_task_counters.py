@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Task.services import rebuild_task_counters
+
+
+class Command(BaseCommand):
+    help = "Recount every user's task counters from their tasks and fix any drift (--verify only reports it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true", help="Report mismatches without writing; exit non-zero if any.")
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Only this user id (repeatable).")
+
+    def handle(self, *args, **options):
+        user_ids = options["users"] or get_user_model().objects.order_by("pk").values_list("pk", flat=True).iterator()
+        checked = out_of_sync = 0
+        for user_id in user_ids:
+            drift = rebuild_task_counters(user_id, fix=not options["verify"])
+            checked += 1
+            if not drift:
+                continue
+            out_of_sync += 1
+            self.stdout.write(f"user {user_id}: {len(drift)} counter(s) out of sync")
+            if options["verbosity"] > 1:
+                for (dimension, key), (stored, expected) in sorted(drift.items()):
+                    self.stdout.write(f"  {dimension}:{key} stored={stored} expected={expected}")
+
+        summary = f"Checked {checked} user(s), {out_of_sync} out of sync"
+        if options["verify"]:
+            if out_of_sync:
+                raise CommandError(f"{summary}.")
+            self.stdout.write(self.style.SUCCESS(f"{summary}."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{summary}, fixed."))
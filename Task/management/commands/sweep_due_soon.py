@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from Task.sweeps import run_due_soon_sweep
+
+
+class Command(BaseCommand):
+    help = "Create due-soon notifications for tasks that entered the 24h window since the last sweep."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = run_due_soon_sweep(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            "Swept {window_start:%Y-%m-%d %H:%M} -> {window_end:%Y-%m-%d %H:%M}: "
+            "{scanned} tasks scanned, {created} notifications created, {skipped} already notified "
+            "in {seconds}s ({tasks_per_second} tasks/s)".format(**stats)
+        ))
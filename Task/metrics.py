@@ -0,0 +1,241 @@
+"""
+Per-route request metrics, served in Prometheus text format at /api/metrics.
+
+Task.middleware.MetricsMiddleware times each request and adds it to a
+fixed-size block of float64 counters for its (route, method):
+
+    latency histogram buckets (BUCKETS, then +Inf), latency sum,
+    SQL queries, SQL seconds, response bytes, then one counter per
+    STATUS_CODES entry and one for any other status.
+
+Routes are the URL patterns of ROOT_URLCONF, numbered once when the store
+is created, so the hot path is two dict lookups, a bisect and a few float
+additions under a lock; label strings are only built when scraping.
+Queries are counted by an execute wrapper installed on every database
+connection, which charges them to the request in a context variable, so
+queries run in sync_to_async threads count as well.
+
+The counters live in an mmap. With TASK_METRICS_DIR set, each worker
+process maps its own file there and a scrape, served by any worker, adds
+up every file whose name carries the same layout. Files of workers that
+have exited are kept, so counters never go backwards; empty the directory
+when the deployment starts, as with Prometheus' multiprocess mode.
+"""
+import contextvars
+import glob
+import hashlib
+import mmap
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import URLPattern, get_resolver
+from django.urls.resolvers import URLResolver
+from rest_framework.renderers import BaseRenderer
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS")
+STATUS_CODES = (200, 201, 204, 207, 301, 302, 304, 400, 401, 403, 404, 405, 409, 429, 500, 502, 503)
+UNMATCHED = "unmatched"  # requests no URL pattern matched (404s)
+
+SUM = len(BUCKETS) + 1
+QUERIES = SUM + 1
+QUERY_SECONDS = SUM + 2
+BYTES = SUM + 3
+STATUSES = SUM + 4
+SLOT_SIZE = STATUSES + len(STATUS_CODES) + 1
+
+_STATUS_INDEX = {code: STATUSES + i for i, code in enumerate(STATUS_CODES)}
+_OTHER_STATUS = STATUSES + len(STATUS_CODES)
+_METHOD_INDEX = {method: i for i, method in enumerate(METHODS)}
+
+# [queries, seconds] of the request being handled, for the execute wrapper.
+current_queries = contextvars.ContextVar("current_queries", default=None)
+
+
+def url_routes(patterns=None, prefix=""):
+    """Every route template in the URLconf, as ResolverMatch.route spells it."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    routes = []
+    for pattern in patterns:
+        route = URLResolver._join_route(prefix, str(pattern.pattern)) if prefix else str(pattern.pattern)
+        if isinstance(pattern, URLPattern):
+            routes.append(route)
+        else:
+            routes.extend(url_routes(pattern.url_patterns, route))
+    return routes
+
+
+class MetricsStore:
+    """
+    The counters of one worker process, in an anonymous mmap or, with a
+    directory, in `<directory>/metrics-<layout>-<pid>.bin`.
+    """
+
+    def __init__(self, directory=None, routes=None, pid=None):
+        self.pid = pid or os.getpid()
+        self.directory = directory
+        self.routes = [UNMATCHED, *dict.fromkeys(url_routes() if routes is None else routes)]
+        self.route_index = {route: i for i, route in enumerate(self.routes)}
+        self.slots = len(self.routes) * (len(METHODS) + 1)
+        self.layout = hashlib.sha1(
+            repr((self.routes, BUCKETS, METHODS, STATUS_CODES)).encode()
+        ).hexdigest()[:12]
+        size = self.slots * SLOT_SIZE * 8
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, f"metrics-{self.layout}-{self.pid}.bin")
+            with open(self.path, "a+b") as file:
+                if os.fstat(file.fileno()).st_size != size:
+                    file.truncate(size)
+                self._map = mmap.mmap(file.fileno(), size)
+        else:
+            self.path = None
+            self._map = mmap.mmap(-1, size)
+        self.values = memoryview(self._map).cast("d")
+        self._lock = threading.Lock()
+
+    def slot(self, route, method):
+        return self.route_index.get(route, 0) * (len(METHODS) + 1) + _METHOD_INDEX.get(method, len(METHODS))
+
+    def observe(self, slot, seconds, queries, query_seconds, size, status):
+        base = slot * SLOT_SIZE
+        bucket = base + bisect_left(BUCKETS, seconds)
+        status_index = base + _STATUS_INDEX.get(status, _OTHER_STATUS)
+        values = self.values
+        with self._lock:
+            values[bucket] += 1
+            values[base + SUM] += seconds
+            values[base + QUERIES] += queries
+            values[base + QUERY_SECONDS] += query_seconds
+            values[base + BYTES] += size
+            values[status_index] += 1
+
+    def totals(self):
+        """Every worker's counters with this layout, added up."""
+        with self._lock:
+            totals = array("d", self.values)
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, f"metrics-{self.layout}-*.bin")):
+                if path == self.path:
+                    continue
+                values = array("d")
+                try:
+                    with open(path, "rb") as file:
+                        values.frombytes(file.read())
+                except OSError:
+                    continue
+                if len(values) != len(totals):
+                    continue
+                for i, value in enumerate(values):
+                    if value:
+                        totals[i] += value
+        return totals
+
+
+@lru_cache(maxsize=None)
+def _get_store():
+    return MetricsStore(getattr(settings, "TASK_METRICS_DIR", None))
+
+
+def get_store():
+    store = _get_store()
+    if store.pid != os.getpid():  # forked after the store was created
+        _get_store.cache_clear()
+        store = _get_store()
+    return store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    if setting in ("TASK_METRICS_DIR", "ROOT_URLCONF"):
+        _get_store.cache_clear()
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = current_queries.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter[0] += 1
+        counter[1] += time.perf_counter() - started
+
+
+def install_query_counter(connection):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
+
+
+@receiver(connection_created)
+def _count_new_connection(sender, connection, **kwargs):
+    install_query_counter(connection)
+
+
+def install_query_counters():
+    """Count queries on this thread's already open connections too."""
+    for connection in connections.all(initialized_only=True):
+        install_query_counter(connection)
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_metrics(store=None):
+    store = store or get_store()
+    totals = store.totals()
+    methods = [*METHODS, "other"]
+    statuses = [*map(str, STATUS_CODES), "other"]
+    bounds = [*(repr(bound) for bound in BUCKETS), "+Inf"]
+    histogram, requests, queries, query_seconds, sizes = [], [], [], [], []
+    for slot in range(store.slots):
+        base = slot * SLOT_SIZE
+        count = sum(totals[base:base + SUM])
+        if not count:
+            continue
+        route, method = store.routes[slot // len(methods)], methods[slot % len(methods)]
+        labels = f'route="{_label(route)}",method="{method}"'
+        cumulative = 0
+        for i, bound in enumerate(bounds):
+            cumulative += totals[base + i]
+            histogram.append(f'task_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative:g}')
+        histogram.append(f"task_http_request_duration_seconds_sum{{{labels}}} {totals[base + SUM]!r}")
+        histogram.append(f"task_http_request_duration_seconds_count{{{labels}}} {count:g}")
+        for i, status in enumerate(statuses):
+            if totals[base + STATUSES + i]:
+                requests.append(f'task_http_requests_total{{{labels},status="{status}"}} {totals[base + STATUSES + i]:g}')
+        queries.append(f"task_http_db_queries_total{{{labels}}} {totals[base + QUERIES]:g}")
+        query_seconds.append(f"task_http_db_query_seconds_total{{{labels}}} {totals[base + QUERY_SECONDS]!r}")
+        sizes.append(f"task_http_response_bytes_total{{{labels}}} {totals[base + BYTES]:g}")
+
+    lines = []
+    for name, kind, help_text, samples in (
+        ("task_http_request_duration_seconds", "histogram", "Time until the response was returned, by route and method.", histogram),
+        ("task_http_requests_total", "counter", "Requests by route, method and status code.", requests),
+        ("task_http_db_queries_total", "counter", "SQL queries run while handling requests.", queries),
+        ("task_http_db_query_seconds_total", "counter", "Time spent in SQL queries while handling requests.", query_seconds),
+        ("task_http_response_bytes_total", "counter", "Response body bytes (streamed bodies are not counted).", sizes),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
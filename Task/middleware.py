@@ -0,0 +1,87 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from .metrics import current_queries, get_store, install_query_counters
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise's middleware, usable from both sync and async requests.
+
+    The original is sync-only. Under ASGI, one sync middleware makes Django
+    run the rest of the stack, async views included, in a thread per
+    request. Static files are looked up in memory, so the async path only
+    has to await the next handler.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """
+    Records each request's latency, SQL queries, response size and status
+    for /api/metrics (Task/metrics.py). Put it first in MIDDLEWARE so the
+    time covers the whole stack; streamed responses are timed until the
+    response object is returned.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install_query_counters()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counter = [0, 0.0]
+        token = current_queries.set(counter)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, time.perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = [0, 0.0]
+        token = current_queries.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, time.perf_counter() - started, counter)
+        return response
+
+    def record(self, request, response, seconds, counter):
+        store = get_store()
+        match = request.resolver_match
+        slot = store.slot(match.route if match is not None else None, request.method)
+        size = 0 if response.streaming else len(response.content)
+        store.observe(slot, seconds, counter[0], counter[1], size, response.status_code)
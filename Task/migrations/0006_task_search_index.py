@@ -0,0 +1,87 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# Kept here rather than imported from Task.search, so this migration does
+# the same thing whatever later becomes of that module.
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS task_search_ai AFTER INSERT ON "Task_tasks" BEGIN
+        INSERT INTO task_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_search_ad AFTER DELETE ON "Task_tasks" BEGIN
+        INSERT INTO task_search(task_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_search_au AFTER UPDATE OF title, description ON "Task_tasks" BEGIN
+        INSERT INTO task_search(task_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO task_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE task_search USING fts5(
+        title, description,
+        content="Task_tasks", content_rowid="id",
+        tokenize="unicode61 remove_diacritics 2"
+    )
+    """,
+    *SQLITE_TRIGGERS,
+    "INSERT INTO task_search(task_search) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS task_search_au",
+    "DROP TRIGGER IF EXISTS task_search_ad",
+    "DROP TRIGGER IF EXISTS task_search_ai",
+    "DROP TABLE IF EXISTS task_search",
+]
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE "Task_tasks" ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX tasks_search_vector_idx ON "Task_tasks" USING GIN (search_vector)',
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS tasks_search_vector_idx",
+    'ALTER TABLE "Task_tasks" DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def run(statements_by_vendor):
+    def apply(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        if not statements:
+            return
+        try:
+            with schema_editor.connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+        except OperationalError:
+            # SQLite built without FTS5: Task.search falls back to icontains.
+            if schema_editor.connection.vendor != "sqlite":
+                raise
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Task', '0005_due_soon_sweep'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}),
+            run({"sqlite": SQLITE_REVERSE, "postgresql": POSTGRES_REVERSE}),
+        ),
+    ]
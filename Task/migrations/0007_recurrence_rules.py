@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:01
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Task', '0006_task_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tasks',
+            name='occurrence_index',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tasks',
+            name='previous_occurrence',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='next_occurrence', to='Task.tasks'),
+        ),
+        migrations.AddField(
+            model_name='tasks',
+            name='recurrence_count',
+            field=models.PositiveIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='tasks',
+            name='recurrence_interval',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='tasks',
+            name='recurrence_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tasks',
+            name='recurrence_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
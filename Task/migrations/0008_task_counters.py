@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from Task.counters import aggregate_counters
+
+
+def backfill_counters(apps, schema_editor):
+    Tasks = apps.get_model("Task", "Tasks")
+    TaskCounter = apps.get_model("Task", "TaskCounter")
+    db = schema_editor.connection.alias
+    user_ids = Tasks.objects.using(db).order_by().values_list("user_id", flat=True).distinct()
+    for user_id in user_ids.iterator():
+        counts = aggregate_counters(Tasks.objects.using(db).filter(user_id=user_id))
+        TaskCounter.objects.using(db).bulk_create([
+            TaskCounter(user_id=user_id, dimension=dimension, key=key, count=count)
+            for (dimension, key), count in counts.items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Task', '0007_recurrence_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=16)),
+                ('key', models.CharField(max_length=32)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'dimension', 'key'), name='task_counter_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
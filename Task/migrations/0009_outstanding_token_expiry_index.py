@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index simplejwt's outstanding tokens on expires_at so purge_expired_tokens
+    finds each batch with a range scan instead of reading the whole table.
+    The table belongs to token_blacklist, hence raw SQL.
+    """
+
+    dependencies = [
+        ('Task', '0008_task_counters'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS "outstanding_token_expires_idx" '
+            'ON "token_blacklist_outstandingtoken" ("expires_at")',
+            'DROP INDEX IF EXISTS "outstanding_token_expires_idx"',
+        ),
+    ]
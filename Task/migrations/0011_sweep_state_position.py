@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Task', '0010_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sweepstate',
+            name='position',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Task', '0011_sweep_state_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtask',
+            name='unarchived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tasks',
+            name='unarchived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
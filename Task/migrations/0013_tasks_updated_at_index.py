@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Task', '0012_unarchived_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(fields=['updated_at'], name='tasks_updated_idx'),
+        ),
+    ]
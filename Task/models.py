@@ -1,6 +1,15 @@
-from django.db import models
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import connections, models, router, transaction
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.core.validators import MinValueValidator
+
+from .counters import COUNTED_FIELDS, counter_deltas
+from .recurrence import RecurrenceRule
 
 # Create your models here.
 class CustomUser(AbstractUser):
@@ -8,6 +17,11 @@ class CustomUser(AbstractUser):
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["date_joined"], name="user_date_joined_idx"),
+        ]
+
     def __str__(self):
         return self.username
     
@@ -18,6 +32,29 @@ class Category(models.Model):
     def __str__(self):
         return self.name
     
+class TaskQuerySet(models.QuerySet):
+    def with_related(self):
+        """Load everything TaskSerializer reads, so serializing N tasks costs a fixed number of queries."""
+        return self.select_related("category").prefetch_related("collaborators")
+
+    def visible_to(self, user, scope="all"):
+        """
+        Tasks `user` owns ("owned"), has been added to ("shared") or both ("all").
+        Shared tasks are matched with an IN subquery on the collaborator table
+        rather than a join, so the result has no duplicates and needs no DISTINCT.
+        """
+        field = self.model._meta.get_field("collaborators")
+        shared = Q(pk__in=field.remote_field.through.objects.filter(
+            **{field.m2m_reverse_field_name(): user.pk}
+        ).values(field.m2m_field_name()))
+        if scope == "owned":
+            return self.filter(user=user)
+        if scope == "shared":
+            return self.filter(shared)
+        return self.filter(Q(user=user) | shared)
+
+COUNTED_UPDATE_FIELDS = {"user", "status", "priority", "category", "due_date", *COUNTED_FIELDS}
+
 class Tasks(models.Model):
     PRIORITY_CHOICES = [
         ('low', 'Low'),
@@ -31,6 +68,12 @@ class Tasks(models.Model):
         ('completed', 'Completed'),
     ]
 
+    VALID_TRANSITIONS = {
+        "pending": ["in_progress", "completed"],
+        "in_progress": ["pending", "completed"],
+        "completed": ["pending", "in_progress"],
+    }
+
     RECURRENCE_CHOICES = [
         ('none', 'None'),
         ('daily', 'Daily'),
@@ -44,15 +87,109 @@ class Tasks(models.Model):
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pending')
     recurrence = models.CharField(max_length=10, choices=RECURRENCE_CHOICES, default='none')
+    recurrence_interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    recurrence_until = models.DateTimeField(null=True, blank=True)
+    recurrence_count = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(1)])
+    # Series bookkeeping: the first occurrence's due date, this task's 0-based
+    # position in the series and the task it was spawned from. The one-to-one
+    # makes spawning idempotent: a task can have at most one successor.
+    recurrence_start = models.DateTimeField(null=True, blank=True)
+    occurrence_index = models.PositiveIntegerField(default=0)
+    previous_occurrence = models.OneToOneField(
+        "self", on_delete=models.SET_NULL, null=True, blank=True, related_name="next_occurrence"
+    )
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Set when moved back out of the archive; archival waits for it to age
+    # past the cutoff as well (Task/archive.py).
+    unarchived_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tasks')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="tasks")
     collaborators = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="shared_tasks", blank=True)
 
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "status", "due_date"], name="tasks_user_status_due_idx"),
+            models.Index(fields=["user", "due_date"], name="tasks_user_due_idx"),
+            models.Index(fields=["due_date"], name="tasks_due_idx"),
+            # The due-soon sweep's pass over recently saved tasks (Task/sweeps.py).
+            models.Index(fields=["updated_at"], name="tasks_updated_idx"),
+            # The archival scan (Task/archive.py).
+            models.Index(fields=["completed_at"], condition=Q(status="completed"), name="tasks_completed_at_idx"),
+        ]
+
     def __str__(self):
         return self.title
+
+    def counted_state(self):
+        return tuple(getattr(self, name) for name in COUNTED_FIELDS)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not COUNTED_UPDATE_FIELDS.intersection(update_fields):
+            return super().save(*args, **kwargs)
+        using = kwargs.get("using") or router.db_for_write(Tasks, instance=self)
+        with transaction.atomic(using=using):
+            before = None
+            if not self._state.adding:
+                # Read (and lock) the stored row rather than trusting what this
+                # instance was loaded with, which may predate a concurrent write.
+                before = Tasks.objects.using(using).select_for_update().filter(
+                    pk=self.pk
+                ).values_list(*COUNTED_FIELDS).first()
+            super().save(*args, **kwargs)
+            after = self.counted_state()
+            if before is not None and update_fields is not None:
+                written = {self._meta.get_field(name).attname for name in update_fields}
+                after = tuple(
+                    new if name in written else old
+                    for name, new, old in zip(COUNTED_FIELDS, after, before)
+                )
+            TaskCounter.objects.record([(before, after)])
+
+    @classmethod
+    def transition_sources(cls, target):
+        """Statuses a task may move to `target` from."""
+        return [source for source, targets in cls.VALID_TRANSITIONS.items() if target in targets]
+
+    @property
+    def recurrence_rule(self):
+        return RecurrenceRule.from_task(self)
+
+    @property
+    def recurrence_anchor(self):
+        return self.recurrence_start or self.due_date
+
+    def next_due_date(self):
+        rule = self.recurrence_rule
+        if rule is None:
+            return None
+        return rule.occurrence(self.recurrence_anchor, self.occurrence_index + 1)
+
+    def spawn_next_occurrence(self):
+        """Unsaved next task in the series, or None once the rule is exhausted."""
+        due_date = self.next_due_date()
+        if due_date is None:
+            return None
+        return Tasks(
+            title=self.title,
+            description=self.description,
+            due_date=due_date,
+            priority=self.priority,
+            status="pending",
+            user_id=self.user_id,
+            recurrence=self.recurrence,
+            recurrence_interval=self.recurrence_interval,
+            recurrence_until=self.recurrence_until,
+            recurrence_count=self.recurrence_count,
+            recurrence_start=self.recurrence_anchor,
+            occurrence_index=self.occurrence_index + 1,
+            previous_occurrence_id=self.pk,
+            category_id=self.category_id,
+        )
     
 class TaskHistory(models.Model):
     task = models.ForeignKey(Tasks, on_delete=models.CASCADE, related_name="history")
@@ -60,6 +197,11 @@ class TaskHistory(models.Model):
     status = models.CharField(max_length=15)
     changed_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "changed_at"], name="history_user_changed_idx"),
+        ]
+
     def __str__(self):
         return f"{self.task.title} - {self.status} at {self.changed_at}"
     
@@ -70,5 +212,162 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "is_read", "created_at"], name="notif_user_read_created_idx"),
+        ]
+
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message}"
+
+class ArchivedTask(models.Model):
+    """
+    A completed task moved out of Tasks by Task/archive.py. Same columns and
+    primary key as the original row (Tasks ids are never reused), so it can
+    be listed alongside hot tasks and moved back unchanged. The recurrence
+    links are plain ids: either end of a series may be hot or archived.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    due_date = models.DateTimeField()
+    priority = models.CharField(max_length=10, choices=Tasks.PRIORITY_CHOICES)
+    status = models.CharField(max_length=15, choices=Tasks.STATUS_CHOICES)
+    recurrence = models.CharField(max_length=10, choices=Tasks.RECURRENCE_CHOICES)
+    recurrence_interval = models.PositiveSmallIntegerField()
+    recurrence_until = models.DateTimeField(null=True, blank=True)
+    recurrence_count = models.PositiveIntegerField(null=True, blank=True)
+    recurrence_start = models.DateTimeField(null=True, blank=True)
+    occurrence_index = models.PositiveIntegerField()
+    previous_occurrence_id = models.BigIntegerField(null=True, blank=True)
+    next_occurrence_id = models.BigIntegerField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    unarchived_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_tasks")
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="archived_tasks")
+    collaborators = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="archived_shared_tasks", blank=True)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "status", "due_date"], name="archived_user_status_due_idx"),
+            models.Index(fields=["user", "due_date"], name="archived_user_due_idx"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    def counted_state(self):
+        return tuple(getattr(self, name) for name in COUNTED_FIELDS)
+
+class ArchivedTaskHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name="history")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    status = models.CharField(max_length=15)
+    changed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.task.title} - {self.status} at {self.changed_at}"
+
+class ArchivedNotification(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name="notifications")
+    message = models.CharField(max_length=255)
+    created_at = models.DateTimeField()
+    is_read = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Archived notification for {self.user_id}: {self.message}"
+
+class SweepState(models.Model):
+    """
+    High-water mark of a periodic sweep, e.g. the due-soon notifier, and for
+    sweeps that work through a table in primary key order (the retention
+    purge), the last key done, so an interrupted run resumes there.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    watermark = models.DateTimeField()
+    position = models.BigIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.watermark}"
+
+
+class TaskCounterManager(models.Manager):
+    def apply(self, deltas):
+        """
+        Add {(user_id, dimension, key): delta} to the counters with one
+        upsert, then drop the rows that reached zero.
+        """
+        if not deltas:
+            return
+        db = router.db_for_write(TaskCounter)
+        connection = connections[db]
+        if connection.vendor not in ("sqlite", "postgresql"):
+            return self._apply_portable(deltas, db)
+
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        columns = ", ".join(quote(name) for name in ("user_id", "dimension", "key", "count"))
+        items = list(deltas.items())
+        with connection.cursor() as cursor:
+            for start in range(0, len(items), 500):
+                chunk = items[start:start + 500]
+                cursor.execute(
+                    f"INSERT INTO {table} ({columns}) VALUES {', '.join(['(%s, %s, %s, %s)'] * len(chunk))} "
+                    f"ON CONFLICT ({quote('user_id')}, {quote('dimension')}, {quote('key')}) "
+                    f"DO UPDATE SET {quote('count')} = {table}.{quote('count')} + excluded.{quote('count')}",
+                    [value for (user_id, dimension, key), delta in chunk for value in (user_id, dimension, key, delta)],
+                )
+        self._drop_empty(deltas, db)
+
+    def _apply_portable(self, deltas, db):
+        for (user_id, dimension, key), delta in deltas.items():
+            counters = self.using(db).filter(user_id=user_id, dimension=dimension, key=key)
+            if not counters.update(count=models.F("count") + delta):
+                self.using(db).create(user_id=user_id, dimension=dimension, key=key, count=delta)
+        self._drop_empty(deltas, db)
+
+    def _drop_empty(self, deltas, db):
+        decremented = defaultdict(list)
+        for (user_id, dimension, key), delta in deltas.items():
+            if delta < 0:
+                decremented[user_id, dimension].append(key)
+        if decremented:
+            match = reduce(or_, (
+                Q(user_id=user_id, dimension=dimension, key__in=keys)
+                for (user_id, dimension), keys in decremented.items()
+            ))
+            self.using(db).filter(match, count=0).delete()
+
+    def record(self, changes):
+        """Apply (before, after) pairs of Tasks.counted_state() values."""
+        self.apply(counter_deltas(changes))
+
+
+class TaskCounter(models.Model):
+    """
+    Per-user task counts for GET /api/tasks/stats/, kept in step with task
+    writes (see Task/counters.py). Rows at zero are deleted.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="task_counters")
+    dimension = models.CharField(max_length=16)
+    key = models.CharField(max_length=32)
+    count = models.IntegerField(default=0)
+
+    objects = TaskCounterManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "dimension", "key"], name="task_counter_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.dimension}:{self.key} = {self.count}"
@@ -0,0 +1,209 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date, datetime, time
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Model, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite key, e.g. (due_date, id).
+
+    The cursor stores the ordering values of the row at the page boundary and
+    the next page is fetched with a `WHERE (due_date, id) > (...)` predicate,
+    so page 500 costs the same as page 1. The ordering comes from the view's
+    OrderingFilter (or `view.ordering`) and the primary key is always appended
+    as the tie-breaker.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    ordering = ("-created_at",)
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.page_queryset(queryset, request, view)
+        self.count = queryset.count() if self.wants_count(request) else None
+        return self.set_page(list(page))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views."""
+        page = self.page_queryset(queryset, request, view)
+        self.count = await queryset.acount() if self.wants_count(request) else None
+        return self.set_page([row async for row in page])
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+        One page over several querysets with the same fields, e.g. hot and
+        archived tasks: each is cut at the cursor and the page size the same
+        way and the results merged in the page order. Primary keys must not
+        repeat across them; the count is the sum.
+        """
+        pages = [list(self.page_queryset(queryset, request, view)) for queryset in querysets]
+        self.count = sum(queryset.count() for queryset in querysets) if self.wants_count(request) else None
+        reverse = self.cursor is not None and self.cursor["reverse"]
+        rows = [row for page in pages for row in page]
+        # Stable sorts from the last field to the first: a multi-key sort
+        # with a direction per key.
+        for name, desc in reversed(self.fields):
+            rows.sort(key=lambda row: self.row_value(row, name), reverse=desc != reverse)
+        return self.set_page(rows[:self.page_size + 1])
+
+    def page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request, queryset)
+
+        reverse = self.cursor is not None and self.cursor["reverse"]
+        fields = [(name, desc != reverse) for name, desc in self.fields]
+        queryset = queryset.order_by(*[("-" if desc else "") + name for name, desc in fields])
+        if self.cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(fields, self.cursor["position"]))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.cursor is not None and self.cursor["reverse"]:
+            results.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = self.cursor is not None, has_more
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict()
+        if self.count is not None:
+            payload["count"] = self.count
+        payload["next"] = self.get_next_link()
+        payload["previous"] = self.get_previous_link()
+        payload["results"] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer"},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def wants_count(self, request):
+        if not self.count_query_param:
+            return False
+        value = request.query_params.get(self.count_query_param, "")
+        return value.lower() in ("1", "true", "yes")
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if hasattr(backend, "get_ordering"):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = getattr(view, "ordering", None) or self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        fields = []
+        for item in ordering:
+            name = item.lstrip("-")
+            if name == "pk":
+                name = queryset.model._meta.pk.name
+            fields.append((name, item.startswith("-")))
+
+        pk_name = queryset.model._meta.pk.name
+        if pk_name not in [name for name, _ in fields]:
+            fields.append((pk_name, fields[-1][1] if fields else False))
+        return fields
+
+    def keyset_filter(self, fields, position):
+        condition = Q()
+        for index, (name, desc) in enumerate(fields):
+            term = Q(**{f"{name}__{'lt' if desc else 'gt'}": position[index]})
+            for prev_index in range(index):
+                term &= Q(**{fields[prev_index][0]: position[prev_index]})
+            condition |= term
+        return condition
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8"))
+            if data["o"] != self.ordering_key():
+                raise ValueError("cursor ordering mismatch")
+            opts = queryset.model._meta
+            position = [
+                opts.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, data["p"], strict=True)
+            ]
+            return {"position": position, "reverse": bool(data["r"])}
+        except (TypeError, ValueError, KeyError, UnicodeError, FieldDoesNotExist, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        data = {
+            "o": self.ordering_key(),
+            "p": [self.encode_value(self.row_value(obj, name)) for name, _ in self.fields],
+            "r": reverse,
+        }
+        encoded = urlsafe_b64encode(json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def row_value(self, row, name):
+        # Pages are model instances, or named tuples from values_list(named=True).
+        if isinstance(row, Model):
+            return row._meta.get_field(name).value_from_object(row)
+        return getattr(row, name)
+
+    def encode_value(self, value):
+        # DjangoJSONEncoder truncates datetimes to milliseconds, which would
+        # make the boundary row compare unequal to itself.
+        if isinstance(value, (datetime, date, time)):
+            return value.isoformat()
+        return value
+
+    def ordering_key(self):
+        return ",".join(("-" if desc else "") + name for name, desc in self.fields)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
@@ -0,0 +1,200 @@
+"""
+Retention for the append-only tables: TaskHistory gets a row on every
+status change, Notification rows come from the due-soon signal and sweep.
+
+TASK_RETENTION gives each table a policy: rows older than `max_age_days`
+go, as do a user's rows beyond their newest `max_rows_per_user`, except
+that `keep_unread` notifications are never deleted (the due-soon dedupe
+looks for unread ones). `purge_retention` enforces them, from cron/celery
+beat or the `purge_retention` management command.
+
+Deletes run in primary key order, a chunk per short transaction: one
+ordered LIMIT/OFFSET lookup finds the chunk's last key and one DELETE
+removes `pk > position AND pk <= last` rows matching the policy, so no
+statement carries an IN list or locks more than a chunk. The position is
+saved in SweepState after every chunk; a run stopped by `max_seconds` (or
+killed) picks up from there next time. Archived tasks' rows
+(Task/archive.py) are left alone.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .cache import invalidate_users
+from .models import Notification, SweepState, TaskHistory
+
+# name: (model, timestamp field)
+TABLES = {
+    "history": (TaskHistory, "changed_at"),
+    "notifications": (Notification, "created_at"),
+}
+DEFAULT_RETENTION = {
+    "history": {"max_age_days": 365, "max_rows_per_user": 10_000},
+    "notifications": {"max_age_days": 90, "max_rows_per_user": 1_000, "keep_unread": True},
+}
+PHASES = ("age", "per_user")
+
+
+class RetentionPolicy:
+    """
+    `users` (ids) limits the policy to those users' rows, e.g. a benchmark's
+    own; such a policy keeps its resume position apart from the full one's.
+    """
+    def __init__(self, name, max_age=None, max_rows_per_user=None, keep_unread=False, users=None):
+        if name not in TABLES:
+            raise ValueError(f"Unknown retention table {name!r}.")
+        self.name = name
+        self.model, self.date_field = TABLES[name]
+        self.max_age = max_age
+        self.max_rows_per_user = max_rows_per_user
+        self.keep_unread = keep_unread
+        self.users = None if users is None else sorted(users)
+
+    @classmethod
+    def from_settings(cls, name, options):
+        days = options.get("max_age_days")
+        return cls(
+            name,
+            max_age=timedelta(days=days) if days is not None else None,
+            max_rows_per_user=options.get("max_rows_per_user"),
+            keep_unread=options.get("keep_unread", False),
+        )
+
+    def sweep_name(self, phase):
+        name = f"retention:{self.name}:{phase}"
+        if self.users is not None:
+            name += f":users-{hashlib.sha1(repr(self.users).encode()).hexdigest()[:12]}"
+        return name
+
+    def rows(self):
+        queryset = self.model._base_manager.all()
+        if self.users is not None:
+            queryset = queryset.filter(user_id__in=self.users)
+        return queryset
+
+    def purgeable(self):
+        queryset = self.rows()
+        if self.keep_unread:
+            queryset = queryset.filter(is_read=True)
+        return queryset
+
+
+def retention_policies():
+    config = getattr(settings, "TASK_RETENTION", DEFAULT_RETENTION)
+    return [RetentionPolicy.from_settings(name, options) for name, options in config.items()]
+
+
+def purge_retention(policies=None, now=None, chunk_size=5000, pause=0.0, max_seconds=None, progress=None):
+    """
+    Apply the retention policies (TASK_RETENTION by default), `chunk_size`
+    rows per transaction with `pause` seconds between chunks. Stops after
+    the chunk that crosses `max_seconds`, leaving the rest for the next
+    run ("complete": False). `progress(table, phase, deleted)` is called
+    after every chunk with the rows that phase has deleted so far.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    policies = retention_policies() if policies is None else policies
+    stats = {policy.name: dict.fromkeys(PHASES, 0) for policy in policies}
+    chunks = 0
+    complete = True
+
+    for policy in policies:
+        for phase, purge in (("age", _purge_expired), ("per_user", _purge_over_limit)):
+            if not complete:
+                break
+            name = policy.sweep_name(phase)
+            state = SweepState.objects.filter(name=name).first() or SweepState(name=name, watermark=now)
+            for deleted in purge(policy, state, now, chunk_size):
+                stats[policy.name][phase] += deleted
+                chunks += 1
+                state.save()
+                if progress:
+                    progress(policy.name, phase, stats[policy.name][phase])
+                if max_seconds is not None and time.perf_counter() - started >= max_seconds:
+                    complete = False
+                    break
+                if pause:
+                    time.sleep(pause)
+            else:
+                if state.pk:
+                    state.delete()
+
+    deleted = sum(sum(phases.values()) for phases in stats.values())
+    connection = connections[router.db_for_write(TaskHistory)]
+    if deleted and connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA optimize")
+
+    elapsed = time.perf_counter() - started
+    return {
+        **stats,
+        "deleted": deleted,
+        "chunks": chunks,
+        "complete": complete,
+        "seconds": round(elapsed, 4),
+        "rows_per_second": round(deleted / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def _purge_expired(policy, state, now, chunk_size):
+    """Rows older than max_age. The cutoff is kept in the state, so a resumed run keeps it."""
+    if policy.max_age is None:
+        return
+    if state.position is None:
+        state.watermark = now - policy.max_age
+    expired = policy.purgeable().filter(**{f"{policy.date_field}__lt": state.watermark})
+    for deleted, position in _delete_in_chunks(expired, state.position or 0, chunk_size):
+        state.position = position
+        yield deleted
+
+
+def _purge_over_limit(policy, state, now, chunk_size):
+    """Each user's rows beyond their newest max_rows_per_user, users in id order."""
+    limit = policy.max_rows_per_user
+    if limit is None:
+        return
+    model, date_field = policy.model, policy.date_field
+    over_limit = list(
+        policy.rows().filter(user_id__gt=state.position or 0)
+        .values("user_id").annotate(rows=Count("pk")).filter(rows__gt=limit)
+        .order_by("user_id").values_list("user_id", flat=True)
+    )
+    for user_id in over_limit:
+        newest = model._base_manager.filter(user_id=user_id).order_by(f"-{date_field}", "-pk")
+        boundary = newest.values_list(date_field, "pk")[limit:limit + 1]
+        for changed, pk in boundary:
+            older = policy.purgeable().filter(user_id=user_id).filter(
+                Q(**{f"{date_field}__lt": changed}) | Q(**{date_field: changed, "pk__lte": pk})
+            )
+            for deleted, _ in _delete_in_chunks(older, 0, chunk_size):
+                yield deleted
+        state.position = user_id
+
+
+def _delete_in_chunks(queryset, position, chunk_size):
+    """
+    Delete `queryset`'s rows with keys above `position` in key order, each
+    chunk in its own transaction. Yields (rows deleted, last key covered).
+    """
+    while True:
+        remaining = queryset.filter(pk__gt=position)
+        last = next(iter(remaining.order_by("pk").values_list("pk", flat=True)[chunk_size - 1:chunk_size]), None)
+        chunk = remaining.filter(pk__lte=last) if last is not None else remaining
+        with transaction.atomic(using=queryset.db):
+            users = set(chunk.order_by().values_list("user_id", flat=True).distinct())
+            # A single DELETE ... WHERE, without Django collecting the rows
+            # first to send signals (neither table has dependents).
+            deleted = chunk._raw_delete(queryset.db) if users else 0
+            invalidate_users(users)
+        if last is None:
+            if deleted:
+                yield deleted, position
+            return
+        position = last
+        yield deleted, position
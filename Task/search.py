@@ -0,0 +1,234 @@
+"""
+Full-text search over task titles and descriptions.
+
+SQLite uses an FTS5 table (`task_search`) with external content pointing at
+Task_tasks; Postgres uses a generated `search_vector` tsvector column with a
+GIN index. Both are created by migration 0006 and kept in sync by the
+database itself (triggers / generated column), so bulk_create, update() and
+cascading deletes are covered too. Anything else falls back to icontains.
+
+Highlights are HTML: the task text is escaped and only the <mark> tags
+around matches are added, so they can be rendered as they are.
+"""
+import html
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+from .models import Tasks
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS task_search_ai AFTER INSERT ON "Task_tasks" BEGIN
+        INSERT INTO task_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_search_ad AFTER DELETE ON "Task_tasks" BEGIN
+        INSERT INTO task_search(task_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_search_au AFTER UPDATE OF title, description ON "Task_tasks" BEGIN
+        INSERT INTO task_search(task_search, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO task_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+# What the database wraps matches in: private-use characters, which
+# html.escape leaves alone, swapped for the tags once the text is escaped.
+MARK_START = "\ue000"
+MARK_STOP = "\ue001"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text or "")[:16]
+
+
+def render_highlight(value):
+    """A snippet marked with MARK_START/MARK_STOP, as escaped HTML with <mark> tags."""
+    if value is None:
+        return None
+    return html.escape(value).replace(MARK_START, HIGHLIGHT_START).replace(MARK_STOP, HIGHLIGHT_STOP)
+
+
+class IContainsSearchBackend:
+    """The old SearchFilter behaviour: unranked substring matching."""
+    name = "icontains"
+
+    def filter(self, queryset, text):
+        for token in tokenize(text):
+            queryset = queryset.filter(Q(title__icontains=token) | Q(description__icontains=token))
+        return queryset
+
+    def ranked(self, queryset, text, prefix=True, limit=20):
+        tasks = list(self.filter(queryset, text).order_by("due_date", "id")[:limit])
+        return [(task.pk, 0.0, self.highlight(task.title, text), self.highlight(task.description, text)) for task in tasks]
+
+    def highlight(self, value, text):
+        tokens = sorted(tokenize(text), key=len, reverse=True)
+        if not tokens:
+            return html.escape(value)
+        # Odd pieces are the matches.
+        pieces = re.split(f"({'|'.join(map(re.escape, tokens))})", value, flags=re.IGNORECASE)
+        return "".join(
+            f"{HIGHLIGHT_START}{html.escape(piece)}{HIGHLIGHT_STOP}" if i % 2 else html.escape(piece)
+            for i, piece in enumerate(pieces)
+        )
+
+
+class SQLiteFTSSearchBackend:
+    name = "sqlite_fts5"
+
+    def match_expression(self, text, prefix):
+        tokens = ['"%s"' % token for token in tokenize(text)]
+        if prefix and tokens:
+            tokens[-1] += "*"
+        return " ".join(tokens)
+
+    def filter(self, queryset, text):
+        expression = self.match_expression(text, prefix=True)
+        if not expression:
+            return queryset
+        return queryset.filter(pk__in=RawSQL("SELECT rowid FROM task_search WHERE task_search MATCH %s", [expression]))
+
+    def ranked(self, queryset, text, prefix=True, limit=20):
+        expression = self.match_expression(text, prefix)
+        if not expression:
+            return []
+        scope_sql, scope_params = queryset.values("id").query.sql_with_params()
+        # The unary + keeps SQLite from handing the rowid IN (...) constraint
+        # to FTS5, which would otherwise evaluate MATCH once per scoped row.
+        sql = f"""
+            SELECT rowid,
+                   bm25(task_search, 10.0, 1.0) AS score,
+                   snippet(task_search, 0, %s, %s, '…', 12),
+                   snippet(task_search, 1, %s, %s, '…', 24)
+            FROM task_search
+            WHERE task_search MATCH %s AND +rowid IN ({scope_sql})
+            ORDER BY score
+            LIMIT %s
+        """
+        params = [MARK_START, MARK_STOP] * 2 + [expression, *scope_params, limit]
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            # bm25 is "lower is better"; flip it so callers always sort descending.
+            return [
+                (pk, -score, render_highlight(title), render_highlight(description))
+                for pk, score, title, description in cursor.fetchall()
+            ]
+
+
+class PostgresSearchBackend:
+    name = "postgres"
+    config = "english"
+
+    def tsquery(self, text, prefix):
+        tokens = tokenize(text)
+        if prefix and tokens:
+            tokens[-1] += ":*"
+        return " & ".join(tokens)
+
+    def filter(self, queryset, text):
+        query = self.tsquery(text, prefix=True)
+        if not query:
+            return queryset
+        return queryset.filter(pk__in=RawSQL(
+            'SELECT id FROM "Task_tasks" WHERE search_vector @@ to_tsquery(%s::regconfig, %s)',
+            [self.config, query],
+        ))
+
+    def ranked(self, queryset, text, prefix=True, limit=20):
+        query = self.tsquery(text, prefix)
+        if not query:
+            return []
+        scope_sql, scope_params = queryset.values("id").query.sql_with_params()
+        options = f"StartSel={MARK_START}, StopSel={MARK_STOP}, MaxFragments=2"
+        sql = f"""
+            SELECT t.id,
+                   ts_rank_cd(t.search_vector, q) AS rank,
+                   ts_headline(%s::regconfig, t.title, q, %s),
+                   ts_headline(%s::regconfig, t.description, q, %s)
+            FROM "Task_tasks" t, to_tsquery(%s::regconfig, %s) q
+            WHERE t.search_vector @@ q AND t.id IN ({scope_sql})
+            ORDER BY rank DESC, t.id
+            LIMIT %s
+        """
+        params = [self.config, options, self.config, options, self.config, query, *scope_params, limit]
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                (pk, rank, render_highlight(title), render_highlight(description))
+                for pk, rank, title, description in cursor.fetchall()
+            ]
+
+
+def ensure_sqlite_search_triggers(sender=None, using="default", **kwargs):
+    """
+    post_migrate hook. SQLite rebuilds Task_tasks (dropping its triggers)
+    whenever a later migration alters a column, so reinstall them and rebuild
+    the index if any went missing.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite" or "task_search" not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'task_search_%'")
+        if cursor.fetchone()[0] == len(SQLITE_TRIGGERS):
+            return
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO task_search(task_search) VALUES ('rebuild')")
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (IContainsSearchBackend, SQLiteFTSSearchBackend, PostgresSearchBackend)
+}
+
+
+@lru_cache(maxsize=None)
+def _detect_backend(alias):
+    connection = connections[alias]
+    if connection.vendor == "postgresql":
+        columns = [c.name for c in connection.introspection.get_table_description(connection.cursor(), "Task_tasks")]
+        if "search_vector" in columns:
+            return PostgresSearchBackend.name
+    if connection.vendor == "sqlite" and "task_search" in connection.introspection.table_names():
+        return SQLiteFTSSearchBackend.name
+    return IContainsSearchBackend.name
+
+
+def get_search_backend(alias=None):
+    """
+    TASK_SEARCH_BACKEND picks a backend by name; "auto" (the default) uses the
+    database's native index when migration 0006 was able to create it.
+    """
+    alias = alias or router.db_for_read(Tasks)
+    name = getattr(settings, "TASK_SEARCH_BACKEND", "auto")
+    if name == "auto":
+        name = _detect_backend(alias)
+    return BACKENDS[name]()
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    Drop-in for SearchFilter that matches through the full-text index.
+    Archived tasks are not indexed and are matched with icontains.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, "")
+        if not tokenize(text):
+            return queryset
+        backend = get_search_backend(queryset.db) if queryset.model is Tasks else IContainsSearchBackend()
+        return backend.filter(queryset, text)
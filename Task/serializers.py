@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Tasks, Category, TaskHistory, Notification
+from .models import Tasks, Category, TaskHistory, Notification, ArchivedTask
+from django.db import transaction
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from datetime import timedelta
@@ -47,7 +48,10 @@ class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tasks
         fields = "__all__"
-        read_only_fields = ["user","created_at", "updated_at", "completed_at"]
+        read_only_fields = [
+            "user", "created_at", "updated_at", "completed_at", "unarchived_at",
+            "recurrence_start", "occurrence_index", "previous_occurrence",
+        ]
 
     def validate_due_date(self, value):
         if value <= timezone.now():
@@ -61,6 +65,11 @@ class TaskSerializer(serializers.ModelSerializer):
         return value
     
     def validate(self, data):
+        until = data.get("recurrence_until", getattr(self.instance, "recurrence_until", None))
+        due_date = data.get("due_date", getattr(self.instance, "due_date", None))
+        if until is not None and due_date is not None and until < due_date:
+            raise serializers.ValidationError({"recurrence_until": "Must not be before the due date."})
+
         if self.instance is None:
             if data.get("status") == "completed":
                 raise serializers.ValidationError(
@@ -76,15 +85,9 @@ class TaskSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     "Completed tasks cannot be edited unless reverted to pending or in progress."
                 )
-            
-        valid_transitions = {
-            "pending": ["in_progress", "completed"],
-            "in_progress": ["pending", "completed"],
-            "completed": ["pending", "in_progress"],
-        }
 
         current_status = self.instance.status
-        if new_status not in valid_transitions.get(current_status, []):
+        if new_status not in Tasks.VALID_TRANSITIONS.get(current_status, []):
             raise serializers.ValidationError(
                 f"Invalid status transition from {current_status} to {new_status}."
             )
@@ -92,46 +95,33 @@ class TaskSerializer(serializers.ModelSerializer):
         return data
     
     def update(self, instance, validated_data):
+        from .services import apply_transitions  # services imports this module
+
         collaborators = validated_data.pop("collaborators", None)
-        if collaborators is not None:
-            instance.collaborators.set(collaborators)
-    
-        old_status = instance.status
-        new_status = validated_data.get('status', old_status)
-
-        if old_status != 'completed' and new_status == 'completed':
-            instance.completed_at = timezone.now()
-
-            # Handle recurrence
-        if instance.recurrence != "none":
-            new_due_date = None
-            if instance.recurrence == "daily":
-                new_due_date = instance.due_date + timedelta(days=1)
-            elif instance.recurrence == "weekly":
-                new_due_date = instance.due_date + timedelta(weeks=1)
-            elif instance.recurrence == "monthly":
-                new_due_date = instance.due_date + timedelta(days=30)
-
-            Tasks.objects.create(
-                title=instance.title,
-                description=instance.description,
-                due_date=new_due_date,
-                priority=instance.priority,
-                status="pending",
-                user=instance.user,
-                recurrence=instance.recurrence,
-                category=instance.category,
-            )
-            
-        elif old_status == 'completed' and new_status != 'completed':
-            instance.completed_at = None
-        
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        
-        instance.save()
+        new_status = validated_data.pop("status", instance.status)
+        request = self.context.get("request")
+
+        with transaction.atomic():
+            if collaborators is not None:
+                instance.collaborators.set(collaborators)
+            if validated_data:
+                for attr, value in validated_data.items():
+                    setattr(instance, attr, value)
+                # Only the submitted columns, so a concurrent edit of other
+                # fields isn't overwritten with what this request read.
+                instance.save(update_fields=[*validated_data, "updated_at"])
+            if new_status != instance.status:
+                apply_transitions(request.user if request else instance.user, [instance], new_status)
         return instance
     
+class ArchivedTaskSerializer(TaskSerializer):
+    """TaskSerializer's output for an archived task, plus archived_at. Read only."""
+    previous_occurrence = serializers.IntegerField(source="previous_occurrence_id", read_only=True)
+
+    class Meta:
+        model = ArchivedTask
+        exclude = ["previous_occurrence_id", "next_occurrence_id"]
+
 class TaskHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = TaskHistory
@@ -142,3 +132,90 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ["id", "task", "message", "created_at", "is_read"]
 
+
+class TaskBatchOperationSerializer(serializers.Serializer):
+    OPERATIONS = ["create", "update", "delete"]
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, data):
+        if data["op"] != "create" and "id" not in data:
+            raise serializers.ValidationError(f"'id' is required for {data['op']} operations.")
+        return data
+
+class TaskBatchSerializer(serializers.Serializer):
+    MAX_OPERATIONS = 500
+
+    operations = TaskBatchOperationSerializer(many=True, allow_empty=False)
+    atomic = serializers.BooleanField(default=True)
+
+    def validate_operations(self, value):
+        if len(value) > self.MAX_OPERATIONS:
+            raise serializers.ValidationError(
+                f"A batch may contain at most {self.MAX_OPERATIONS} operations."
+            )
+        return value
+
+class TaskImportSerializer(serializers.Serializer):
+    FORMATS = ["csv", "ndjson"]
+
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=FORMATS, required=False)
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        from .imports import format_from_filename  # imports uses TaskSerializer
+
+        if "format" not in data:
+            data["format"] = format_from_filename(data["file"].name)
+            if data["format"] is None:
+                raise serializers.ValidationError(
+                    {"format": "Give the format (csv or ndjson) or upload a .csv or .ndjson file."}
+                )
+        return data
+
+class TaskBulkTransitionSerializer(serializers.Serializer):
+    MAX_IDS = 500
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_IDS,
+    )
+    status = serializers.ChoiceField(choices=Tasks.STATUS_CHOICES)
+
+
+class NotificationMarkReadSerializer(serializers.Serializer):
+    MAX_IDS = 500
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_IDS,
+        required=False,
+    )
+    task = serializers.IntegerField(min_value=1, required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if len(data) != 1:
+            raise serializers.ValidationError("Give exactly one of ids, task or until.")
+        return data
+
+
+class TaskOccurrenceQuerySerializer(serializers.Serializer):
+    MAX_WINDOW = timedelta(days=366)
+
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    scope = serializers.ChoiceField(choices=["owned", "shared", "all"], default="owned")
+    limit = serializers.IntegerField(min_value=1, max_value=5000, default=1000)
+
+    def validate(self, data):
+        if data["end"] < data["start"]:
+            raise serializers.ValidationError({"end": "Must not be before start."})
+        if data["end"] - data["start"] > self.MAX_WINDOW:
+            raise serializers.ValidationError({"end": f"The window may span at most {self.MAX_WINDOW.days} days."})
+        return data
@@ -0,0 +1,521 @@
+import heapq
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Tasks, Category, TaskHistory, Notification, TaskCounter
+from .counters import COUNTED_FIELDS, OPEN_STATUSES, aggregate_counters
+from .serializers import TaskSerializer
+from .cache import bulk_invalidation, collaborator_ids, invalidate_users, task_audience
+from .events import publish_notifications
+
+
+DUE_SOON_WINDOW = timedelta(hours=24)
+
+
+def notify_due_soon(tasks, now=None):
+    """
+    Bulk counterpart of the due-soon signal for writes that bypass post_save.
+    Tasks that already have an unread due-soon notification are skipped.
+    """
+    horizon = (now or timezone.now()) + DUE_SOON_WINDOW
+    due = [task for task in tasks if task.status != "completed" and task.due_date <= horizon]
+    if not due:
+        return []
+    notified = set(
+        Notification.objects.filter(
+            task__in=due,
+            message__icontains="due soon",
+            is_read=False,
+        ).values_list("task_id", flat=True)
+    )
+    created = Notification.objects.bulk_create([
+        Notification(user_id=task.user_id, task=task, message=f"Task '{task.title}' is due soon!")
+        for task in due
+        if task.pk not in notified
+    ])
+    invalidate_users({notification.user_id for notification in created})
+    publish_notifications(created)
+    return created
+
+
+UNREAD_COUNT_CAP = 1000
+
+
+def unread_notification_count(user):
+    """
+    How many unread notifications `user` has, counted on the (user, is_read,
+    created_at) index. Counting stops past UNREAD_COUNT_CAP, so the cost is
+    bounded however many pile up; badges show "1000+" then.
+    """
+    count = Notification.objects.filter(user=user, is_read=False).order_by()[:UNREAD_COUNT_CAP + 1].count()
+    return {"unread": min(count, UNREAD_COUNT_CAP), "capped": count > UNREAD_COUNT_CAP}
+
+
+def read_notifications(user, ids=None, task=None, until=None):
+    """
+    Mark `user`'s unread notifications read with one UPDATE, narrowed to the
+    given ids, to one task, or to those created up to `until`. Returns how
+    many changed.
+    """
+    notifications = Notification.objects.filter(user=user, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(pk__in=ids)
+    if task is not None:
+        notifications = notifications.filter(task_id=task)
+    if until is not None:
+        notifications = notifications.filter(created_at__lte=until)
+    updated = notifications.update(is_read=True)
+    if updated:
+        invalidate_users([user.pk])
+    return updated
+
+
+def spawn_next_occurrences(tasks):
+    """
+    Create the next task in each recurring series in `tasks`, copying its
+    collaborators. Idempotent: a task that already has a successor is skipped,
+    so completing, reopening and completing again never forks a series.
+    Returns the created tasks.
+    """
+    candidates = {task.pk: task for task in tasks if task.recurrence != "none"}
+    if not candidates:
+        return []
+    spawned_from = set(
+        Tasks.objects.filter(previous_occurrence_id__in=candidates).values_list("previous_occurrence_id", flat=True)
+    )
+    spawned = [task.spawn_next_occurrence() for pk, task in candidates.items() if pk not in spawned_from]
+    spawned = [task for task in spawned if task is not None]
+    if not spawned:
+        return []
+
+    with transaction.atomic():
+        spawned = Tasks.objects.bulk_create(spawned)
+        TaskCounter.objects.record((None, task.counted_state()) for task in spawned)
+
+        through = Tasks.collaborators.through
+        shared = {}
+        for task_id, user_id in through.objects.filter(
+            tasks_id__in=[task.previous_occurrence_id for task in spawned]
+        ).values_list("tasks_id", "customuser_id"):
+            shared.setdefault(task_id, []).append(user_id)
+        through.objects.bulk_create([
+            through(tasks_id=task.pk, customuser_id=user_id)
+            for task in spawned
+            for user_id in shared.get(task.previous_occurrence_id, [])
+        ])
+
+    notify_due_soon(spawned)
+    invalidate_users({task.user_id for task in spawned} | {user_id for users in shared.values() for user_id in users})
+    return spawned
+
+
+def _merge_by_time(streams):
+    """
+    heapq.merge over (task_id, iterator of (local_time, index, *extra))
+    streams, specialised so heap entries stay flat lists comparing on local
+    time, then task id, without a key function. A stream with task_id None
+    carries each item's task id as extra[0].
+    """
+    heap = []
+    for task_id, stream in streams:
+        for local_time, index, *extra in stream:
+            heap.append([local_time, task_id or extra[0], index, extra, task_id, stream])
+            break
+    heapq.heapify(heap)
+    while heap:
+        entry = heap[0]
+        yield entry[:4]
+        for local_time, index, *extra in entry[5]:
+            entry[:4] = local_time, entry[4] or extra[0], index, extra
+            heapq.heapreplace(heap, entry)
+            break
+        else:
+            heapq.heappop(heap)
+
+
+def expand_occurrences(queryset, start, end, limit=None):
+    """
+    Calendar of `queryset` between start and end: every stored task due in the
+    window plus the future occurrences of each open series, computed on the
+    fly and never written. Yields dicts in due-date order, lazily.
+    """
+    tz = timezone.get_current_timezone()
+    rows = queryset.filter(due_date__range=(start, end)).order_by("due_date", "id").values_list(
+        "due_date", "occurrence_index", "id", "title", "status"
+    ).iterator()
+    stored = (
+        (timezone.localtime(due_date, tz).replace(tzinfo=None), index, task_id, title, status)
+        for due_date, index, task_id, title, status in rows
+    )
+
+    # Only the last stored task of a series (the one without a successor)
+    # projects forward; everything before it is already a real row.
+    heads = queryset.exclude(recurrence="none").filter(
+        next_occurrence__isnull=True, due_date__lte=end,
+    ).exclude(recurrence_until__lt=start).only(
+        "id", "title", "due_date", "recurrence", "recurrence_interval",
+        "recurrence_until", "recurrence_count", "recurrence_start", "occurrence_index",
+    )
+    titles = {}
+    streams = [(None, stored)]
+    for task in heads:
+        titles[task.pk] = task.title
+        streams.append((task.pk, task.recurrence_rule.wall_clock_between(
+            task.recurrence_anchor, start, end, first_index=task.occurrence_index + 1
+        )))
+
+    # Merged on naive local times, the cheapest thing to compare; dicts and
+    # aware datetimes are only built for what the caller consumes.
+    merged = _merge_by_time(streams)
+    if limit is not None:
+        merged = islice(merged, limit)
+    for local_time, task_id, index, extra in merged:
+        title, status = extra[1:] if extra else (titles[task_id], "pending")
+        yield {
+            "task": task_id,
+            "title": title,
+            "status": status,
+            "due_date": timezone.make_aware(local_time, tz),
+            "occurrence_index": index,
+            "virtual": not extra,
+        }
+
+
+def _collaborator_rows(task_id, users):
+    through = Tasks.collaborators.through
+    return [through(tasks_id=task_id, customuser_id=user.pk) for user in users]
+
+
+def _load_batch_targets(user, ids):
+    queryset = Tasks.objects.select_for_update().filter(pk__in=ids)
+    if not user.is_staff:
+        queryset = queryset.visible_to(user)
+    return {task.pk: task for task in queryset}
+
+
+def _result(index, operation, status_code, **extra):
+    return {"index": index, "op": operation["op"], "status": status_code, **extra}
+
+
+def apply_task_batch(request, operations, atomic=True):
+    """
+    Validate and apply a list of create/update/delete operations in one
+    transaction. Returns (results, applied) where results has one entry per
+    operation, in request order.
+
+    With atomic=True a single invalid operation rejects the whole batch;
+    otherwise the valid operations are applied and the invalid ones reported.
+    """
+    user = request.user
+    context = {"request": request}
+    results = [None] * len(operations)
+
+    with transaction.atomic(), bulk_invalidation():
+        # Validated against locked rows, so what was checked is what gets written.
+        targets = _load_batch_targets(user, [op["id"] for op in operations if op["op"] != "create"])
+
+        seen = set()
+        creates, updates, deletes = [], [], []
+        for index, operation in enumerate(operations):
+            if operation["op"] == "create":
+                serializer = TaskSerializer(data=operation["data"], context=context)
+            else:
+                task = targets.get(operation["id"])
+                if task is None:
+                    results[index] = _result(index, operation, 404, id=operation["id"], errors={"detail": "Task not found."})
+                    continue
+                if task.pk in seen:
+                    results[index] = _result(index, operation, 400, id=task.pk, errors={"detail": "Task appears more than once in the batch."})
+                    continue
+                seen.add(task.pk)
+                if operation["op"] == "delete":
+                    deletes.append((index, operation, task))
+                    continue
+                serializer = TaskSerializer(task, data=operation["data"], partial=True, context=context)
+
+            if not serializer.is_valid():
+                results[index] = _result(index, operation, 400, id=operation.get("id"), errors=serializer.errors)
+                continue
+            (creates if operation["op"] == "create" else updates).append((index, operation, serializer))
+
+        if atomic and any(result is not None for result in results):
+            for index, operation in enumerate(operations):
+                if results[index] is None:
+                    results[index] = _result(index, operation, 424, id=operation.get("id"), errors={
+                        "detail": "Not applied because another operation in the batch failed."
+                    })
+            return results, False
+
+        # Collected before the writes so removed collaborators and deleted
+        # tasks' audiences are still visible.
+        audience = task_audience(
+            [task.pk for _, _, task in deletes] + [serializer.instance.pk for _, _, serializer in updates]
+        )
+        created = bulk_create_tasks(user, [serializer.validated_data for _, _, serializer in creates])
+        updated = _bulk_update_tasks(user, updates)
+        if deletes:
+            Tasks.objects.filter(pk__in=[task.pk for _, _, task in deletes]).delete()
+            TaskCounter.objects.record((task.counted_state(), None) for _, _, task in deletes)
+        notify_due_soon(created + updated)
+        audience |= task_audience([task.pk for task in created + updated])
+        invalidate_users(audience)
+
+    written = {
+        task.pk: task
+        for task in Tasks.objects.filter(pk__in=[task.pk for task in created + updated])
+        .select_related("category").prefetch_related("collaborators")
+    }
+    for (index, operation, _), task in zip(creates, created):
+        results[index] = _result(index, operation, 201, id=task.pk, data=TaskSerializer(written[task.pk]).data)
+    for (index, operation, _), task in zip(updates, updated):
+        results[index] = _result(index, operation, 200, id=task.pk, data=TaskSerializer(written[task.pk]).data)
+    for index, operation, task in deletes:
+        results[index] = _result(index, operation, 204, id=operation["id"])
+    return results, True
+
+
+def bulk_create_tasks(user, rows):
+    """
+    Insert tasks for `user` from TaskSerializer-validated data, with their
+    collaborators and counters. Signals are skipped: callers send the
+    due-soon notifications and invalidate cached responses.
+    """
+    tasks, collaborators = [], []
+    for row in rows:
+        data = dict(row)
+        collaborators.append(data.pop("collaborators", []))
+        tasks.append(Tasks(user=user, **data))
+    if not tasks:
+        return []
+
+    tasks = Tasks.objects.bulk_create(tasks)
+    TaskCounter.objects.record((None, task.counted_state()) for task in tasks)
+    rows = []
+    for task, users in zip(tasks, collaborators):
+        rows.extend(_collaborator_rows(task.pk, users))
+    Tasks.collaborators.through.objects.bulk_create(rows, ignore_conflicts=True)
+    return tasks
+
+
+def _bulk_update_tasks(user, updates):
+    """
+    Apply the same rules as TaskSerializer.update: field changes go out in one
+    bulk_update, status changes through apply_transitions (one call per
+    target status) after the collaborator changes, so next occurrences
+    inherit them.
+    """
+    now = timezone.now()
+    tasks, changes = [], []
+    fields = {"updated_at"}
+    collaborator_changes = {}
+    transitions = defaultdict(list)
+
+    for _, _, serializer in updates:
+        task = serializer.instance
+        before = task.counted_state()
+        data = dict(serializer.validated_data)
+        if "collaborators" in data:
+            collaborator_changes[task.pk] = data.pop("collaborators")
+        new_status = data.pop("status", task.status)
+        if new_status != task.status:
+            transitions[new_status].append(task)
+
+        for attr, value in data.items():
+            setattr(task, attr, value)
+            fields.add(attr)
+        task.updated_at = now
+        tasks.append(task)
+        changes.append((before, task.counted_state()))
+
+    if not tasks:
+        return []
+
+    Tasks.objects.bulk_update(tasks, sorted(fields))
+    TaskCounter.objects.record(changes)
+
+    if collaborator_changes:
+        through = Tasks.collaborators.through
+        through.objects.filter(tasks_id__in=collaborator_changes).delete()
+        rows = []
+        for task_id, users in collaborator_changes.items():
+            rows.extend(_collaborator_rows(task_id, users))
+        through.objects.bulk_create(rows, ignore_conflicts=True)
+
+    for target, moving in transitions.items():
+        apply_transitions(user, moving, target, now=now)
+    return tasks
+
+
+class TransitionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The task was changed by another request; reload it and try again."
+    default_code = "conflict"
+
+
+def apply_transitions(user, tasks, target, now=None):
+    """
+    The one way task statuses change. Moves `tasks` to `target`, each from the
+    status it was read with, using one conditional UPDATE ... WHERE id IN (...)
+    AND status = <read status> per source status. If any row had already moved
+    on, TransitionConflict is raised and the transaction rolls back.
+
+    In the same transaction it records a TaskHistory row per task, moves the
+    counters, invalidates cached responses and spawns the next occurrences on
+    completion. Callers validate the transition itself.
+    """
+    if not tasks:
+        return []
+    now = now or timezone.now()
+    completed_at = now if target == "completed" else None
+    sources = defaultdict(list)
+    for task in tasks:
+        sources[task.status].append(task.pk)
+    ids = [task.pk for task in tasks]
+
+    with transaction.atomic(savepoint=False):
+        updated = sum(
+            Tasks.objects.filter(pk__in=source_ids, status=source).update(
+                status=target, completed_at=completed_at, updated_at=now,
+            )
+            for source, source_ids in sources.items()
+        )
+        if updated != len(tasks):
+            raise TransitionConflict()
+
+        # Counter deltas come from the rows as stored (and now locked), not
+        # from the instances, whose other fields may be out of date.
+        stored = Tasks.objects.filter(pk__in=ids).values_list("pk", *COUNTED_FIELDS)
+        read_status = {task.pk: task.status for task in tasks}
+        TaskCounter.objects.record(
+            ((user_id, read_status[pk], *rest), (user_id, current, *rest))
+            for pk, user_id, current, *rest in stored
+        )
+        TaskHistory.objects.bulk_create([TaskHistory(task=task, user=user, status=target) for task in tasks])
+        for task in tasks:
+            task.status, task.completed_at, task.updated_at = target, completed_at, now
+        invalidate_users(collaborator_ids(ids) | {task.user_id for task in tasks})
+
+        if target == "completed":
+            spawn_next_occurrences(tasks)
+        else:
+            notify_due_soon(tasks, now=now)
+    return tasks
+
+
+def bulk_transition(user, ids, target):
+    """
+    Move the caller's tasks in `ids` to `target` with one conditional UPDATE.
+    Returns (updated_ids, skipped) where skipped lists {"id", "reason"} dicts.
+    """
+    ids = list(dict.fromkeys(ids))
+    sources = Tasks.transition_sources(target)
+
+    with transaction.atomic():
+        tasks = {
+            task.pk: task
+            for task in Tasks.objects.select_for_update().filter(pk__in=ids, user=user)
+        }
+        skipped, eligible = [], []
+        for task_id in ids:
+            task = tasks.get(task_id)
+            if task is None:
+                skipped.append({"id": task_id, "reason": "not_found"})
+            elif task.status not in sources:
+                reason = "unchanged" if task.status == target else "invalid_transition"
+                skipped.append({"id": task_id, "reason": reason})
+            else:
+                eligible.append(task_id)
+
+        apply_transitions(user, [tasks[task_id] for task_id in eligible], target)
+    return eligible, skipped
+
+
+def task_stats(user, now=None):
+    """
+    Dashboard counts for the tasks `user` owns, read from TaskCounter with a
+    fixed number of indexed lookups however many tasks there are.
+    """
+    now = now or timezone.now()
+    counters = {
+        (dimension, key): count
+        for dimension, key, count in TaskCounter.objects.filter(
+            user=user, dimension__in=["total", "status", "priority", "category"]
+        ).values_list("dimension", "key", "count")
+    }
+
+    # Open tasks due on earlier (UTC) days are overdue as a whole; today's
+    # are counted exactly on the (user, status, due_date) index.
+    day_start = now.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    overdue = TaskCounter.objects.filter(
+        user=user, dimension="due", key__lt=day_start.date().isoformat()
+    ).aggregate(total=Sum("count"))["total"] or 0
+    overdue += Tasks.objects.filter(
+        user=user, status__in=OPEN_STATUSES, due_date__gte=day_start, due_date__lt=now
+    ).count()
+
+    per_category = {key: count for (dimension, key), count in counters.items() if dimension == "category"}
+    names = dict(
+        Category.objects.filter(pk__in=[key for key in per_category if key != "none"]).values_list("id", "name")
+    )
+    by_category = sorted(
+        (
+            {"id": None, "name": None, "count": count} if key == "none"
+            else {"id": int(key), "name": names.get(int(key)), "count": count}
+            for key, count in per_category.items()
+        ),
+        key=lambda entry: (-entry["count"], entry["id"] is None, entry["name"] or ""),
+    )
+    return {
+        "total": counters.get(("total", ""), 0),
+        "by_status": {status: counters.get(("status", status), 0) for status, _ in Tasks.STATUS_CHOICES},
+        "by_priority": {priority: counters.get(("priority", priority), 0) for priority, _ in Tasks.PRIORITY_CHOICES},
+        "by_category": by_category,
+        "overdue": overdue,
+    }
+
+
+def rebuild_task_counters(user_id, fix=True):
+    """
+    Recount a user's counters from their tasks with one aggregate query and
+    compare them with the stored rows; with fix=True, correct the stored
+    rows. Returns {(dimension, key): (stored, expected)} for each mismatch.
+    """
+    with transaction.atomic():
+        rows = TaskCounter.objects.filter(user_id=user_id)
+        if fix:
+            # Writers touching these counters queue behind the recount.
+            rows = rows.select_for_update()
+        stored = {(dimension, key): count for dimension, key, count in rows.values_list("dimension", "key", "count")}
+        expected = aggregate_counters(Tasks.objects.filter(user_id=user_id))
+        drift = {
+            key: (stored.get(key, 0), expected.get(key, 0))
+            for key in stored.keys() | expected.keys()
+            if stored.get(key, 0) != expected.get(key, 0)
+        }
+        if not fix or not drift:
+            return drift
+
+        stale = {}
+        for dimension, key in drift:
+            if (dimension, key) not in expected:
+                stale.setdefault(dimension, []).append(key)
+        for dimension, keys in stale.items():
+            TaskCounter.objects.filter(user_id=user_id, dimension=dimension, key__in=keys).delete()
+        TaskCounter.objects.bulk_create(
+            [
+                TaskCounter(user_id=user_id, dimension=dimension, key=key, count=expected[dimension, key])
+                for dimension, key in drift
+                if (dimension, key) in expected
+            ],
+            update_conflicts=True,
+            unique_fields=["user", "dimension", "key"],
+            update_fields=["count"],
+        )
+    return drift
@@ -1,19 +1,35 @@
 # Task/signals.py
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
-from datetime import timedelta
-from .models import Tasks, Notification
+from .models import Tasks, Category, Notification, TaskCounter, ArchivedTask
+from .services import DUE_SOON_WINDOW
+from .cache import invalidate_users, task_audience, collaborator_ids, in_bulk_invalidation
+from .events import publish_notifications
+from .authentication import bump_user_version
 
 @receiver(post_save, sender=Tasks)
-def task_due_soon_notification(sender, instance, created, **kwargs):
+def task_due_soon_notification(sender, instance, created, update_fields=None, **kwargs):
     """
     Trigger a notification if a task is due within 24 hours.
     Avoid duplicates by checking existing unread notifications.
+
+    This is only the fast path for tasks created or moved into the window;
+    `run_due_soon_sweep` catches tasks that drift into it without a save.
+    Set TASK_DUE_SOON_SIGNAL = False to rely on the sweep alone.
     """
-    if instance.due_date - timezone.now() <= timedelta(hours=24):
+    if not getattr(settings, "TASK_DUE_SOON_SIGNAL", True):
+        return
+    if update_fields is not None and "due_date" not in update_fields:
+        return
+    if instance.status == "completed":
+        return
+
+    if instance.due_date - timezone.now() <= DUE_SOON_WINDOW:
         already_exists = Notification.objects.filter(
-            user=instance.user,
             task=instance,
             message__icontains="due soon",
             is_read=False
@@ -24,4 +40,111 @@ def task_due_soon_notification(sender, instance, created, **kwargs):
                 user=instance.user,
                 task=instance,
                 message=f"Task '{instance.title}' is due soon!"
-            )
\ No newline at end of file
+            )
+
+
+# Response cache invalidation (see Task/cache.py). Writes that bypass model
+# signals (bulk_create/update) call invalidate_users themselves.
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reset_user_cache_generation(sender, instance, created, **kwargs):
+    if created:
+        invalidate_users([instance.pk])
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    # Cached JWT users (Task/authentication.py) are reloaded on next use.
+    bump_user_version(instance)
+
+@receiver(post_save, sender=Tasks)
+@receiver(post_delete, sender=Tasks)
+def invalidate_task_audience(sender, instance, **kwargs):
+    if in_bulk_invalidation():
+        return
+    audience = getattr(instance, "_cache_audience", None)
+    if audience is None:
+        audience = collaborator_ids([instance.pk]) | {instance.user_id}
+    invalidate_users(audience)
+
+@receiver(pre_delete, sender=Tasks)
+def remember_task_audience(sender, instance, **kwargs):
+    # The collaborator rows are gone by post_delete, so collect them first.
+    if not in_bulk_invalidation():
+        instance._cache_audience = collaborator_ids([instance.pk]) | {instance.user_id}
+
+@receiver(m2m_changed, sender=Tasks.collaborators.through)
+def invalidate_collaborator_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Owners see collaborator ids in their task lists, collaborators see the
+    # tasks themselves, so both sides of the relation are affected.
+    if action not in ("post_add", "post_remove", "pre_clear") or in_bulk_invalidation():
+        return
+    if reverse:
+        task_ids = pk_set if pk_set is not None else instance.shared_tasks.values_list("pk", flat=True)
+        affected = task_audience(task_ids) | {instance.pk}
+    else:
+        affected = collaborator_ids([instance.pk]) | set(pk_set or []) | {instance.user_id}
+    invalidate_users(affected)
+
+def category_audience(category):
+    # Tasks embed their category, so collaborators on those tasks see it too.
+    shared_with = set()
+    for model in (Tasks, ArchivedTask):
+        field = model._meta.get_field("collaborators")
+        shared_with.update(field.remote_field.through.objects.filter(
+            **{f"{field.m2m_field_name()}__category_id": category.pk}
+        ).values_list(f"{field.m2m_reverse_field_name()}_id", flat=True))
+    return shared_with | {category.user_id}
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_owner(sender, instance, **kwargs):
+    audience = getattr(instance, "_cache_audience", None)
+    if audience is None:
+        audience = category_audience(instance)
+    invalidate_users(audience)
+
+@receiver(pre_delete, sender=Category)
+def remember_category_audience(sender, instance, **kwargs):
+    # The tasks' category_id is already NULL by post_delete, so collect them first.
+    instance._cache_audience = category_audience(instance)
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_owner(sender, instance, **kwargs):
+    invalidate_users([instance.user_id])
+
+@receiver(post_save, sender=Notification)
+def stream_new_notification(sender, instance, created, **kwargs):
+    # Bulk-created notifications are published by their creator.
+    if created:
+        publish_notifications([instance])
+
+
+# Task counters (see Task/counters.py). Saves are counted in Tasks.save();
+# deletes and category removals happen in bulk, inside the deletion's
+# transaction, so they are handled here.
+
+def _deleting_user(origin):
+    # A user's counters are deleted along with them; don't touch them again.
+    model = getattr(origin, "model", None) or type(origin)
+    return model is get_user_model()
+
+@receiver(post_delete, sender=Tasks)
+def uncount_deleted_task(sender, instance, origin=None, **kwargs):
+    if in_bulk_invalidation() or _deleting_user(origin):
+        return
+    TaskCounter.objects.record([(instance.counted_state(), None)])
+
+@receiver(pre_delete, sender=Category)
+def uncount_category(sender, instance, origin=None, **kwargs):
+    # The tasks' category_id is set to NULL by an UPDATE, without signals.
+    if _deleting_user(origin):
+        return
+    deltas = {}
+    for user_id, count in (
+        Tasks.objects.filter(category_id=instance.pk).order_by().values_list("user_id").annotate(n=Count("id"))
+    ):
+        deltas[user_id, "category", str(instance.pk)] = -count
+        deltas[user_id, "category", "none"] = count
+    TaskCounter.objects.apply(deltas)
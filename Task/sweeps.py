@@ -0,0 +1,131 @@
+import time
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import Tasks, SweepState
+from .services import DUE_SOON_WINDOW, notify_due_soon
+
+DUE_SOON_SWEEP = "due_soon"
+# Wall-clock start of the last due-soon run, for the saved-task pass below.
+DUE_SOON_SAVED_SWEEP = "due_soon:saved"
+
+
+def _notify_in_keyset_order(queryset, key, now, batch_size):
+    # Walks `queryset` ordered by (key, id) in chunks of `batch_size`.
+    scanned = created = 0
+    queryset = queryset.exclude(status="completed").only("id", "user_id", "title", "due_date", "status")
+    queryset = queryset.order_by(key, "id")
+    position = None
+    while True:
+        chunk_queryset = queryset
+        if position is not None:
+            value, pk = position
+            chunk_queryset = queryset.filter(Q(**{f"{key}__gt": value}) | Q(**{key: value, "id__gt": pk}))
+        chunk = list(chunk_queryset[:batch_size])
+        if not chunk:
+            break
+        with transaction.atomic():
+            created += len(notify_due_soon(chunk, now=now))
+        scanned += len(chunk)
+        position = (getattr(chunk[-1], key), chunk[-1].pk)
+    return scanned, created
+
+
+def run_due_soon_sweep(now=None, batch_size=1000):
+    """
+    Notify owners of tasks that entered the due-soon window since the last run.
+
+    Scans `due_date` in (last horizon, now + 24h] over the due_date index in
+    keyset order, dedupes each chunk against unread due-soon notifications
+    with one query and bulk-inserts the rest. Tasks saved since the previous
+    run with a due date at or before the last horizon, which that scan no
+    longer reaches, are picked up over the updated_at index, so the sweep
+    does not depend on TASK_DUE_SOON_SIGNAL. Re-running after a crash is
+    safe because of the dedupe; the watermarks only advance once the whole
+    window has been processed. Meant to be called from cron/celery beat or
+    the `sweep_due_soon` management command.
+    """
+    started = time.perf_counter()
+    started_at = timezone.now()
+    now = now or started_at
+    horizon = now + DUE_SOON_WINDOW
+
+    state = SweepState.objects.filter(name=DUE_SOON_SWEEP).first()
+    window_start = state.watermark if state else now
+    saved_state = SweepState.objects.filter(name=DUE_SOON_SAVED_SWEEP).first()
+
+    scanned, created = _notify_in_keyset_order(
+        Tasks.objects.filter(due_date__gt=window_start, due_date__lte=horizon), "due_date", now, batch_size
+    )
+    if saved_state:
+        saved = _notify_in_keyset_order(
+            Tasks.objects.filter(updated_at__gt=saved_state.watermark, due_date__lte=window_start),
+            "updated_at", now, batch_size,
+        )
+        scanned, created = scanned + saved[0], created + saved[1]
+
+    if horizon > window_start:
+        SweepState.objects.update_or_create(name=DUE_SOON_SWEEP, defaults={"watermark": horizon})
+    SweepState.objects.update_or_create(name=DUE_SOON_SAVED_SWEEP, defaults={"watermark": started_at})
+
+    elapsed = time.perf_counter() - started
+    return {
+        "window_start": window_start,
+        "window_end": horizon,
+        "scanned": scanned,
+        "created": created,
+        "skipped": scanned - created,
+        "seconds": round(elapsed, 4),
+        "tasks_per_second": round(scanned / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def purge_expired_tokens(now=None, batch_size=5000, pause=0.0):
+    """
+    Delete expired simplejwt outstanding tokens and their blacklist entries.
+
+    An expired token is rejected before the blacklist is consulted, so its
+    rows serve no purpose. They go `batch_size` at a time, oldest first, each
+    batch found on the expires_at index and deleted in its own short
+    transaction; `pause` seconds between batches let other writers in on
+    SQLite's single write lock. On SQLite the planner statistics are
+    refreshed afterwards with PRAGMA optimize. Meant to be called from
+    cron/celery beat or the `purge_expired_tokens` management command.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by("expires_at")
+    outstanding_label = OutstandingToken._meta.label
+    blacklisted_label = BlacklistedToken._meta.label
+
+    outstanding = blacklisted = batches = 0
+    while True:
+        ids = list(expired.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            _, deleted = OutstandingToken.objects.filter(id__in=ids).only("id").delete()
+        outstanding += deleted.get(outstanding_label, 0)
+        blacklisted += deleted.get(blacklisted_label, 0)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    connection = connections[router.db_for_write(OutstandingToken)]
+    if outstanding and connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA optimize")
+
+    elapsed = time.perf_counter() - started
+    return {
+        "outstanding": outstanding,
+        "blacklisted": blacklisted,
+        "batches": batches,
+        "seconds": round(elapsed, 4),
+        "rows_per_second": round((outstanding + blacklisted) / elapsed, 1) if elapsed else 0.0,
+    }
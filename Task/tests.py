@@ -1,8 +1,39 @@
-from django.test import TestCase
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from io import BytesIO, StringIO
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, models, transaction, OperationalError
 from django.contrib.auth import get_user_model
-from .models import Tasks, Category, TaskHistory, Notification
+from .models import (Tasks, Category, TaskHistory, Notification, SweepState, TaskCounter, ArchivedTask,
+                     ArchivedTaskHistory, ArchivedNotification)
+from .services import rebuild_task_counters, TransitionConflict
 from .serializers import TaskSerializer
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
+from rest_framework.request import Request
+from .pagination import KeysetPagination
+from .sweeps import run_due_soon_sweep, purge_expired_tokens
+from .archive import archive_completed_tasks, archive_tasks
+from .retention import RetentionPolicy, purge_retention
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from .recurrence import RecurrenceRule
+from .views import IsOwnerOrCollaborator
+from .cache import stats as cache_stats
+from .events import EventStreamApp, SQLiteHub, get_hub, notification_event
+from .benchmarks import StreamClient
+from .throttling import AnonRateThrottle, CacheStore, LocalStore, SQLiteStore, UserRateThrottle, get_store as get_throttle_store
+from .authentication import CachedJWTAuthentication
+from rest_framework.views import APIView
+from types import SimpleNamespace
+from asgiref.sync import async_to_sync, sync_to_async
+from rest_framework_simplejwt.tokens import AccessToken
 from django.utils import timezone
 from datetime import timedelta
 
@@ -82,7 +113,7 @@ class TaskAPITest(APITestCase):
         )
         response = self.client.get("/api/tasks/")
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
 
 
 class CategoryTest(TestCase):
@@ -128,6 +159,29 @@ class RecurrenceTest(TestCase):
     def test_recurrence_field(self):
         self.assertEqual(self.task.recurrence, "daily")
 
+    def test_monthly_keeps_day_of_month(self):
+        anchor = timezone.make_aware(timezone.datetime(2025, 1, 31, 9, 0))
+        rule = RecurrenceRule("monthly")
+        self.assertEqual(
+            [timezone.localtime(rule.occurrence(anchor, i)).date().isoformat() for i in range(4)],
+            ["2025-01-31", "2025-02-28", "2025-03-31", "2025-04-30"],
+        )
+
+    def test_interval_count_and_until(self):
+        anchor = timezone.make_aware(timezone.datetime(2025, 1, 1, 9, 0))
+        self.assertEqual(RecurrenceRule("weekly", interval=2).occurrence(anchor, 3), anchor + timedelta(weeks=6))
+        self.assertIsNone(RecurrenceRule("daily", count=3).occurrence(anchor, 3))
+        self.assertIsNone(RecurrenceRule("daily", until=anchor + timedelta(days=2)).occurrence(anchor, 3))
+
+    def test_between_starts_at_window(self):
+        anchor = timezone.make_aware(timezone.datetime(2020, 1, 1, 9, 0))
+        start = timezone.make_aware(timezone.datetime(2025, 3, 1))
+        rule = RecurrenceRule("daily", interval=3)
+        occurrences = list(rule.between(anchor, start, start + timedelta(days=9)))
+        self.assertEqual(len(occurrences), 3)
+        self.assertTrue(all(start <= due_date <= start + timedelta(days=9) for _, due_date in occurrences))
+        self.assertEqual([rule.occurrence(anchor, index) for index, _ in occurrences], [d for _, d in occurrences])
+
 
 class NotificationTest(TestCase):
     def setUp(self):
@@ -222,6 +276,63 @@ class RecurrenceAPITest(APITestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.data["recurrence"], "daily")
 
+    def recurring_task(self, **fields):
+        fields.setdefault("due_date", timezone.now() + timedelta(days=2))
+        return Tasks.objects.create(
+            title="Rent", description="Monthly", user=self.user, recurrence="monthly", **fields
+        )
+
+    def test_update_does_not_spawn(self):
+        task = self.recurring_task()
+        response = self.client.patch(f"/api/tasks/{task.id}/", {"status": "in_progress"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Tasks.objects.count(), 1)
+
+    def test_completion_spawns_once_with_collaborators(self):
+        other = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        task = self.recurring_task()
+        task.collaborators.add(other)
+        self.client.patch(f"/api/tasks/{task.id}/complete/")
+        self.client.patch(f"/api/tasks/{task.id}/pending/")
+        self.client.patch(f"/api/tasks/{task.id}/complete/")
+        self.client.patch("/api/tasks/transition/", {"ids": [task.id], "status": "pending"}, format="json")
+        self.client.patch("/api/tasks/transition/", {"ids": [task.id], "status": "completed"}, format="json")
+
+        spawned = Tasks.objects.get(previous_occurrence=task)
+        self.assertEqual(Tasks.objects.count(), 2)
+        self.assertEqual(spawned.due_date, task.recurrence_rule.occurrence(task.due_date, 1))
+        self.assertEqual(spawned.occurrence_index, 1)
+        self.assertEqual(list(spawned.collaborators.all()), [other])
+
+    def test_series_ends_at_count(self):
+        task = self.recurring_task(recurrence_count=1)
+        self.client.patch(f"/api/tasks/{task.id}/complete/")
+        self.assertEqual(Tasks.objects.count(), 1)
+
+    def test_occurrences_endpoint(self):
+        task = self.recurring_task(due_date=timezone.now() + timedelta(days=1))
+        Tasks.objects.create(title="Once", description="One-off", user=self.user, due_date=timezone.now() + timedelta(days=3))
+        start = timezone.now()
+        response = self.client.get("/api/tasks/occurrences/", {
+            "start": start.isoformat(), "end": (start + timedelta(days=95)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([r["title"] for r in results], ["Rent", "Once", "Rent", "Rent", "Rent"])
+        self.assertEqual([r["virtual"] for r in results], [False, False, True, True, True])
+        self.assertEqual([r["occurrence_index"] for r in results if r["task"] == task.id], [0, 1, 2, 3])
+        self.assertEqual(Tasks.objects.count(), 2)
+
+        limited = self.client.get("/api/tasks/occurrences/", {
+            "start": start.isoformat(), "end": (start + timedelta(days=95)).isoformat(), "limit": 2,
+        })
+        self.assertTrue(limited.data["truncated"])
+        self.assertEqual(len(limited.data["results"]), 2)
+
+    def test_occurrences_window_is_bounded(self):
+        response = self.client.get("/api/tasks/occurrences/", {"start": "2025-01-01", "end": "2027-01-01"})
+        self.assertEqual(response.status_code, 400)
+
 
 class NotificationAPITest(APITestCase):
     def setUp(self):
@@ -238,7 +349,138 @@ class NotificationAPITest(APITestCase):
     def test_list_notifications(self):
         response = self.client.get("/api/notifications/")
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_unread_count_and_filter(self):
+        Notification.objects.filter(user=self.user).update(is_read=True)
+        Notification.objects.create(task=self.task, user=self.user, message="Fresh")
+        self.assertEqual(self.client.get("/api/notifications/unread-count/").data, {"unread": 1, "capped": False})
+        response = self.client.get("/api/notifications/?is_read=false")
+        self.assertEqual([item["message"] for item in response.data["results"]], ["Fresh"])
+
+    @override_settings(TASK_DUE_SOON_SIGNAL=False)
+    def test_mark_read_by_ids_task_and_time(self):
+        other_user = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        other_task = Tasks.objects.create(title="Other", description="", user=self.user, due_date=self.task.due_date)
+        Notification.objects.filter(user=self.user).update(is_read=True)
+        first, second = [Notification.objects.create(task=self.task, user=self.user, message=f"N{i}") for i in range(2)]
+        elsewhere = Notification.objects.create(task=other_task, user=self.user, message="Elsewhere")
+        foreign = Notification.objects.create(task=self.task, user=other_user, message="Not yours")
+
+        with self.assertNumQueries(2):
+            response = self.client.post("/api/notifications/mark-read/", {"ids": [first.id, foreign.id]}, format="json")
+        self.assertEqual(response.data, {"updated": 1, "unread": 2, "capped": False})
+
+        response = self.client.post("/api/notifications/mark-read/", {"task": self.task.id}, format="json")
+        self.assertEqual(response.data["updated"], 1)
+        self.assertFalse(Notification.objects.get(pk=elsewhere.pk).is_read)
+
+        response = self.client.post("/api/notifications/mark-read/", {"until": timezone.now().isoformat()}, format="json")
+        self.assertEqual(response.data, {"updated": 1, "unread": 0, "capped": False})
+        self.assertFalse(Notification.objects.get(pk=foreign.pk).is_read)
+        self.assertTrue(Notification.objects.get(pk=second.pk).is_read)
+
+    def test_mark_read_needs_exactly_one_selector(self):
+        for payload in ({}, {"task": self.task.id, "ids": [1]}):
+            response = self.client.post("/api/notifications/mark-read/", payload, format="json")
+            self.assertEqual(response.status_code, 400)
+
+    def test_mark_read_refreshes_cached_list(self):
+        self.client.get("/api/notifications/?is_read=false")
+        self.client.post("/api/notifications/mark-read/", {"until": timezone.now().isoformat()}, format="json")
+        response = self.client.get("/api/notifications/?is_read=false")
+        self.assertEqual(response.data["results"], [])
+
+
+@override_settings(TASK_DUE_SOON_SIGNAL=False, TASK_EVENT_HUB="Task.events.LocalHub")
+class NotificationStreamTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.task = Tasks.objects.create(
+            title="Stream Task", description="Events", user=self.user, due_date=timezone.now() + timedelta(days=3)
+        )
+        self.auth = [(b"authorization", f"Bearer {AccessToken.for_user(self.user)}".encode())]
+        self.app = EventStreamApp(None)
+
+    def notify(self, message):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(user=self.user, task=self.task, message=message)
+
+    async def test_rejects_missing_token(self):
+        client = StreamClient(self.app)
+        body = await client.read_until(b"}")
+        await client.task
+        self.assertEqual(client.status, 401)
+        self.assertIn(b"error", body)
+
+    async def test_pushes_new_notifications(self):
+        client = StreamClient(self.app, self.auth)
+        await client.read_until(b"retry:")
+        notification = await sync_to_async(self.notify)("Ping")
+        body = await client.read_until(b"Ping")
+        self.assertEqual(client.status, 200)
+        self.assertIn(f"id: {notification.pk}\nevent: notification\n".encode(), body)
+        await client.close()
+        self.assertEqual(get_hub().subscriber_count(), 0)
+
+    async def test_last_event_id_replays_missed_notifications(self):
+        seen = await sync_to_async(self.notify)("Seen")
+        await sync_to_async(self.notify)("Missed")
+        client = StreamClient(self.app, [*self.auth, (b"last-event-id", str(seen.pk).encode())])
+        body = await client.read_until(b"Missed")
+        self.assertNotIn(b"Seen", body)
+        await client.close()
+
+    async def ticket(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = await sync_to_async(client.post)("/api/notifications/stream/ticket/")
+        self.assertEqual(response.status_code, 201)
+        return response.data["ticket"]
+
+    @override_settings(TASK_EVENT_HEARTBEAT=0.05)
+    async def test_idle_stream_gets_heartbeats(self):
+        client = StreamClient(self.app, [], query=f"ticket={await self.ticket()}".encode())
+        await client.read_until(b": keepalive")
+        await client.close()
+
+    async def test_tickets_are_single_use_and_tokens_stay_out_of_urls(self):
+        ticket = await self.ticket()
+        first = StreamClient(self.app, [], query=f"ticket={ticket}".encode())
+        await first.read_until(b"retry:")
+        self.assertEqual(first.status, 200)
+        await first.close()
+        for query in (f"ticket={ticket}", f"ticket={ticket}x", f"token={AccessToken.for_user(self.user)}"):
+            client = StreamClient(self.app, [], query=query.encode())
+            await client.read_until(b"}")
+            await client.task
+            self.assertEqual(client.status, 401)
+
+    @override_settings(TASK_EVENT_QUEUE_SIZE=2)
+    async def test_slow_consumer_catches_up_from_the_table(self):
+        client = StreamClient(self.app, self.auth)
+        await client.read_until(b"retry:")
+        notifications = await sync_to_async(
+            lambda: [Notification.objects.create(user=self.user, task=self.task, message=f"Burst {i}") for i in range(6)]
+        )()
+        await sync_to_async(lambda: get_hub().publish(self.user.pk, [notification_event(n) for n in notifications]))()
+        body = await client.read_until(b"Burst 5")
+        for notification in notifications:
+            self.assertEqual(body.count(f"id: {notification.pk}\n".encode()), 1)
+        await client.close()
+
+    async def test_sqlite_hub_reaches_other_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.sqlite3")
+            subscriber = SQLiteHub(path, poll_interval=0.01)
+            publisher = SQLiteHub(path)
+            subscription = subscriber.subscribe(self.user.pk)
+            publisher.publish(self.user.pk, [(1, "{}")])
+            try:
+                async with asyncio.timeout(5):
+                    self.assertEqual(await subscription.queue.get(), (1, "{}"))
+            finally:
+                subscriber.close()
 
 
 class HistoryAPITest(APITestCase):
@@ -256,4 +498,1734 @@ class HistoryAPITest(APITestCase):
     def test_list_history(self):
         response = self.client.get("/api/tasks/history/")
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
+
+
+class PaginationAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        due_date = timezone.now() + timedelta(days=3)
+        # Shared due dates make the id tie-breaker do real work.
+        for i in range(7):
+            Tasks.objects.create(
+                title=f"Task {i}",
+                description="Paging",
+                user=self.user,
+                due_date=due_date + timedelta(hours=i // 3)
+            )
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+        return ids
+
+    def test_walks_every_task_once_in_order(self):
+        ids = self.collect("/api/tasks/?page_size=2")
+        expected = list(Tasks.objects.order_by("due_date", "id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_respects_ordering_filter(self):
+        ids = self.collect("/api/tasks/?page_size=3&ordering=-due_date")
+        expected = list(Tasks.objects.order_by("-due_date", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get("/api/tasks/?page_size=2")
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+        self.assertEqual(
+            [item["id"] for item in back.data["results"]],
+            [item["id"] for item in first.data["results"]],
+        )
+
+    def test_page_size_is_capped(self):
+        request = Request(APIRequestFactory().get("/api/tasks/", {"page_size": 100000}))
+        self.assertEqual(KeysetPagination().get_page_size(request), KeysetPagination.max_page_size)
+
+    def test_count_is_opt_in(self):
+        response = self.client.get("/api/tasks/?page_size=2")
+        self.assertNotIn("count", response.data)
+        response = self.client.get("/api/tasks/?page_size=2&count=true")
+        self.assertEqual(response.data["count"], 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/tasks/?cursor=bogus")
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTest(APITestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on the SQL each list endpoint actually issues and
+    fails if SQLite falls back to a full table scan.
+    """
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("Query plan assertions are written for SQLite.")
+        self.user = User.objects.create_user(
+            username="tester", email="test@example.com", password="pass123", is_staff=True
+        )
+        self.client.force_authenticate(user=self.user)
+        task = Tasks.objects.create(
+            title="Plan Task",
+            description="Plans",
+            user=self.user,
+            due_date=timezone.now() + timedelta(days=1)
+        )
+        TaskHistory.objects.create(task=task, status="pending", user=self.user)
+
+    def assertNoFullScan(self, url, table):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        statements = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT") and f'FROM "{table}"' in q["sql"]]
+        self.assertTrue(statements, f"{url} issued no SELECT against {table}")
+        for sql in statements:
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+            full_scans = [step for step in plan if step.startswith(f"SCAN {table}") and "INDEX" not in step]
+            self.assertFalse(full_scans, f"{url} full-scans {table}: {plan}")
+
+    def test_task_list(self):
+        self.assertNoFullScan("/api/tasks/", "Task_tasks")
+
+    def test_task_list_filtered_by_status(self):
+        self.assertNoFullScan("/api/tasks/?status=pending&ordering=-due_date", "Task_tasks")
+
+    def test_task_list_all_scope(self):
+        self.assertNoFullScan("/api/tasks/?scope=all", "Task_tasks")
+
+    def test_history_list(self):
+        self.assertNoFullScan("/api/tasks/history/", "Task_taskhistory")
+
+    def test_notification_list(self):
+        self.assertNoFullScan("/api/notifications/", "Task_notification")
+
+    def test_unread_notification_list_and_count(self):
+        self.assertNoFullScan("/api/notifications/?is_read=false", "Task_notification")
+        self.assertNoFullScan("/api/notifications/unread-count/", "Task_notification")
+
+    def test_user_list(self):
+        self.assertNoFullScan("/api/users/", "Task_customuser")
+
+
+class TaskBatchAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        self.due_date = timezone.now() + timedelta(days=3)
+        self.task = Tasks.objects.create(
+            title="Existing", description="Batch", user=self.user, due_date=self.due_date
+        )
+
+    def post(self, operations, atomic=True):
+        return self.client.post("/api/tasks/batch/", {"operations": operations, "atomic": atomic}, format="json")
+
+    def new_task(self, title, **extra):
+        return {"op": "create", "data": {
+            "title": title, "description": "Batch", "due_date": self.due_date.isoformat(), **extra
+        }}
+
+    def test_mixed_batch(self):
+        doomed = Tasks.objects.create(title="Doomed", description="Batch", user=self.user, due_date=self.due_date)
+        response = self.post([
+            self.new_task("One", collaborators=[self.other.id]),
+            self.new_task("Two"),
+            {"op": "update", "id": self.task.id, "data": {"status": "in_progress"}},
+            {"op": "delete", "id": doomed.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in response.data["results"]], [201, 201, 200, 204])
+        self.assertEqual(response.data["results"][0]["data"]["collaborators"], [self.other.id])
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, "in_progress")
+        self.assertFalse(Tasks.objects.filter(pk=doomed.id).exists())
+        self.assertEqual(TaskHistory.objects.filter(task=self.task, status="in_progress").count(), 1)
+
+    def test_atomic_batch_rolls_back_on_failure(self):
+        response = self.post([
+            self.new_task("Valid"),
+            {"op": "update", "id": self.task.id, "data": {"status": "pending"}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r["status"] for r in response.data["results"]], [424, 400])
+        self.assertFalse(Tasks.objects.filter(title="Valid").exists())
+
+    def test_non_atomic_batch_applies_valid_items(self):
+        response = self.post([
+            self.new_task("Valid"),
+            self.new_task("Done", status="completed"),
+        ], atomic=False)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r["status"] for r in response.data["results"]], [201, 400])
+        self.assertTrue(Tasks.objects.filter(title="Valid").exists())
+
+    def test_completion_spawns_next_recurrence(self):
+        self.task.recurrence = "weekly"
+        self.task.save()
+        response = self.post([{"op": "update", "id": self.task.id, "data": {"status": "completed"}}])
+        self.assertEqual(response.status_code, 200)
+        self.task.refresh_from_db()
+        self.assertIsNotNone(self.task.completed_at)
+        spawned = Tasks.objects.exclude(pk=self.task.pk).get(title="Existing")
+        self.assertEqual(spawned.due_date, self.task.due_date + timedelta(weeks=1))
+        self.assertEqual(spawned.status, "pending")
+
+    def test_other_users_tasks_are_not_found(self):
+        foreign = Tasks.objects.create(title="Foreign", description="Batch", user=self.other, due_date=self.due_date)
+        response = self.post([{"op": "delete", "id": foreign.id}], atomic=False)
+        self.assertEqual(response.data["results"][0]["status"], 404)
+        self.assertTrue(Tasks.objects.filter(pk=foreign.id).exists())
+
+
+class BulkTransitionAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        due_date = timezone.now() + timedelta(days=3)
+        self.tasks = [
+            Tasks.objects.create(title=f"Card {i}", description="Board", user=self.user, due_date=due_date)
+            for i in range(3)
+        ]
+        self.foreign = Tasks.objects.create(title="Foreign", description="Board", user=self.other, due_date=due_date)
+
+    def transition(self, ids, target):
+        return self.client.patch("/api/tasks/transition/", {"ids": ids, "status": target}, format="json")
+
+    def test_moves_tasks_and_reports_skipped(self):
+        self.tasks[2].status = "in_progress"
+        self.tasks[2].save()
+        ids = [task.id for task in self.tasks] + [self.foreign.id]
+        # Savepoint pair + SELECT + conditional UPDATE + re-read of the
+        # counted columns + counter upsert and zero-row cleanup + bulk history
+        # INSERT + collaborator lookup for cache invalidation.
+        with self.assertNumQueries(9):
+            response = self.transition(ids, "in_progress")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], [self.tasks[0].id, self.tasks[1].id])
+        self.assertEqual(response.data["skipped"], [
+            {"id": self.tasks[2].id, "reason": "unchanged"},
+            {"id": self.foreign.id, "reason": "not_found"},
+        ])
+        self.assertEqual(Tasks.objects.filter(user=self.user, status="in_progress").count(), 3)
+        self.assertEqual(TaskHistory.objects.filter(status="in_progress").count(), 2)
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.status, "pending")
+
+    def test_completion_sets_completed_at_and_spawns_recurrence(self):
+        task = self.tasks[0]
+        task.recurrence = "daily"
+        task.save()
+        response = self.transition([task.id], "completed")
+        self.assertEqual(response.data["updated"], [task.id])
+        task.refresh_from_db()
+        self.assertIsNotNone(task.completed_at)
+        self.assertTrue(Tasks.objects.filter(title=task.title, status="pending", due_date=task.due_date + timedelta(days=1)).exists())
+
+        response = self.transition([task.id], "pending")
+        task.refresh_from_db()
+        self.assertIsNone(task.completed_at)
+
+    def test_rejects_unknown_status(self):
+        response = self.transition([self.tasks[0].id], "archived")
+        self.assertEqual(response.status_code, 400)
+
+
+class TransitionServiceTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        self.task = Tasks.objects.create(
+            title="Flow", description="Transitions", user=self.user, due_date=timezone.now() + timedelta(days=2)
+        )
+
+    def test_mark_views_record_history(self):
+        self.client.patch(f"/api/tasks/{self.task.id}/in-progress/")
+        self.client.patch(f"/api/tasks/{self.task.id}/complete/")
+        history = list(TaskHistory.objects.filter(task=self.task).order_by("id").values_list("status", "user"))
+        self.assertEqual(history, [("in_progress", self.user.id), ("completed", self.user.id)])
+
+    def test_field_edit_leaves_status_alone(self):
+        response = self.client.patch(f"/api/tasks/{self.task.id}/", {"title": "Renamed", "status": "in_progress"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.title, self.task.status), ("Renamed", "in_progress"))
+        self.assertEqual(TaskHistory.objects.filter(task=self.task).count(), 1)
+
+    def test_stale_status_conflicts(self):
+        stale = Tasks.objects.get(pk=self.task.pk)
+        self.task.status = "in_progress"
+        self.task.save()
+        serializer = TaskSerializer(stale, data={"status": "completed"}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        with self.assertRaises(TransitionConflict):
+            serializer.save()
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, "in_progress")
+        self.assertFalse(TaskHistory.objects.filter(task=self.task).exists())
+        self.assertEqual(rebuild_task_counters(self.user.id, fix=False), {})
+
+
+class ConcurrentTransitionTest(TransactionTestCase):
+    """
+    Threads race each other around pending -> in_progress -> completed ->
+    pending on one task. Every 200 must leave a history row, and the history
+    must be a valid walk ending at the stored status: two requests both
+    applying the same step would show up as a repeated status.
+    """
+    THREADS = 6
+    ROUNDS = 15
+    CYCLE = {"pending": "in_progress", "in_progress": "completed", "completed": "pending"}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.task = Tasks.objects.create(
+            title="Contended", description="Race", user=self.user, due_date=timezone.now() + timedelta(days=2)
+        )
+
+    def worker(self, barrier, outcomes):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        barrier.wait()
+        try:
+            for _ in range(self.ROUNDS):
+                try:
+                    current = Tasks.objects.values_list("status", flat=True).get(pk=self.task.pk)
+                    response = client.patch(
+                        f"/api/tasks/{self.task.pk}/", {"status": self.CYCLE[current]}, format="json"
+                    )
+                    outcomes.append(response.status_code)
+                except OperationalError:
+                    # SQLite's shared-cache test database reports lock
+                    # contention instead of waiting; that request just lost.
+                    outcomes.append("locked")
+        finally:
+            connection.close()
+
+    def test_no_transition_or_history_is_lost(self):
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+        threads = [threading.Thread(target=self.worker, args=(barrier, outcomes)) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(set(outcomes) <= {200, 400, 409, "locked"}, outcomes)
+        self.assertTrue(outcomes.count(200))
+        history = list(TaskHistory.objects.filter(task=self.task).order_by("id").values_list("status", flat=True))
+        # A request can also hit the lock after committing, while rendering
+        # its response, so "locked" ones may or may not have landed.
+        self.assertGreaterEqual(len(history), outcomes.count(200))
+        self.assertLessEqual(len(history), outcomes.count(200) + outcomes.count("locked"))
+        status = "pending"
+        for step in history:
+            self.assertEqual(step, self.CYCLE[status])
+            status = step
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, status)
+        self.assertEqual(rebuild_task_counters(self.user.id, fix=False), {})
+
+
+@override_settings(TASK_DUE_SOON_SIGNAL=False)
+class DueSoonSweepTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.now = timezone.now()
+
+    def make_task(self, title, due_in, **extra):
+        return Tasks.objects.create(
+            title=title, description="Sweep", user=self.user, due_date=self.now + due_in, **extra
+        )
+
+    def test_notifies_tasks_entering_window_once(self):
+        soon = self.make_task("Soon", timedelta(hours=2))
+        later = self.make_task("Later", timedelta(hours=30))
+        self.make_task("Done", timedelta(hours=3), status="completed")
+
+        stats = run_due_soon_sweep(now=self.now, batch_size=1)
+        self.assertEqual((stats["scanned"], stats["created"]), (1, 1))
+        self.assertEqual(list(Notification.objects.values_list("task_id", flat=True)), [soon.id])
+
+        # Twelve hours on, "Later" has drifted into the window without being saved.
+        stats = run_due_soon_sweep(now=self.now + timedelta(hours=12))
+        self.assertEqual((stats["scanned"], stats["created"]), (1, 1))
+        self.assertTrue(Notification.objects.filter(task=later).exists())
+
+        stats = run_due_soon_sweep(now=self.now + timedelta(hours=12))
+        self.assertEqual(stats["scanned"], 0)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_rerun_over_same_window_does_not_duplicate(self):
+        self.make_task("Soon", timedelta(hours=2))
+        run_due_soon_sweep(now=self.now)
+        SweepState.objects.all().delete()
+        stats = run_due_soon_sweep(now=self.now)
+        self.assertEqual((stats["scanned"], stats["created"], stats["skipped"]), (1, 0, 1))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_task_saved_into_swept_window_is_notified(self):
+        run_due_soon_sweep(now=self.now)
+        # Both due dates are at or before the horizon the first run already covered.
+        soon = self.make_task("Soon", timedelta(hours=3))
+        self.make_task("Done", timedelta(hours=4), status="completed")
+
+        stats = run_due_soon_sweep(now=self.now + timedelta(minutes=5))
+        self.assertEqual((stats["scanned"], stats["created"]), (1, 1))
+        self.assertEqual(list(Notification.objects.values_list("task_id", flat=True)), [soon.id])
+
+        stats = run_due_soon_sweep(now=self.now + timedelta(minutes=10))
+        self.assertEqual(stats["scanned"], 0)
+
+    def test_management_command(self):
+        self.make_task("Soon", timedelta(hours=2))
+        out = StringIO()
+        call_command("sweep_due_soon", stdout=out)
+        self.assertIn("1 notifications created", out.getvalue())
+
+
+class TaskQueryCountTest(APITestCase):
+    """
+    Every task-returning endpoint must run the same number of queries whether
+    the caller has 1, 10 or 500 tasks (each with a category and collaborators).
+    """
+    SIZES = (1, 10, 500)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name="Work", user=self.user)
+        self.due_date = timezone.now() + timedelta(days=3)
+
+    def seed(self, n):
+        Tasks.objects.filter(user=self.user).delete()
+        User.objects.filter(username__startswith="collab-").delete()
+        collaborators = User.objects.bulk_create([
+            User(username=f"collab-{i}", email=f"collab-{i}@example.com") for i in range(n)
+        ])
+        tasks = Tasks.objects.bulk_create([
+            Tasks(title=f"Task {i}", description="Seed", user=self.user, category=self.category, due_date=self.due_date)
+            for i in range(n)
+        ])
+        through = Tasks.collaborators.through
+        rows = [through(tasks_id=task.id, customuser_id=collaborators[i].id) for i, task in enumerate(tasks)]
+        # The first task is shared with everyone, so detail views also see N collaborators.
+        rows += [through(tasks_id=tasks[0].id, customuser_id=user.id) for user in collaborators[1:]]
+        through.objects.bulk_create(rows)
+        return tasks[0]
+
+    def assertConstantQueries(self, request):
+        counts = []
+        for n in self.SIZES:
+            task = self.seed(n)
+            with CaptureQueriesContext(connection) as ctx:
+                response = request(task)
+            self.assertLess(response.status_code, 300, response.data)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(len(set(counts)), 1, f"query counts vary with row count: {dict(zip(self.SIZES, counts))}")
+
+    def test_task_list(self):
+        self.assertConstantQueries(lambda task: self.client.get("/api/tasks/?page_size=200"))
+
+    def test_task_create(self):
+        self.assertConstantQueries(lambda task: self.client.post("/api/tasks/", {
+            "title": "New", "description": "Create", "due_date": self.due_date.isoformat(),
+        }, format="json"))
+
+    def test_task_detail(self):
+        self.assertConstantQueries(lambda task: self.client.get(f"/api/tasks/{task.id}/"))
+
+    def test_task_update(self):
+        self.assertConstantQueries(lambda task: self.client.patch(f"/api/tasks/{task.id}/", {"title": "Renamed", "status": "in_progress"}, format="json"))
+
+    def test_mark_in_progress(self):
+        self.assertConstantQueries(lambda task: self.client.patch(f"/api/tasks/{task.id}/in-progress/"))
+
+    def test_mark_complete(self):
+        self.assertConstantQueries(lambda task: self.client.patch(f"/api/tasks/{task.id}/complete/"))
+
+    def test_mark_pending(self):
+        def request(task):
+            Tasks.objects.filter(pk=task.pk).update(status="in_progress")
+            return self.client.patch(f"/api/tasks/{task.id}/pending/")
+        self.assertConstantQueries(request)
+
+    def test_collaborator_list(self):
+        self.assertConstantQueries(lambda task: self.client.get(f"/api/tasks/{task.id}/collaborators/"))
+
+    def test_batch(self):
+        self.assertConstantQueries(lambda task: self.client.post("/api/tasks/batch/", {"operations": [
+            {"op": "update", "id": task.id, "data": {"priority": "high", "status": "in_progress"}},
+        ]}, format="json"))
+
+
+class SharedTaskAPITest(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", email="owner@example.com", password="pass123")
+        self.collaborator = User.objects.create_user(username="collab", email="collab@example.com", password="pass123")
+        due_date = timezone.now() + timedelta(days=3)
+        self.shared = Tasks.objects.create(title="Shared", description="Team", user=self.owner, due_date=due_date)
+        self.shared.collaborators.add(self.collaborator)
+        self.private = Tasks.objects.create(title="Private", description="Mine", user=self.owner, due_date=due_date)
+        self.own = Tasks.objects.create(title="Own", description="Team", user=self.collaborator, due_date=due_date)
+        # Being listed as a collaborator on your own task must not duplicate it.
+        self.own.collaborators.add(self.collaborator)
+        self.client.force_authenticate(user=self.collaborator)
+
+    def titles(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [task["title"] for task in response.data["results"]]
+
+    def test_scopes(self):
+        self.assertEqual(self.titles("/api/tasks/"), ["Own"])
+        self.assertEqual(sorted(self.titles("/api/tasks/?scope=shared")), ["Own", "Shared"])
+        self.assertEqual(sorted(self.titles("/api/tasks/?scope=all")), ["Own", "Shared"])
+
+    def test_all_scope_supports_search_and_ordering(self):
+        self.assertEqual(self.titles("/api/tasks/?scope=all&search=Shar"), ["Shared"])
+        self.assertEqual(self.titles("/api/tasks/?scope=all&ordering=-created_at"), ["Own", "Shared"])
+
+    def test_invalid_scope(self):
+        self.assertEqual(self.client.get("/api/tasks/?scope=everyone").status_code, 400)
+
+    def test_collaborator_can_open_shared_task_but_not_private_one(self):
+        self.assertEqual(self.client.get(f"/api/tasks/{self.shared.id}/").status_code, 200)
+        self.assertEqual(self.client.get(f"/api/tasks/{self.private.id}/").status_code, 403)
+
+    def test_permission_check_is_a_single_exists_query(self):
+        request = Request(APIRequestFactory().get("/"))
+        request.user = self.collaborator
+        task = Tasks.objects.get(pk=self.shared.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(IsOwnerOrCollaborator().has_object_permission(request, None, task))
+            self.assertTrue(IsOwnerOrCollaborator().has_object_permission(request, None, task))
+
+
+class FullTextSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        due_date = timezone.now() + timedelta(days=3)
+        self.report = Tasks.objects.create(
+            title="Quarterly report", description="Collect numbers for the budget review", user=self.user, due_date=due_date
+        )
+        self.budget = Tasks.objects.create(
+            title="Budget meeting", description="Budget budget budget", user=self.user, due_date=due_date
+        )
+        Tasks.objects.create(title="Budget", description="Someone else's", user=self.other, due_date=due_date)
+
+    def search(self, **params):
+        response = self.client.get("/api/tasks/search/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_uses_native_index(self):
+        if connection.vendor == "sqlite":
+            self.assertEqual(self.search(q="budget")["backend"], "sqlite_fts5")
+
+    def test_ranked_results_are_scoped_to_owner(self):
+        results = self.search(q="budget")["results"]
+        self.assertEqual([r["task"]["id"] for r in results], [self.budget.id, self.report.id])
+        self.assertGreater(results[0]["rank"], results[1]["rank"])
+
+    def test_prefix_and_highlight(self):
+        results = self.search(q="quart")["results"]
+        self.assertEqual([r["task"]["id"] for r in results], [self.report.id])
+        self.assertIn("<mark>Quarterly</mark>", results[0]["highlight"]["title"])
+        self.assertEqual(self.search(q="quart", prefix="false")["results"], [])
+
+    def test_index_follows_updates_and_deletes(self):
+        Tasks.objects.filter(pk=self.report.pk).update(title="Annual summary")
+        self.assertEqual(self.search(q="quarterly")["results"], [])
+        self.assertEqual(len(self.search(q="annual")["results"]), 1)
+        self.budget.delete()
+        self.assertEqual([r["task"]["id"] for r in self.search(q="budget")["results"]], [self.report.id])
+
+    def test_list_search_filter_uses_backend(self):
+        response = self.client.get("/api/tasks/?search=budg")
+        self.assertEqual({t["id"] for t in response.data["results"]}, {self.report.id, self.budget.id})
+
+    @override_settings(TASK_SEARCH_BACKEND="icontains")
+    def test_icontains_fallback(self):
+        data = self.search(q="meeting")
+        self.assertEqual(data["backend"], "icontains")
+        self.assertEqual(data["results"][0]["highlight"]["title"], "Budget <mark>meeting</mark>")
+
+    def test_highlights_escape_task_text(self):
+        Tasks.objects.filter(pk=self.report.pk).update(title="report <img src=x onerror=alert(1)>")
+        expected = "<mark>report</mark> &lt;img src=x onerror=alert(1)&gt;"
+        self.assertEqual(self.search(q="report")["results"][0]["highlight"]["title"], expected)
+        with self.settings(TASK_SEARCH_BACKEND="icontains"):
+            self.assertEqual(self.search(q="report")["results"][0]["highlight"]["title"], expected)
+
+
+@override_settings(TASK_AUTH_USER_CACHE=True)
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/notifications/unread-count/")
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in ctx.captured_queries if 'FROM "Task_customuser"' in q["sql"]]
+
+    def test_user_is_loaded_once(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+
+    def test_save_reloads_user(self):
+        self.user_queries()
+        self.user.first_name = "Renamed"
+        self.user.save()
+        self.assertEqual(len(self.user_queries()), 1)
+
+    def test_deactivation_applies_immediately(self):
+        self.user_queries()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/notifications/unread-count/").status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.user_queries()
+        self.user.delete()
+        self.assertEqual(self.client.get("/api/notifications/unread-count/").status_code, 401)
+
+    @override_settings(TASK_AUTH_USER_CACHE=None)
+    def test_default_needs_a_shared_cache(self):
+        # LocMemCache versions can't reach other workers: load the user every time.
+        self.user_queries()
+        self.assertEqual(len(self.user_queries()), 1)
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={
+            **settings.CACHES,
+            "responses": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": directory},
+        }):
+            self.user_queries()
+            self.assertEqual(self.user_queries(), [])
+
+    def test_requests_get_their_own_user_instance(self):
+        authenticate = CachedJWTAuthentication()
+        token = authenticate.get_validated_token(str(AccessToken.for_user(self.user)).encode())
+        first, second = authenticate.get_user(token), authenticate.get_user(token)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+
+
+@override_settings(TASK_THROTTLE_STORE="Task.throttling.LocalStore", TASK_THROTTLE_STORE_OPTIONS={})
+class GCRAThrottleTest(TestCase):
+    """Gets a fresh LocalStore: the setting change resets get_store()."""
+    class MinuteThrottle(UserRateThrottle):
+        rate = "3/min"
+
+    def setUp(self):
+        self.request = SimpleNamespace(user=User.objects.create_user(username="tester", email="t@example.com", password="pass123"), META={})
+        self.now = 1_700_000_000.0
+
+    def check(self):
+        throttle = self.MinuteThrottle()
+        throttle.timer = lambda: self.now
+        return throttle.allow_request(self.request, None), throttle.wait()
+
+    def test_burst_then_refill(self):
+        self.assertEqual([self.check()[0] for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(self.check()[1], 20.0)
+        self.now += 20
+        self.assertEqual([self.check()[0] for _ in range(2)], [True, False])
+
+    def test_sqlite_store_is_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "throttle.sqlite3")
+            first, second = SQLiteStore(path), SQLiteStore(path)
+            self.assertEqual(first.acquire("k", self.now, 30, 60), 0)
+            self.assertEqual(second.acquire("k", self.now, 30, 60), 0)
+            self.assertAlmostEqual(first.acquire("k", self.now, 30, 60), 30)
+            self.assertEqual(second.acquire("k", self.now + 30, 30, 60), 0)
+
+    def test_cache_store_is_shared_and_atomic(self):
+        first, second = CacheStore(), CacheStore()
+        self.assertEqual(first.acquire("k", self.now, 30, 60), 0)
+        self.assertEqual(second.acquire("k", self.now, 30, 60), 0)
+        self.assertAlmostEqual(first.acquire("k", self.now, 30, 60), 30)
+        self.assertEqual(second.acquire("k", self.now + 30, 30, 60), 0)
+
+        allowed = []
+        def spend():
+            allowed.extend(CacheStore().acquire("burst", self.now, 1, 10) == 0 for _ in range(10))
+        threads = [threading.Thread(target=spend) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(allowed.count(True), 10)
+
+    def test_default_store_follows_cache_backend(self):
+        with override_settings(TASK_THROTTLE_STORE=None):
+            self.assertIsInstance(get_throttle_store(), LocalStore)
+            with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": directory},
+            }):
+                self.assertIsInstance(get_throttle_store(), CacheStore)
+
+    def test_api_uses_gcra_throttles(self):
+        self.assertEqual([type(throttle) for throttle in APIView().get_throttles()], [UserRateThrottle, AnonRateThrottle])
+
+
+class TokenPurgeTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", email="test@example.com", password="pass123")
+        now = timezone.now()
+
+        def outstanding(jti, expires_at, blacklisted):
+            token = OutstandingToken.objects.create(user=self.user, jti=jti, token=jti, expires_at=expires_at)
+            if blacklisted:
+                BlacklistedToken.objects.create(token=token)
+            return token
+
+        outstanding("old-rotated", now - timedelta(days=2), True)
+        outstanding("old", now - timedelta(hours=1), False)
+        self.live = outstanding("live-rotated", now + timedelta(hours=1), True)
+
+    def test_purges_only_expired_tokens_in_batches(self):
+        stats = purge_expired_tokens(batch_size=1)
+        self.assertEqual((stats["outstanding"], stats["blacklisted"], stats["batches"]), (2, 1, 2))
+        self.assertEqual(list(OutstandingToken.objects.values_list("jti", flat=True)), ["live-rotated"])
+        self.assertTrue(BlacklistedToken.objects.filter(token=self.live).exists())
+
+    def test_command_reports_purged_rows(self):
+        out = StringIO()
+        call_command("purge_expired_tokens", stdout=out)
+        self.assertIn("Purged 2 outstanding and 1 blacklisted tokens in 1 batches", out.getvalue())
+
+    def test_batches_are_found_on_the_expiry_index(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("Query plan assertions are written for SQLite.")
+        sql, params = (
+            OutstandingToken.objects.filter(expires_at__lte=timezone.now()).order_by("expires_at")
+            .values_list("id", flat=True)[:100].query.sql_with_params()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("outstanding_token_expires_idx", plan)
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_search_benchmark_runs_and_rolls_back(self):
+        out = StringIO()
+        call_command("benchmark", "search", rows=50, repeat=2, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["rows"], 50)
+        self.assertIn("icontains", result["miss"])
+        self.assertFalse(Tasks.objects.exists())
+
+    def test_event_stream_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "event_streams", rows=50, repeat=2, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["streams"], 50)
+        self.assertEqual(result["open_after_disconnect"], 0)
+        self.assertFalse(User.objects.exists())
+
+    def test_throttle_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "throttle", rows=20, repeat=1, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(set(result["per_call_us"]), {"drf_timestamp_list", "gcra_local", "gcra_cache", "gcra_sqlite"})
+
+    def test_auth_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "auth", rows=5, repeat=2, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["/api/tasks/stats/"]["queries_saved"], 1)
+
+    def test_token_purge_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "token_purge", rows=200, repeat=2, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertGreater(result["purge"]["outstanding"], 150)
+        self.assertLess(result["remaining"]["outstanding"], 50)
+
+    def test_recurrence_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "recurrence", rows=30, repeat=1, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertGreater(result["occurrences"], 30)
+        self.assertFalse(Tasks.objects.exists())
+
+    def test_metrics_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "metrics", rows=5, repeat=2, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertIn("overhead_ms", result["requests"]["/api/tasks/"])
+        self.assertGreater(result["observe_us"], 0)
+
+    def test_archive_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "archive", rows=40, repeat=2, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["archive"]["tasks"], 36)
+        self.assertFalse(ArchivedTask.objects.exists())
+        self.assertIn("list", result["after_include_archived"])
+
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    def test_endpoint_benchmark_covers_every_route(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "endpoints.json")
+            call_command("benchmark", "endpoints", rows=5, repeat=1, output=path, stdout=StringIO())
+            with open(path) as file:
+                result = json.load(file)
+        self.assertEqual(result["unmeasured"], [])
+        self.assertEqual(result["endpoints"]["GET task_list_create"]["queries_per_request"], 2)
+        self.assertGreater(result["endpoints"]["GET task-export"]["peak_kib"], 0)
+        self.assertFalse(User.objects.exists())
+
+    def test_compare_flags_regressions(self):
+        from .benchmarks import compare
+
+        baseline = {"list": {"p99_ms": 10.0, "queries_per_request": 2, "peak_kib": 100}, "requests_per_s": 500, "rows": 10}
+        same = {"list": {"p99_ms": 11.5, "queries_per_request": 2, "peak_kib": 90}, "requests_per_s": 450, "rows": 99}
+        self.assertEqual(compare(same, baseline), [])
+        worse = {"list": {"p99_ms": 13.0, "queries_per_request": 3, "peak_kib": 100}, "requests_per_s": 300}
+        self.assertEqual(
+            [regression["metric"] for regression in compare(worse, baseline)],
+            ["list.p99_ms", "list.queries_per_request", "requests_per_s"],
+        )
+        # Sub-millisecond changes are noise, however large relatively.
+        self.assertEqual(compare({"p50_ms": 0.9}, {"p50_ms": 0.3}), [])
+
+    def test_compare_option_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            with open(path, "w") as file:
+                json.dump({"per_call_us": {}, "history": 20, "calls": 200}, file)
+            call_command("benchmark", "throttle", rows=20, repeat=1, compare=path, stdout=StringIO(), stderr=StringIO())
+            with open(path, "w") as file:
+                json.dump({"per_call_us": {"gcra_local": 0.001}}, file)
+            with self.assertRaisesMessage(CommandError, "1 metric(s) regressed"):
+                call_command("benchmark", "throttle", rows=20, repeat=1, compare=path, stdout=StringIO(), stderr=StringIO())
+
+
+class GenerateDataCommandTest(TestCase):
+    def test_generates_skewed_consistent_dataset(self):
+        from .datagen import tasks_per_user
+
+        out = StringIO()
+        call_command("generate_data", users=20, tasks=10, seed=1, batch_size=40, stdout=out)
+        self.assertIn("Created 20 users", out.getvalue())
+        users = User.objects.filter(username__startswith="gen-")
+        self.assertEqual(users.count(), 20)
+        counts = sorted(users.annotate(n=models.Count("tasks")).values_list("n", flat=True))
+        self.assertEqual(counts, sorted(tasks_per_user(20, 10, 1.0, random.Random(1))))
+        self.assertGreater(counts[-1], 5 * counts[0])
+        self.assertTrue(TaskHistory.objects.exists())
+        self.assertTrue(Notification.objects.exists())
+        self.assertTrue(Tasks.collaborators.through.objects.exists())
+        for user_id in users.values_list("pk", flat=True):
+            self.assertEqual(rebuild_task_counters(user_id, fix=False), {})
+        self.assertTrue(users.first().check_password("generated-password"))
+
+        with self.assertRaisesMessage(CommandError, "already exist"):
+            call_command("generate_data", users=1, stdout=out)
+
+
+
+class MetricsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="metrics", email="metrics@example.com", password="pass123")
+        self.admin = User.objects.create_user(
+            username="ops", email="ops@example.com", password="pass123", is_staff=True,
+        )
+        Tasks.objects.create(title="Counted", description="Metrics", user=self.user, due_date=timezone.now() + timedelta(days=3))
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(TASK_METRICS_DIR=self.directory.name)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def scrape(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get("/api/metrics")
+        self.client.force_authenticate(None)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_records_latency_queries_size_and_status_per_route(self):
+        self.client.force_authenticate(self.user)
+        listed = self.client.get("/api/tasks/")
+        self.client.get("/api/tasks/")
+        self.client.get("/api/tasks/999999/")
+        self.client.get("/api/no-such-route/")
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/tasks/stats/")
+        stats_queries = len(ctx.captured_queries)
+        samples = self.scrape()
+
+        labels = 'route="api/tasks/",method="GET"'
+        self.assertEqual(samples[f"task_http_request_duration_seconds_count{{{labels}}}"], 2)
+        self.assertEqual(samples[f'task_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'], 2)
+        self.assertGreater(samples[f"task_http_request_duration_seconds_sum{{{labels}}}"], 0)
+        self.assertEqual(samples[f'task_http_requests_total{{{labels},status="200"}}'], 2)
+        self.assertEqual(samples[f"task_http_response_bytes_total{{{labels}}}"], 2 * len(listed.content))
+        self.assertEqual(samples['task_http_requests_total{route="api/tasks/<int:pk>/",method="GET",status="404"}'], 1)
+        self.assertEqual(samples['task_http_requests_total{route="unmatched",method="GET",status="404"}'], 1)
+        stats = 'route="api/tasks/stats/",method="GET"'
+        self.assertEqual(samples[f"task_http_db_queries_total{{{stats}}}"], stats_queries)
+        self.assertGreater(samples[f"task_http_db_query_seconds_total{{{stats}}}"], 0)
+
+    def test_scrape_is_admin_only(self):
+        self.assertEqual(self.client.get("/api/metrics").status_code, 401)
+        self.client.force_authenticate(self.user)
+        response = self.client.get("/api/metrics")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_async_requests_count_queries(self):
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        with override_settings(TASK_ASYNC_VIEWS=["*"], TASK_RESPONSE_CACHE_ENABLED=False):
+            response = async_to_sync(AsyncClient().get)("/api/tasks/", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        samples = self.scrape()
+        self.assertGreater(samples['task_http_db_queries_total{route="api/tasks/",method="GET"}'], 0)
+
+    def test_adds_up_every_worker_file(self):
+        from .metrics import MetricsStore, get_store
+
+        store = get_store()
+        other = MetricsStore(self.directory.name, pid=store.pid + 100_000)
+        slot = other.slot("api/tasks/", "POST")
+        other.observe(slot, 0.02, 3, 0.001, 120, 201)
+        store.observe(slot, 20.0, 1, 0.001, 80, 999)
+        samples = self.scrape()
+
+        labels = 'route="api/tasks/",method="POST"'
+        self.assertEqual(samples[f'task_http_request_duration_seconds_bucket{{{labels},le="0.01"}}'], 0)
+        self.assertEqual(samples[f'task_http_request_duration_seconds_bucket{{{labels},le="0.025"}}'], 1)
+        self.assertEqual(samples[f'task_http_request_duration_seconds_bucket{{{labels},le="10.0"}}'], 1)
+        self.assertEqual(samples[f'task_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'], 2)
+        self.assertEqual(samples[f"task_http_db_queries_total{{{labels}}}"], 4)
+        self.assertEqual(samples[f"task_http_response_bytes_total{{{labels}}}"], 200)
+        self.assertEqual(samples[f'task_http_requests_total{{{labels},status="201"}}'], 1)
+        self.assertEqual(samples[f'task_http_requests_total{{{labels},status="other"}}'], 1)
+
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        cache_stats.reset()
+        self.owner = User.objects.create_user(username="owner", email="owner@example.com", password="pass123")
+        self.collaborator = User.objects.create_user(username="collab", email="collab@example.com", password="pass123")
+        self.client.force_authenticate(user=self.owner)
+        self.due_date = timezone.now() + timedelta(days=3)
+        self.task = Tasks.objects.create(title="Cached", description="Cache", user=self.owner, due_date=self.due_date)
+
+    def get(self, url, user=None):
+        self.client.force_authenticate(user=user or self.owner)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_repeat_poll_is_served_from_cache(self):
+        self.assertEqual(self.get("/api/tasks/?status=pending&ordering=due_date")["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = self.get("/api/tasks/?ordering=due_date&status=pending")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_write_invalidates(self):
+        self.get("/api/tasks/")
+        Tasks.objects.create(title="Another", description="Cache", user=self.owner, due_date=self.due_date)
+        response = self.get("/api/tasks/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_bulk_transition_invalidates_owner_and_collaborators(self):
+        self.task.collaborators.add(self.collaborator)
+        self.get("/api/tasks/")
+        self.get("/api/tasks/?scope=shared", user=self.collaborator)
+        self.client.force_authenticate(user=self.owner)
+        self.client.patch("/api/tasks/transition/", {"ids": [self.task.id], "status": "in_progress"}, format="json")
+        self.assertEqual(self.get("/api/tasks/")["X-Cache"], "MISS")
+        shared = self.get("/api/tasks/?scope=shared", user=self.collaborator)
+        self.assertEqual(shared["X-Cache"], "MISS")
+        self.assertEqual(shared.data["results"][0]["status"], "in_progress")
+
+    def test_collaborator_change_invalidates_both_sides(self):
+        self.get("/api/tasks/?scope=shared", user=self.collaborator)
+        self.get("/api/tasks/")
+        self.task.collaborators.add(self.collaborator)
+        self.assertEqual(len(self.get("/api/tasks/?scope=shared", user=self.collaborator).data["results"]), 1)
+        self.assertEqual(self.get("/api/tasks/").data["results"][0]["collaborators"], [self.collaborator.id])
+
+    def test_category_and_notification_lists(self):
+        self.get("/api/categories/")
+        Category.objects.create(name="Work", user=self.owner)
+        self.assertEqual(len(self.get("/api/categories/").data), 1)
+
+        count = len(self.get("/api/notifications/").data["results"])
+        Notification.objects.create(task=self.task, user=self.owner, message="Ping")
+        self.assertEqual(len(self.get("/api/notifications/").data["results"]), count + 1)
+
+    def test_category_delete_invalidates_collaborators(self):
+        category = Category.objects.create(name="Work", user=self.owner)
+        Tasks.objects.filter(pk=self.task.pk).update(category=category)
+        self.task.collaborators.add(self.collaborator)
+        self.assertEqual(self.get("/api/tasks/?scope=shared", user=self.collaborator).data["results"][0]["category"]["name"], "Work")
+        category.delete()
+        shared = self.get("/api/tasks/?scope=shared", user=self.collaborator)
+        self.assertEqual(shared["X-Cache"], "MISS")
+        self.assertIsNone(shared.data["results"][0]["category"])
+
+    def test_users_do_not_share_entries(self):
+        self.get("/api/tasks/")
+        response = self.get("/api/tasks/", user=self.collaborator)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"], [])
+
+    def test_stats_endpoint(self):
+        self.get("/api/tasks/")
+        self.get("/api/tasks/")
+        self.assertEqual(self.client.get("/api/cache/stats/").status_code, 403)
+        self.owner.is_staff = True
+        self.owner.save()
+        data = self.get("/api/cache/stats/").data
+        self.assertEqual(data["by_view"]["TaskListCreateView"], {"hits": 1, "misses": 1})
+
+
+
+@override_settings(TASK_RESPONSE_CACHE_ENABLED=False)
+class FastListPathTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="fast", email="fast@example.com", password="pass123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name="Work", user=self.user)
+        due_date = timezone.now() + timedelta(days=2)
+        Tasks.objects.create(title="Plain", description="No category", user=self.user, due_date=due_date)
+        shared = Tasks.objects.create(
+            title="Shared", description="Has everything", user=self.user, due_date=due_date,
+            category=category, priority="high", recurrence="weekly",
+        )
+        shared.collaborators.add(self.other, self.user)
+        Tasks.objects.create(
+            title="Done", description="Finished", user=self.user, due_date=due_date,
+            status="completed", completed_at=timezone.now(),
+        )
+
+    def test_rows_render_like_task_serializer(self):
+        from rest_framework.renderers import JSONRenderer
+        from .fastpath import task_row_serializer
+
+        queryset = Tasks.objects.filter(user=self.user).order_by("id")
+        expected = JSONRenderer().render(TaskSerializer(queryset.with_related(), many=True).data)
+        rendered = JSONRenderer().render(task_row_serializer.serialize(task_row_serializer.rows(queryset)))
+        self.assertEqual(rendered, expected)
+
+    def test_list_response_is_byte_identical(self):
+        for query in ("", "?ordering=-priority", "?status=completed", "?search=shared", "?page_size=1"):
+            with self.subTest(query=query):
+                with override_settings(TASK_FAST_LIST=False):
+                    slow = self.client.get(f"/api/tasks/{query}")
+                fast = self.client.get(f"/api/tasks/{query}")
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+
+    def test_cursor_from_fast_page_continues(self):
+        first = self.client.get("/api/tasks/?page_size=2&ordering=-created_at")
+        second = self.client.get(first.data["next"])
+        titles = [task["title"] for task in first.data["results"] + second.data["results"]]
+        self.assertEqual(titles, ["Done", "Shared", "Plain"])
+
+    def test_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "serialization", rows=20, repeat=1, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertIn("fast_path", result["sizes"]["20"])
+
+
+
+class TaskExportTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="export", email="export@example.com", password="pass123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name="Work", user=self.user)
+        self.due_date = timezone.now() + timedelta(days=2)
+        shared = Tasks.objects.create(
+            title="Shared, quoted \"title\"", description="Has everything", user=self.user,
+            due_date=self.due_date, category=self.category, priority="high",
+        )
+        shared.collaborators.add(self.other, self.user)
+        Tasks.objects.create(title="Plain", description="No category", user=self.user, due_date=self.due_date)
+        Tasks.objects.create(title="Not mine", description="Other user", user=self.other, due_date=self.due_date)
+
+    def export(self, query=""):
+        response = self.client.get(f"/api/tasks/export/{query}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_matches_task_serializer(self):
+        lines = self.export("?format=ndjson").splitlines()
+        expected = TaskSerializer(Tasks.objects.filter(user=self.user).order_by("id"), many=True).data
+        self.assertEqual([json.loads(line) for line in lines], json.loads(json.dumps(expected)))
+
+    def test_csv_flattens_category_and_collaborators(self):
+        import csv
+
+        rows = list(csv.DictReader(StringIO(self.export("?format=csv"))))
+        self.assertEqual([row["title"] for row in rows], ['Shared, quoted "title"', "Plain"])
+        self.assertEqual(rows[0]["category_name"], "Work")
+        self.assertEqual(sorted(rows[0]["collaborators"].split(";")), ["export", "other"])
+        self.assertEqual(rows[1]["category_id"], "")
+
+    def test_csv_neutralizes_formulas(self):
+        import csv
+
+        Tasks.objects.create(
+            title="=HYPERLINK(\"http://evil\")", description="@SUM(A1)", user=self.user, due_date=self.due_date,
+        )
+        row = list(csv.DictReader(StringIO(self.export("?format=csv"))))[-1]
+        self.assertEqual((row["title"], row["description"]), ("'=HYPERLINK(\"http://evil\")", "'@SUM(A1)"))
+
+    def test_exports_can_be_imported_again(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        exports = {export_format: self.export(f"?format={export_format}") for export_format in ("csv", "ndjson")}
+        for export_format, content in exports.items():
+            response = self.client.post("/api/tasks/import/", {
+                "file": SimpleUploadedFile(f"tasks.{export_format}", content.encode()),
+            }, format="multipart")
+            self.assertEqual((response.status_code, response.data["created"]), (200, 2), response.data)
+            copy = Tasks.objects.filter(user=self.user, title__startswith="Shared").latest("pk")
+            self.assertEqual(set(copy.collaborators.all()), {self.user, self.other})
+            self.assertEqual(copy.category, self.category)
+
+    def test_filters_apply(self):
+        lines = self.export("?format=ndjson&priority=high").splitlines()
+        self.assertEqual([json.loads(line)["priority"] for line in lines], ["high"])
+        self.assertEqual(self.export("?format=csv&status=completed").count("\n"), 1)  # header only
+
+    def test_errors_are_json(self):
+        response = self.client.get("/api/tasks/export/?status=bogus")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("status", response.json())
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get("/api/tasks/export/").status_code, 401)
+
+    def test_one_collaborator_query_per_chunk(self):
+        Tasks.objects.bulk_create([
+            Tasks(title=f"Bulk {i}", description="", user=self.user, due_date=self.due_date) for i in range(8)
+        ])
+        with override_settings(TASK_EXPORT_CHUNK_SIZE=4):
+            response = self.client.get("/api/tasks/export/?format=ndjson")
+            with CaptureQueriesContext(connection) as queries:
+                lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(len(queries), 1 + 3)  # the task rows, then collaborators for each chunk of 4
+
+    def test_peak_memory_does_not_grow_with_rows(self):
+        import tracemalloc
+
+        def peak():
+            response = self.client.get("/api/tasks/export/?format=csv")
+            tracemalloc.start()
+            try:
+                for _ in response.streaming_content:
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        def seed(rows):
+            Tasks.objects.bulk_create([
+                Tasks(title=f"Task {i}", description="x" * 200, user=self.user, due_date=self.due_date)
+                for i in range(rows)
+            ])
+
+        with override_settings(TASK_EXPORT_CHUNK_SIZE=100):
+            seed(500)
+            small = peak()
+            seed(4500)
+            large = peak()
+        self.assertLess(large, small * 1.5)
+
+    def test_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "export", rows=30, repeat=1, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(set(result["sizes"]["30"]), {"csv", "ndjson"})
+
+
+class TaskImportTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="importer", email="importer@example.com", password="pass123")
+        self.friend = User.objects.create_user(username="friend", email="friend@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        self.work = Category.objects.create(name="Work", user=self.user)
+        Category.objects.create(name="Home", user=self.friend)
+        self.due = (timezone.now() + timedelta(days=10)).isoformat()
+
+    def upload(self, name, content, **data):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return self.client.post(
+            "/api/tasks/import/", {"file": SimpleUploadedFile(name, content.encode()), **data}, format="multipart"
+        )
+
+    def ndjson(self, records):
+        return "".join(json.dumps(record) + "\n" for record in records)
+
+    def test_csv_import_resolves_categories_and_collaborators(self):
+        content = (
+            "title,description,due_date,priority,category,collaborators\n"
+            f"Report,Quarterly,{self.due},high,Work,friend\n"
+            f"Groceries,Milk,{self.due},,Home,\n"
+            f"Laundry,Towels,{self.due},low,Home,friend;importer\n"
+        )
+        response = self.upload("tasks.csv", content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual(response.data["categories_created"], 1)
+
+        tasks = {task.title: task for task in Tasks.objects.filter(user=self.user).prefetch_related("collaborators")}
+        self.assertEqual(tasks["Report"].category, self.work)
+        self.assertEqual(tasks["Groceries"].priority, "medium")
+        home = tasks["Groceries"].category
+        self.assertEqual((home.name, home.user), ("Home", self.user))
+        self.assertEqual(tasks["Laundry"].category, home)
+        self.assertEqual({user.username for user in tasks["Laundry"].collaborators.all()}, {"friend", "importer"})
+        self.assertEqual(rebuild_task_counters(self.user.pk, fix=False), {})
+        self.assertEqual(self.client.get("/api/tasks/stats/").data["total"], 3)
+
+    def test_csv_import_undoes_export_formula_quoting(self):
+        content = f"title,description,due_date\n'-5 kg,'It's fine,{self.due}\n"
+        self.assertEqual(self.upload("tasks.csv", content).data["created"], 1)
+        task = Tasks.objects.get(user=self.user)
+        self.assertEqual((task.title, task.description), ("-5 kg", "'It's fine"))
+
+    def test_invalid_records_are_reported_and_skipped(self):
+        content = self.ndjson([
+            {"title": "Fine", "description": "ok", "due_date": self.due},
+            {"title": "Past", "description": "no", "due_date": "2001-01-01T00:00:00Z"},
+            {"title": "Done", "description": "no", "due_date": self.due, "status": "completed"},
+            {"title": "Ghost", "description": "no", "due_date": self.due, "collaborators": ["ghost"]},
+        ]) + "\nnot json\n"
+        response = self.upload("tasks.ndjson", content)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data["created"], response.data["failed"]), (1, 4))
+        errors = {error["record"]: error["errors"] for error in response.data["errors"]}
+        self.assertEqual(set(errors), {2, 3, 4, 5})
+        self.assertIn("due_date", errors[2])
+        self.assertIn("non_field_errors", errors[3])
+        self.assertEqual(errors[4], {"collaborators": ["Unknown username: ghost"]})
+        self.assertEqual(list(Tasks.objects.values_list("title", flat=True)), ["Fine"])
+
+    def test_dry_run_writes_nothing(self):
+        records = [{"title": f"Task {i}", "description": "Imported", "due_date": self.due, "category": "New"} for i in range(5)]
+        with override_settings(TASK_IMPORT_CHUNK_SIZE=2):
+            response = self.upload("tasks.txt", self.ndjson(records), format="ndjson", dry_run="true")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["valid"], response.data["created"], response.data["categories_created"]), (5, 0, 1))
+        self.assertTrue(response.data["dry_run"])
+        self.assertFalse(Tasks.objects.exists())
+        self.assertFalse(Category.objects.filter(name="New").exists())
+
+    def test_unknown_format_is_rejected(self):
+        response = self.upload("tasks.txt", "title\nA\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("format", response.data)
+
+    def test_queries_grow_per_chunk_not_per_record(self):
+        from .imports import import_tasks
+
+        def run(rows):
+            records = [
+                {"title": f"Task {i}", "description": "Imported", "due_date": self.due, "category": "Work", "collaborators": ["friend"]}
+                for i in range(rows)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                report = import_tasks(self.user, BytesIO(self.ndjson(records).encode()), "ndjson", chunk_size=10)
+            self.assertEqual(report["created"], rows)
+            return len(queries)
+
+        self.assertEqual(run(40), 2 * run(20))
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as handle:
+            handle.write(f"title,description,due_date\nA,a,{self.due}\nB,b,yesterday\n")
+        self.addCleanup(os.remove, handle.name)
+        out, err = StringIO(), StringIO()
+        call_command("import_tasks", handle.name, user="importer", dry_run=True, stdout=out, stderr=err)
+        self.assertIn("Would import 1 of 2 tasks (1 failed", out.getvalue())
+        self.assertIn("record 2:", err.getvalue())
+        self.assertFalse(Tasks.objects.exists())
+
+        call_command("import_tasks", handle.name, user="importer", stdout=out, stderr=StringIO())
+        self.assertEqual(list(Tasks.objects.values_list("title", flat=True)), ["A"])
+        with self.assertRaises(CommandError):
+            call_command("import_tasks", handle.name, user="nobody", stdout=StringIO())
+
+    def test_benchmark_runs(self):
+        out = StringIO()
+        call_command("benchmark", "import", rows=20, repeat=1, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["formats"]["csv"]["created"], 20)
+        self.assertEqual(result["formats"]["ndjson"]["created"], 20)
+        self.assertFalse(Tasks.objects.exists())
+
+
+@override_settings(TASK_RESPONSE_CACHE_ENABLED=False)
+class AsyncTaskViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="async", email="async@example.com", password="pass123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        category = Category.objects.create(name="Work", user=self.user)
+        due_date = timezone.now() + timedelta(days=2)
+        self.plain = Tasks.objects.create(title="Plain", description="No category", user=self.user, due_date=due_date)
+        self.shared = Tasks.objects.create(
+            title="Shared", description="Has everything", user=self.user, due_date=due_date,
+            category=category, priority="high",
+        )
+        self.shared.collaborators.add(self.other)
+        self.foreign = Tasks.objects.create(title="Foreign", description="Not ours", user=self.other, due_date=due_date)
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.async_client = AsyncClient()
+
+    async def both(self, method, path, data=None):
+        """(sync response, async response); writes are undone between the two."""
+        kwargs = {"data": data, "content_type": "application/json"} if data is not None else {}
+        sid = await sync_to_async(transaction.savepoint)()
+        sync = await sync_to_async(getattr(self.client, method))(path, headers=self.headers, **kwargs)
+        await sync_to_async(transaction.savepoint_rollback)(sid)
+        with override_settings(TASK_ASYNC_VIEWS=["*"]):
+            response = await getattr(self.async_client, method)(path, headers=self.headers, **kwargs)
+        return sync, response
+
+    async def test_list_matches_sync_view(self):
+        for query in ("", "?ordering=-priority", "?status=completed", "?search=shared", "?page_size=1&count=true", "?scope=all",
+                      "?include_archived=true&ordering=-priority"):
+            with self.subTest(query=query):
+                sync, response = await self.both("get", f"/api/tasks/{query}")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, sync.content)
+
+        with override_settings(TASK_ASYNC_VIEWS=["*"]), override_settings(TASK_FAST_LIST=False):
+            slow = await self.async_client.get("/api/tasks/?page_size=1", headers=self.headers)
+            second = await self.async_client.get(slow.json()["next"], headers=self.headers)
+        fast = await sync_to_async(self.client.get)("/api/tasks/?page_size=1", headers=self.headers)
+        self.assertEqual(slow.content, fast.content)
+        self.assertEqual(len(second.json()["results"]), 1)
+
+    async def test_detail_and_writes_match_sync_views(self):
+        cases = [
+            ("get", f"/api/tasks/{self.shared.pk}/", None),
+            ("get", f"/api/tasks/{self.foreign.pk}/", None),
+            ("get", "/api/tasks/999999/", None),
+            ("patch", f"/api/tasks/{self.plain.pk}/", {"title": "Renamed", "status": "in_progress"}),
+            ("patch", f"/api/tasks/{self.plain.pk}/", {"status": "pending"}),
+            ("patch", f"/api/tasks/{self.plain.pk}/in-progress/", None),
+            ("patch", f"/api/tasks/{self.foreign.pk}/complete/", None),
+            ("delete", f"/api/tasks/{self.plain.pk}/", None),
+        ]
+        for method, path, data in cases:
+            with self.subTest(method=method, path=path, data=data):
+                sync, response = await self.both(method, path, data)
+                self.assertEqual(response.status_code, sync.status_code)
+                if response.status_code == 200 and method == "patch":
+                    expected, actual = sync.json(), response.json()
+                    expected.pop("updated_at"), actual.pop("updated_at")
+                    self.assertEqual(actual, expected)
+                else:
+                    self.assertEqual(response.content, sync.content)
+
+    async def test_writes_keep_history_and_counters(self):
+        with override_settings(TASK_ASYNC_VIEWS=["*"]):
+            created = await self.async_client.post(
+                "/api/tasks/", {"title": "New", "description": "Async", "due_date": (timezone.now() + timedelta(days=1)).isoformat()},
+                content_type="application/json", headers=self.headers,
+            )
+            self.assertEqual(created.status_code, 201)
+            task_id = created.json()["id"]
+            response = await self.async_client.patch(f"/api/tasks/{task_id}/complete/", headers=self.headers)
+            self.assertEqual(response.json()["status"], "completed")
+            response = await self.async_client.delete(f"/api/tasks/{self.plain.pk}/", headers=self.headers)
+            self.assertEqual(response.status_code, 204)
+
+        statuses = await sync_to_async(list)(TaskHistory.objects.filter(task_id=task_id).values_list("status", flat=True))
+        self.assertEqual(statuses, ["completed"])
+        self.assertEqual(await sync_to_async(rebuild_task_counters)(self.user.pk, fix=False), {})
+
+    async def test_rejects_missing_and_bad_credentials(self):
+        with override_settings(TASK_ASYNC_VIEWS=["*"]):
+            response = await AsyncClient().get("/api/tasks/")
+            self.assertEqual(response.status_code, 401)
+            self.assertIn("Bearer", response["WWW-Authenticate"])
+            response = await AsyncClient().get("/api/tasks/", headers={"Authorization": "Bearer nonsense"})
+            self.assertEqual(response.json()["code"], "token_not_valid")
+
+    def test_routes_switch_by_name(self):
+        from django.urls import resolve
+
+        with override_settings(TASK_ASYNC_VIEWS=["task_detail"]):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(f"/api/tasks/{self.plain.pk}/").func))
+            self.assertFalse(asyncio.iscoroutinefunction(resolve("/api/tasks/").func))
+        self.assertFalse(asyncio.iscoroutinefunction(resolve(f"/api/tasks/{self.plain.pk}/").func))
+
+
+class ConcurrencyBenchmarkTest(TransactionTestCase):
+    def test_benchmark_runs_and_cleans_up(self):
+        from .benchmarks import run_benchmark
+
+        result = run_benchmark("concurrency", rows=3, repeat=1, levels=(2, 4), threads=2)
+        self.assertEqual(set(result["clients"][4]), {"wsgi_sync", "asgi_sync", "asgi_async"})
+        for stack in result["clients"][4].values():
+            self.assertEqual(stack["failed"], 0)
+            self.assertGreater(stack["requests_per_s"], 0)
+        self.assertFalse(User.objects.filter(username__startswith="concurrency-").exists())
+
+@override_settings(TASK_RESPONSE_CACHE_ENABLED=False)
+class TaskStatsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="stats", email="stats@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name="Work", user=self.user)
+        self.due_date = timezone.now() + timedelta(days=2)
+
+    def create(self, **data):
+        payload = {"title": "Task", "description": "Stats", "due_date": self.due_date.isoformat(), **data}
+        response = self.client.post("/api/tasks/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def assertCountersConsistent(self):
+        self.assertEqual(rebuild_task_counters(self.user.id, fix=False), {})
+
+    def test_counters_follow_every_write_path(self):
+        first = self.create(priority="high", category_id=self.category.id)
+        second = self.create(recurrence="daily")
+        third = self.create()
+        self.client.patch(f"/api/tasks/{first}/", {"status": "in_progress", "priority": "low"}, format="json")
+        self.client.patch(f"/api/tasks/{third}/", {"status": "in_progress", "category_id": self.category.id}, format="json")
+        self.client.patch(f"/api/tasks/{second}/complete/")
+        self.client.patch(f"/api/tasks/{first}/pending/")
+        self.client.patch("/api/tasks/transition/", {"ids": [first, third], "status": "completed"}, format="json")
+        self.client.post("/api/tasks/batch/", {"operations": [
+            {"op": "create", "data": {"title": "B", "description": "Batch", "due_date": self.due_date.isoformat()}},
+            {"op": "update", "id": third, "data": {"status": "pending"}},
+            {"op": "delete", "id": first},
+        ]}, format="json")
+        self.assertCountersConsistent()
+
+        self.client.delete(f"/api/tasks/{third}/")
+        self.category.delete()
+        Tasks.objects.filter(user=self.user, status="pending").first().delete()
+        self.assertCountersConsistent()
+
+        stats = self.client.get("/api/tasks/stats/").data
+        self.assertEqual(stats["total"], Tasks.objects.filter(user=self.user).count())
+        self.assertEqual(sum(stats["by_status"].values()), stats["total"])
+
+        self.user.delete()
+        self.assertFalse(TaskCounter.objects.exists())
+
+    def test_stats_payload(self):
+        self.create(priority="high", category_id=self.category.id)
+        self.create(priority="high")
+        Tasks.objects.create(
+            title="Late", description="Stats", user=self.user, due_date=timezone.now() - timedelta(days=3)
+        )
+        Tasks.objects.create(
+            title="Late today", description="Stats", user=self.user, due_date=timezone.now() - timedelta(seconds=1)
+        )
+        Tasks.objects.create(
+            title="Done late", description="Stats", user=self.user, status="completed",
+            due_date=timezone.now() - timedelta(days=3),
+        )
+        response = self.client.get("/api/tasks/stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total"], 5)
+        self.assertEqual(response.data["by_status"], {"pending": 4, "in_progress": 0, "completed": 1})
+        self.assertEqual(response.data["by_priority"], {"low": 0, "medium": 3, "high": 2})
+        self.assertEqual(response.data["by_category"], [
+            {"id": None, "name": None, "count": 4},
+            {"id": self.category.id, "name": "Work", "count": 1},
+        ])
+        self.assertEqual(response.data["overdue"], 2)
+
+    def test_stats_cost_does_not_grow_with_tasks(self):
+        self.create(category_id=self.category.id)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get("/api/tasks/stats/")
+        for _ in range(30):
+            self.create(category_id=self.category.id)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get("/api/tasks/stats/")
+        self.assertEqual(len(small), len(large))
+
+    def test_rebuild_command(self):
+        self.create()
+        TaskCounter.objects.filter(user=self.user, dimension="total").update(count=7)
+        TaskCounter.objects.create(user=self.user, dimension="status", key="bogus", count=1)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_task_counters", "--verify", stdout=StringIO())
+        out = StringIO()
+        call_command("rebuild_task_counters", stdout=out)
+        self.assertIn("1 out of sync", out.getvalue())
+        self.assertCountersConsistent()
+        call_command("rebuild_task_counters", "--verify", user=[self.user.id], stdout=StringIO())
+
+
+class ArchiveTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="archiver", email="archiver@example.com", password="pass123")
+        self.friend = User.objects.create_user(username="friend", email="friend@example.com", password="pass123")
+        self.client.force_authenticate(user=self.user)
+        now = timezone.now()
+        self.due_date = now + timedelta(days=3)
+        self.old = Tasks.objects.create(
+            title="Old report", description="Filed long ago", user=self.user, status="completed",
+            due_date=now - timedelta(days=200), completed_at=now - timedelta(days=200),
+        )
+        self.old.collaborators.add(self.friend)
+        TaskHistory.objects.create(task=self.old, user=self.user, status="completed")
+        Notification.objects.create(user=self.user, task=self.old, message="Task 'Old report' is due soon!")
+        self.recent = Tasks.objects.create(
+            title="Recent report", description="Done last week", user=self.user, status="completed",
+            due_date=now - timedelta(days=7), completed_at=now - timedelta(days=7),
+        )
+        self.open = Tasks.objects.create(title="Open report", description="Still to do", user=self.user, due_date=self.due_date)
+
+    def ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [task["id"] for task in response.data["results"]]
+
+    def test_archives_old_completed_tasks_with_related_rows(self):
+        stats = archive_completed_tasks(batch_size=1)
+        self.assertEqual(
+            (stats["tasks"], stats["collaborators"], stats["history"], stats["notifications"]), (1, 1, 1, 1)
+        )
+        self.assertFalse(Tasks.objects.filter(pk=self.old.pk).exists())
+        archived = ArchivedTask.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.created_at, self.old.created_at)
+        self.assertEqual(list(archived.collaborators.all()), [self.friend])
+        self.assertEqual(ArchivedTaskHistory.objects.get().task_id, self.old.pk)
+        self.assertEqual(ArchivedNotification.objects.get().task_id, self.old.pk)
+        self.assertEqual(rebuild_task_counters(self.user.id, fix=False), {})
+        # Re-running finds nothing left to do.
+        self.assertEqual(archive_completed_tasks()["tasks"], 0)
+
+    def test_lists_read_live_tasks_unless_archived_are_included(self):
+        archive_completed_tasks()
+        self.assertEqual(self.ids("/api/tasks/"), [self.recent.pk, self.open.pk])
+        response = self.client.get("/api/tasks/?include_archived=true&count=true")
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual([task["id"] for task in response.data["results"]], [self.old.pk, self.recent.pk, self.open.pk])
+        archived, live = response.data["results"][0], response.data["results"][1]
+        self.assertIsNotNone(archived["archived_at"])
+        self.assertEqual(archived["collaborators"], [self.friend.pk])
+        self.assertIsNone(live["archived_at"])
+
+        self.assertEqual(self.ids("/api/tasks/?include_archived=true&search=filed"), [self.old.pk])
+        self.assertEqual(self.ids("/api/tasks/?include_archived=true&status=pending"), [self.open.pk])
+        self.client.force_authenticate(user=self.friend)
+        self.assertEqual(self.ids("/api/tasks/?scope=shared"), [])
+        self.assertEqual(self.ids("/api/tasks/?scope=shared&include_archived=true"), [self.old.pk])
+
+    def test_include_archived_pages_across_both_tables(self):
+        now = timezone.now()
+        for i in range(8):
+            Tasks.objects.create(
+                title=f"Task {i}", description="Paging", user=self.user, status="completed",
+                due_date=self.due_date + timedelta(hours=i // 3), completed_at=now - timedelta(days=100 + i % 2),
+            )
+        expected = list(Tasks.objects.filter(user=self.user).order_by("-due_date", "-id").values_list("id", flat=True))
+        archive_completed_tasks()
+        self.assertTrue(ArchivedTask.objects.exists())
+
+        ids, url, pages = [], "/api/tasks/?include_archived=true&ordering=-due_date&page_size=3", []
+        while url:
+            response = self.client.get(url)
+            pages.append(response.data)
+            ids.extend(task["id"] for task in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(ids, expected)
+        back = self.client.get(pages[2]["previous"])
+        self.assertEqual(back.data["results"], pages[1]["results"])
+
+    def test_search_includes_archived_matches_on_request(self):
+        archive_completed_tasks()
+        response = self.client.get("/api/tasks/search/", {"q": "report"})
+        self.assertEqual({result["task"]["id"] for result in response.data["results"]}, {self.recent.pk, self.open.pk})
+        response = self.client.get("/api/tasks/search/", {"q": "report", "include_archived": "true"})
+        results = response.data["results"]
+        self.assertEqual([result["task"]["id"] for result in results][-1], self.old.pk)
+        self.assertIsNotNone(results[-1]["task"]["archived_at"])
+        self.assertIn("<mark>report</mark>", results[-1]["highlight"]["title"])
+
+    def test_unarchive_restores_task_and_related_rows(self):
+        created_at = self.old.created_at
+        archive_completed_tasks()
+        self.client.force_authenticate(user=self.friend)
+        self.assertEqual(self.client.post(f"/api/tasks/{self.old.pk}/unarchive/").status_code, 404)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f"/api/tasks/{self.old.pk}/unarchive/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["collaborators"], [self.friend.pk])
+        task = Tasks.objects.get(pk=self.old.pk)
+        self.assertEqual(task.created_at, created_at)
+        self.assertEqual(task.history.count(), 1)
+        self.assertEqual(Notification.objects.filter(task=task).count(), 1)
+        self.assertFalse(ArchivedTask.objects.exists())
+        self.assertEqual(rebuild_task_counters(self.user.id, fix=False), {})
+        self.assertEqual(self.ids("/api/tasks/?search=filed"), [self.old.pk])
+        self.assertEqual(self.client.post(f"/api/tasks/{self.old.pk}/unarchive/").status_code, 404)
+
+    def test_unarchived_task_is_not_archived_again_until_it_ages_out(self):
+        archive_completed_tasks()
+        self.client.post(f"/api/tasks/{self.old.pk}/unarchive/")
+        self.assertIsNotNone(Tasks.objects.get(pk=self.old.pk).unarchived_at)
+        self.assertEqual(archive_completed_tasks()["tasks"], 0)
+        self.assertTrue(Tasks.objects.filter(pk=self.old.pk).exists())
+
+        later = timezone.now() + timedelta(days=91)
+        self.assertEqual(archive_completed_tasks(now=later)["tasks"], 2)
+        self.assertTrue(ArchivedTask.objects.filter(pk=self.old.pk).exists())
+
+    def test_recurrence_links_survive_a_round_trip(self):
+        series = Tasks.objects.create(
+            title="Standup", description="Daily", user=self.user, due_date=self.due_date, recurrence="daily"
+        )
+        self.client.patch(f"/api/tasks/{series.pk}/complete/")
+        successor = Tasks.objects.get(previous_occurrence=series)
+        archive_tasks([series.pk])
+        successor.refresh_from_db()
+        self.assertIsNone(successor.previous_occurrence_id)
+        self.assertEqual(ArchivedTask.objects.get(pk=series.pk).next_occurrence_id, successor.pk)
+
+        self.client.post(f"/api/tasks/{series.pk}/unarchive/")
+        successor.refresh_from_db()
+        self.assertEqual(successor.previous_occurrence_id, series.pk)
+
+    def test_command_uses_age_option(self):
+        out = StringIO()
+        call_command("archive_tasks", "--older-than-days", "5", stdout=out)
+        self.assertIn("Archived 2 tasks", out.getvalue())
+        self.assertEqual(list(Tasks.objects.values_list("pk", flat=True)), [self.open.pk])
+
+
+class RetentionPurgeTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="keeper", email="keeper@example.com", password="pass123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass123")
+        self.now = timezone.now()
+        self.task = Tasks.objects.create(
+            title="Report", description="Quarterly", user=self.user, due_date=self.now + timedelta(days=30)
+        )
+
+    def history(self, user, days_ago, count=1):
+        rows = TaskHistory.objects.bulk_create([
+            TaskHistory(task=self.task, user=user, status="in_progress") for _ in range(count)
+        ])
+        TaskHistory.objects.filter(pk__in=[row.pk for row in rows]).update(changed_at=self.now - timedelta(days=days_ago))
+        return rows
+
+    def notification(self, days_ago, is_read):
+        notification = Notification.objects.create(user=self.user, task=self.task, message="Due soon", is_read=is_read)
+        Notification.objects.filter(pk=notification.pk).update(created_at=self.now - timedelta(days=days_ago))
+        return notification
+
+    def test_purges_rows_past_max_age_in_chunks(self):
+        self.history(self.user, 400, count=5)
+        kept = self.history(self.user, 10, count=2)
+        stats = purge_retention([RetentionPolicy("history", max_age=timedelta(days=365))], now=self.now, chunk_size=2)
+        self.assertEqual((stats["history"]["age"], stats["deleted"], stats["chunks"]), (5, 5, 3))
+        self.assertTrue(stats["complete"])
+        self.assertEqual(set(TaskHistory.objects.values_list("pk", flat=True)), {row.pk for row in kept})
+        self.assertFalse(SweepState.objects.exists())
+
+    def test_keeps_each_users_newest_rows(self):
+        oldest = self.history(self.user, 5, count=3)
+        newest = self.history(self.user, 1, count=2)
+        others = self.history(self.other, 5, count=3)
+        stats = purge_retention([RetentionPolicy("history", max_rows_per_user=3)], now=self.now, chunk_size=1)
+        self.assertEqual(stats["history"]["per_user"], 2)
+        self.assertEqual(
+            set(TaskHistory.objects.values_list("pk", flat=True)),
+            {oldest[2].pk, *(row.pk for row in newest), *(row.pk for row in others)},
+        )
+
+    def test_keeps_unread_notifications(self):
+        unread = self.notification(200, is_read=False)
+        self.notification(200, is_read=True)
+        recent = self.notification(1, is_read=True)
+        policy = RetentionPolicy("notifications", max_age=timedelta(days=90), max_rows_per_user=1, keep_unread=True)
+        stats = purge_retention([policy], now=self.now)
+        self.assertEqual(stats["notifications"], {"age": 1, "per_user": 0})
+        self.assertEqual(set(Notification.objects.values_list("pk", flat=True)), {unread.pk, recent.pk})
+
+    def test_stopped_run_resumes_from_saved_position(self):
+        self.history(self.user, 400, count=4)
+        policies = [RetentionPolicy("history", max_age=timedelta(days=365))]
+        stats = purge_retention(policies, now=self.now, chunk_size=1, max_seconds=0)
+        self.assertEqual((stats["deleted"], stats["complete"]), (1, False))
+        state = SweepState.objects.get(name="retention:history:age")
+        self.assertEqual(state.position, TaskHistory.objects.order_by("pk").first().pk - 1)
+
+        # A later run keeps the first run's cutoff and carries on after its position.
+        stats = purge_retention(policies, now=self.now + timedelta(days=1), chunk_size=1)
+        self.assertEqual((stats["deleted"], stats["complete"]), (3, True))
+        self.assertFalse(TaskHistory.objects.exists())
+        self.assertFalse(SweepState.objects.exists())
+
+    @override_settings(TASK_RETENTION={"history": {"max_age_days": 30}, "notifications": {"max_age_days": 30}})
+    def test_command_uses_settings_and_reports_rows(self):
+        self.history(self.user, 60, count=2)
+        self.notification(60, is_read=False)
+        out = StringIO()
+        call_command("purge_retention", "--chunk-size", "10", stdout=out)
+        self.assertIn("Purged 3 rows in 2 chunks", out.getvalue())
+        self.assertIn("history: 2 past max age, 0 over the per-user limit", out.getvalue())
+        self.assertFalse(TaskHistory.objects.exists() or Notification.objects.exists())
+
+
+class RetentionBenchmarkTest(TransactionTestCase):
+    """
+    A smoke check on 20k rows. The multi-million-row measurement is the
+    benchmark run from the command line (`benchmark retention --rows 3000000`).
+    """
+    def test_benchmark_purges_while_reads_succeed(self):
+        from .benchmarks import run_benchmark
+
+        bystander = User.objects.create_user(username="bystander", email="by@example.com", password="pass123")
+        task = Tasks.objects.create(title="Old", description="Kept", user=bystander, due_date=timezone.now() + timedelta(days=30))
+        TaskHistory.objects.create(task=task, user=bystander, status="completed")
+        TaskHistory.objects.update(changed_at=timezone.now() - timedelta(days=1000))
+
+        result = run_benchmark("retention", rows=20_000, repeat=5, users=10, chunk_size=1000)
+        self.assertEqual(result["rows"], {"history": 20_000, "notifications": 20_000})
+        self.assertEqual(result["remaining"]["history"], 2_000)
+        self.assertGreater(result["purge"]["rows_per_s"], 1_000)
+        self.assertGreater(result["reads_during"]["requests"], 0)
+        self.assertEqual(result["reads_during"]["failed"], 0)
+        self.assertLess(result["reads_during"]["p50_ms"], 1_000)
+        self.assertFalse(User.objects.filter(username__startswith="retention-").exists())
+        self.assertEqual(list(TaskHistory.objects.values_list("user", flat=True)), [bystander.pk])
+        self.assertFalse(SweepState.objects.exists())
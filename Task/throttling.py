@@ -0,0 +1,182 @@
+"""
+Rate throttles that keep one number per client instead of a request log.
+
+DRF's SimpleRateThrottle caches the timestamp of every request inside the
+window and unpickles, trims and re-pickles that list on each call. These
+throttles use GCRA (the generic cell rate algorithm, a token bucket
+expressed as a single "theoretical arrival time"): a rate of N/period lets
+a client spend up to N requests at once, then refills one every period/N
+seconds. The state per client is a single float, and each check is one
+atomic read-modify-write in the configured store:
+
+    tat = max(stored tat or now, now) + period / N
+    allow if tat - now <= period, and then store tat
+
+(with half an interval of slack in the comparison, so float rounding at
+epoch-sized timestamps never costs the last request of a burst).
+
+TASK_THROTTLE_STORE picks the store. CacheStore keeps the buckets in a
+Django cache, so with a Redis, Memcached or database cache every worker on
+every host shares one limit. LocalStore lives in the worker process. Left
+unset, it is CacheStore when that cache is shared and LocalStore when it is
+LocMemCache or DummyCache, which would only add claim keys to a per-process
+cache. SQLiteStore keeps the buckets in a SQLite file shared by the
+workers on one host; the tests use it to stand in for a shared backend.
+"""
+import math
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework import throttling
+
+from .cache import is_shared_cache
+
+
+class LocalStore:
+    """Buckets in this process only, least recently used dropped past max_entries."""
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, now, interval, period):
+        """Take one request from `key`'s bucket; returns 0 or the seconds to wait."""
+        with self._lock:
+            tat = max(self._buckets.get(key, now), now) + interval
+            if tat - now > period + interval / 2:
+                return tat - now - period
+            self._buckets[key] = tat
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+            return 0
+
+
+class SQLiteStore:
+    """
+    Buckets in a SQLite file shared by every process that opens it. A check
+    is a single INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement, so
+    it is atomic across processes without an explicit lock.
+    """
+    PURGE_EVERY = 10_000
+
+    def __init__(self, path, timeout=5):
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._calls = 0
+        db = self._connect()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS throttle_buckets (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID")
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def acquire(self, key, now, interval, period):
+        db = self._connect()
+        row = db.execute(
+            "INSERT INTO throttle_buckets (key, tat) VALUES (:key, :now + :interval) "
+            "ON CONFLICT (key) DO UPDATE SET tat = max(tat, :now) + :interval "
+            "WHERE max(tat, :now) + :interval - :now <= :period + :interval / 2 "
+            "RETURNING tat",
+            {"key": key, "now": now, "interval": interval, "period": period},
+        ).fetchone()
+        self._calls += 1
+        if self._calls % self.PURGE_EVERY == 0:
+            # Buckets whose arrival time has passed are as good as empty.
+            db.execute("DELETE FROM throttle_buckets WHERE tat < ?", (now,))
+        if row is not None:
+            return 0
+        (tat,) = db.execute("SELECT tat FROM throttle_buckets WHERE key = ?", (key,)).fetchone()
+        return max(tat, now) + interval - now - period
+
+
+class CacheStore:
+    """
+    Buckets in the Django cache `alias`. The cache API has no compare-and-
+    swap, so updates are serialized with add(), which is atomic on every
+    backend: a new bucket is created with add(), and an existing one is only
+    written by the caller that first add()s a claim on the value it read.
+    The others read again. A bucket expires once its arrival time has
+    passed, when it is as good as empty.
+    """
+    CLAIM_TIMEOUT = 10
+    RETRIES = 20
+
+    def __init__(self, alias="default", prefix="gcra"):
+        self.alias = alias
+        self.prefix = prefix
+
+    def acquire(self, key, now, interval, period):
+        cache = caches[self.alias]
+        key = f"{self.prefix}:{key}"
+        for _ in range(self.RETRIES):
+            stored = cache.get(key)
+            tat = max(now if stored is None else stored, now) + interval
+            if tat - now > period + interval / 2:
+                return tat - now - period
+            timeout = math.ceil(tat - now) + 1
+            if stored is None:
+                if cache.add(key, tat, timeout=timeout):
+                    return 0
+            elif cache.add(f"{key}:{stored!r}", 1, timeout=self.CLAIM_TIMEOUT):
+                cache.set(key, tat, timeout=timeout)
+                return 0
+        # Lost every race for this bucket: too many requests at once anyway.
+        return interval
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    path = getattr(settings, "TASK_THROTTLE_STORE", None)
+    options = getattr(settings, "TASK_THROTTLE_STORE_OPTIONS", {})
+    if path is None:
+        if not is_shared_cache(caches[options.get("alias", "default")]):
+            return LocalStore()
+        path = "Task.throttling.CacheStore"
+    return import_string(path)(**options)
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    if setting.startswith("TASK_THROTTLE_") or setting == "CACHES":
+        get_store.cache_clear()
+
+
+class GCRAThrottleMixin:
+    """
+    Replaces SimpleRateThrottle's request log with a GCRA bucket. Rates,
+    scopes and cache keys work exactly as in the DRF class it is mixed into.
+    """
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.delay = get_store().acquire(self.key, self.timer(), self.duration / self.num_requests, self.duration)
+        return not self.delay
+
+    def wait(self):
+        return self.delay or None
+
+
+class UserRateThrottle(GCRAThrottleMixin, throttling.UserRateThrottle):
+    pass
+
+
+class AnonRateThrottle(GCRAThrottleMixin, throttling.AnonRateThrottle):
+    pass
@@ -2,8 +2,14 @@ from django.urls import path
 from .views import (TaskListCreateView, TaskDetailView, UserListCreateView, UserSignUpView, 
                     UserDetailView, mark_task_in_progress, mark_task_pending, mark_task_complete,
                     CategoryListCreateView, TaskHistoryListView, add_collaborator,remove_collaborator,
-                    CollaboratorListView, NotificationListView
+                    CollaboratorListView, NotificationListView, batch_tasks,
+                    bulk_transition_tasks, TaskSearchView, TaskExportView, response_cache_stats,
+                    TaskOccurrencesView, task_statistics, notification_unread_count,
+                    mark_notifications_read, task_import, MetricsView, unarchive_task,
+                    notification_stream_ticket
                     )
+from .async_views import (AsyncTaskDetailView, AsyncTaskListCreateView, AsyncTaskTransitionView,
+                          task_path)
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenBlacklistView
 
 urlpatterns = [
@@ -11,12 +17,23 @@ urlpatterns = [
     path('users/', UserListCreateView.as_view(), name='user_list_create'),
     path('users/<int:pk>/', UserDetailView.as_view(), name='user_detail'),
     # Task endpoints
-    path('tasks/', TaskListCreateView.as_view(), name='task_list_create'),
-    path('tasks/<int:pk>/', TaskDetailView.as_view(), name='task_detail'),
+    task_path('tasks/', TaskListCreateView.as_view(), AsyncTaskListCreateView.as_view(), name='task_list_create'),
+    task_path('tasks/<int:pk>/', TaskDetailView.as_view(), AsyncTaskDetailView.as_view(), name='task_detail'),
+    path('tasks/batch/', batch_tasks, name='task-batch'),
+    path('tasks/search/', TaskSearchView.as_view(), name='task-search'),
+    path('tasks/export/', TaskExportView.as_view(), name='task-export'),
+    path('tasks/import/', task_import, name='task-import'),
+    path('tasks/occurrences/', TaskOccurrencesView.as_view(), name='task-occurrences'),
+    path('tasks/stats/', task_statistics, name='task-stats'),
     # Task status transition endpoints
-    path('tasks/<int:pk>/pending/', mark_task_pending, name='task-pending'),
-    path('tasks/<int:pk>/in-progress/', mark_task_in_progress, name='task-in-progress'),
-    path('tasks/<int:pk>/complete/', mark_task_complete, name='task-complete'),
+    task_path('tasks/<int:pk>/pending/', mark_task_pending,
+              AsyncTaskTransitionView.as_view(target='pending'), name='task-pending'),
+    task_path('tasks/<int:pk>/in-progress/', mark_task_in_progress,
+              AsyncTaskTransitionView.as_view(target='in_progress', not_found='Task not found'), name='task-in-progress'),
+    task_path('tasks/<int:pk>/complete/', mark_task_complete,
+              AsyncTaskTransitionView.as_view(target='completed'), name='task-complete'),
+    path('tasks/transition/', bulk_transition_tasks, name='task-bulk-transition'),
+    path('tasks/<int:pk>/unarchive/', unarchive_task, name='task-unarchive'),
      # Signup
     path("signup/", UserSignUpView.as_view(), name="user-signup"),
     # JWT login & refresh
@@ -33,5 +50,12 @@ urlpatterns = [
     path("tasks/<int:pk>/remove-collaborator/", remove_collaborator, name="remove-collaborator"),
     path("tasks/<int:pk>/collaborators/", CollaboratorListView.as_view(), name="list-collaborators"),
     # Notification endpoint
-    path("notifications/", NotificationListView.as_view(), name="notification-list")
+    path("notifications/", NotificationListView.as_view(), name="notification-list"),
+    path("notifications/unread-count/", notification_unread_count, name="notification-unread-count"),
+    path("notifications/mark-read/", mark_notifications_read, name="notification-mark-read"),
+    path("notifications/stream/ticket/", notification_stream_ticket, name="notification-stream-ticket"),
+    # Response cache counters (admin only)
+    path("cache/stats/", response_cache_stats, name="response-cache-stats"),
+    # Prometheus scrape endpoint (admin only)
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
\ No newline at end of file
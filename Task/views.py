@@ -4,17 +4,32 @@ from rest_framework.permissions import IsAuthenticated, BasePermission, IsAdminU
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
-from django.http import HttpResponse
-from rest_framework import generics
-from .models import Tasks, Category, TaskHistory, Notification
+from django.http import HttpResponse, Http404, StreamingHttpResponse
+from rest_framework import generics, serializers
+from .models import Tasks, Category, TaskHistory, Notification, ArchivedTask
 from .serializers import (
-    TaskSerializer, UserSerializer, UserRegistrationSerializer, CategorySerializer, 
-    TaskHistorySerializer, NotificationSerializer
+    TaskSerializer, UserSerializer, UserRegistrationSerializer, CategorySerializer, ArchivedTaskSerializer,
+    TaskHistorySerializer, NotificationSerializer, TaskBatchSerializer, TaskBulkTransitionSerializer,
+    TaskOccurrenceQuerySerializer, NotificationMarkReadSerializer, TaskImportSerializer
 )
+from .services import (
+    apply_task_batch, bulk_transition, expand_occurrences, task_stats,
+    unread_notification_count, read_notifications,
+)
+from .search import FullTextSearchFilter, IContainsSearchBackend, get_search_backend, tokenize
+from .cache import CachedListMixin, stats as cache_stats
+from .fastpath import FastListMixin
+from .archive import ArchivedListMixin, include_archived, unarchive_tasks
+from .export import STREAMS, CSVRenderer, NDJSONRenderer
+from .metrics import PrometheusRenderer, render_metrics
+from .imports import import_tasks
+from .events import TICKET_TTL, issue_stream_ticket
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.filters import OrderingFilter
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
-from rest_framework.throttling import UserRateThrottle
+from rest_framework.exceptions import ValidationError
 
 # Create your views here.
 User = get_user_model()
@@ -26,11 +41,11 @@ def home(request):
 @permission_classes([IsAuthenticated])
 def mark_task_pending(request,pk):
     try:
-        task = Tasks.objects.get(pk=pk, user=request.user)
+        task = Tasks.objects.with_related().get(pk=pk, user=request.user)
     except Tasks.DoesNotExist:
         return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = TaskSerializer(task, data={"status": "pending"}, partial=True)
+    serializer = TaskSerializer(task, data={"status": "pending"}, partial=True, context={"request": request})
     if serializer.is_valid():
         serializer.save()
         return Response(serializer.data)
@@ -40,11 +55,11 @@ def mark_task_pending(request,pk):
 @permission_classes([IsAuthenticated])
 def mark_task_in_progress(request, pk):
     try:
-        task = Tasks.objects.get(pk=pk, user=request.user)
+        task = Tasks.objects.with_related().get(pk=pk, user=request.user)
     except Tasks.DoesNotExist:
         return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = TaskSerializer(task, data={"status": "in_progress"}, partial=True)
+    serializer = TaskSerializer(task, data={"status": "in_progress"}, partial=True, context={"request": request})
     if serializer.is_valid():
         serializer.save()
         return Response(serializer.data)
@@ -54,16 +69,74 @@ def mark_task_in_progress(request, pk):
 @permission_classes([IsAuthenticated])
 def mark_task_complete(request,pk):
     try:
-        task = Tasks.objects.get(pk=pk, user=request.user)
+        task = Tasks.objects.with_related().get(pk=pk, user=request.user)
     except Tasks.DoesNotExist:
         return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = TaskSerializer(task, data={"status": "completed"}, partial=True)
+    serializer = TaskSerializer(task, data={"status": "completed"}, partial=True, context={"request": request})
     if serializer.is_valid():
         serializer.save()
         return Response(serializer.data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(["PATCH"])
+@permission_classes([IsAuthenticated])
+def bulk_transition_tasks(request):
+    serializer = TaskBulkTransitionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    target = serializer.validated_data["status"]
+    updated, skipped = bulk_transition(request.user, serializer.validated_data["ids"], target)
+    return Response({"status": target, "updated": updated, "skipped": skipped})
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def batch_tasks(request):
+    serializer = TaskBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    atomic = serializer.validated_data["atomic"]
+    results, applied = apply_task_batch(request, serializer.validated_data["operations"], atomic=atomic)
+    if not applied:
+        response_status = status.HTTP_400_BAD_REQUEST
+    elif any(result["status"] >= 400 for result in results):
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_200_OK
+    return Response({"atomic": atomic, "applied": applied, "results": results}, status=response_status)
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def task_import(request):
+    """
+    Create tasks from an uploaded CSV or NDJSON file (multipart `file`).
+    Invalid records are skipped and listed in the report; `dry_run` only
+    validates, reporting the tasks that would be created as `valid`.
+    """
+    serializer = TaskImportSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    upload = serializer.validated_data["file"]
+    report = import_tasks(
+        request.user,
+        upload.open("rb").file,
+        serializer.validated_data["format"],
+        dry_run=serializer.validated_data["dry_run"],
+        context={"request": request},
+    )
+    response_status = status.HTTP_207_MULTI_STATUS if report["failed"] else status.HTTP_200_OK
+    return Response(report, status=response_status)
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def unarchive_task(request, pk):
+    """Move one of your archived tasks back to the live task list."""
+    if not unarchive_tasks([pk], user=request.user):
+        return Response({"error": "Archived task not found."}, status=status.HTTP_404_NOT_FOUND)
+    task = Tasks.objects.with_related().get(pk=pk)
+    return Response(TaskSerializer(task, context={"request": request}).data)
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def add_collaborator(request, pk):
@@ -108,6 +181,7 @@ class UserListCreateView(generics.ListCreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    ordering = ['date_joined']
 
 class IsOwnerOrAdmin(BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -125,50 +199,178 @@ class IsOwner(BasePermission):
     
 class IsOwnerOrCollaborator(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return (
-            obj.user == request.user or
-            request.user in obj.collaborators.all() or
-            request.user.is_staff
-        )
+        if obj.user_id == request.user.id or request.user.is_staff:
+            return True
+        return is_collaborator(request, obj)
+
+def is_collaborator(request, task):
+    """
+    Single indexed EXISTS on the collaborator table, remembered for the rest
+    of the request so repeated get_object() calls don't re-check.
+    """
+    cache = request.__dict__.setdefault("_collaborator_checks", {})
+    if task.pk not in cache:
+        prefetched = getattr(task, "_prefetched_objects_cache", {}).get("collaborators")
+        if prefetched is not None:
+            cache[task.pk] = any(user.pk == request.user.id for user in prefetched)
+        else:
+            cache[task.pk] = task.collaborators.filter(pk=request.user.id).exists()
+    return cache[task.pk]
 
 # Create & List Tasks 
-class TaskListCreateView(generics.ListCreateAPIView):
-    throttle_classes = [UserRateThrottle]
+TASK_SCOPES = ("owned", "shared", "all")
+
+def task_scope(request):
+    scope = request.query_params.get("scope", "owned")
+    if scope not in TASK_SCOPES:
+        raise ValidationError({"scope": f"Must be one of: {', '.join(TASK_SCOPES)}."})
+    return scope
+
+class TaskListCreateView(CachedListMixin, ArchivedListMixin, FastListMixin, generics.ListCreateAPIView):
     queryset = Tasks.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['status', 'priority', 'due_date']
     ordering_fields = ['due_date', 'priority', 'created_at']
+    ordering = ['due_date']
     search_fields = ['title', 'description']
 
     def get_queryset(self):  
-        return Tasks.objects.filter(user=self.request.user)
+        return Tasks.objects.visible_to(self.request.user, task_scope(self.request)).with_related()
+
+    def get_archived_queryset(self):
+        return ArchivedTask.objects.visible_to(self.request.user, task_scope(self.request))
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+class TaskSearchView(generics.GenericAPIView):
+    """
+    Ranked full-text search with highlighted snippets. `prefix` (default on)
+    treats the last word as a prefix for type-ahead. With `include_archived`,
+    archived tasks (matched with icontains) fill up the results after the
+    live ones, and every task carries archived_at.
+    """
+    serializer_class = TaskSerializer
+    permission_classes = [IsAuthenticated]
+    max_limit = 100
+
+    def get(self, request):
+        text = request.query_params.get("q", "")
+        scope = task_scope(request)
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), self.max_limit)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        prefix = request.query_params.get("prefix", "true").lower() not in ("0", "false", "no")
+
+        scoped = Tasks.objects.visible_to(request.user, scope)
+        backend = get_search_backend(scoped.db)
+        hits = backend.ranked(scoped, text, prefix=prefix, limit=limit)
+        tasks = Tasks.objects.with_related().in_bulk([hit[0] for hit in hits])
+        results = [
+            {
+                "rank": rank,
+                "highlight": {"title": title, "description": description},
+                "task": TaskSerializer(tasks[pk]).data,
+            }
+            for pk, rank, title, description in hits
+            if pk in tasks
+        ]
+        if include_archived(request):
+            for result in results:
+                result["task"]["archived_at"] = None
+            if len(results) < limit and tokenize(text):
+                archived = ArchivedTask.objects.visible_to(request.user, scope)
+                hits = IContainsSearchBackend().ranked(archived, text, prefix=prefix, limit=limit - len(results))
+                tasks = archived.with_related().in_bulk([hit[0] for hit in hits])
+                results.extend(
+                    {
+                        "rank": rank,
+                        "highlight": {"title": title, "description": description},
+                        "task": ArchivedTaskSerializer(tasks[pk]).data,
+                    }
+                    for pk, rank, title, description in hits
+                )
+        return Response({"backend": backend.name, "results": results})
+
+
+class JSONErrorsMixin:
+    """
+    For views rendering a non-JSON format: their error responses
+    (authentication, permissions, throttling, bad filters) are still JSON.
+    """
+    def finalize_response(self, request, response, *args, **kwargs):
+        if isinstance(response, Response):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class TaskExportView(JSONErrorsMixin, generics.GenericAPIView):
+    """
+    Every matching task as CSV or NDJSON (`?format=csv|ndjson`, CSV by
+    default), streamed in chunks. Takes the same scope, filter and ordering
+    parameters as the task list.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = TaskListCreateView.filterset_fields
+    ordering_fields = TaskListCreateView.ordering_fields
+    ordering = ['id']
+    get_queryset = TaskListCreateView.get_queryset
+
+    def get(self, request):
+        export_format = request.accepted_renderer.format
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            STREAMS[export_format](queryset),
+            content_type=f"{request.accepted_renderer.media_type}; charset=utf-8",
+        )
+        response["Content-Disposition"] = f'attachment; filename="tasks.{export_format}"'
+        return response
+
+
+class TaskOccurrencesView(generics.GenericAPIView):
+    """
+    Calendar view of tasks due between `start` and `end`: stored tasks plus
+    the upcoming occurrences of recurring ones ("virtual": true), which are
+    computed on request and not saved.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = TaskOccurrenceQuerySerializer
+
+    def get(self, request):
+        query = self.get_serializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        scoped = Tasks.objects.visible_to(request.user, params["scope"])
+        occurrences = list(expand_occurrences(scoped, params["start"], params["end"], limit=params["limit"] + 1))
+        truncated = len(occurrences) > params["limit"]
+        date_field = serializers.DateTimeField()
+        for occurrence in occurrences:
+            occurrence["due_date"] = date_field.to_representation(occurrence["due_date"])
+        return Response({
+            "start": date_field.to_representation(params["start"]),
+            "end": date_field.to_representation(params["end"]),
+            "truncated": truncated,
+            "results": occurrences[:params["limit"]],
+        })
+
 # Retrieve, Update & Delete Task
 class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Tasks.objects.all()
+    queryset = Tasks.objects.with_related()
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrCollaborator]
 
-    def perform_update(self, serializer):
-        old_status = self.get_object().status
-        instance = serializer.save()
-        new_status = instance.status
-
-        if old_status != new_status:
-            TaskHistory.objects.create(
-                task=instance,
-                user=self.request.user,
-                status=new_status
-            )
-
-class CategoryListCreateView(generics.ListCreateAPIView):
+class CategoryListCreateView(CachedListMixin, generics.ListCreateAPIView):
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
+    # Categories are a short per-user list, so keep the plain array response.
+    pagination_class = None
 
     def get_queryset(self):
         return Category.objects.filter(user=self.request.user)
@@ -179,29 +381,72 @@ class CategoryListCreateView(generics.ListCreateAPIView):
 class TaskHistoryListView(generics.ListAPIView):
     serializer_class = TaskHistorySerializer
     permission_classes = [IsAuthenticated]
+    ordering = ['-changed_at']
 
     def get_queryset(self):
         return TaskHistory.objects.filter(user=self.request.user)
     
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(CachedListMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['is_read']
+    ordering = ['-created_at']
 
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def notification_unread_count(request):
+    return Response(unread_notification_count(request.user))
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def mark_notifications_read(request):
+    serializer = NotificationMarkReadSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    updated = read_notifications(request.user, **serializer.validated_data)
+    return Response({"updated": updated, **unread_notification_count(request.user)})
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def notification_stream_ticket(request):
+    # For EventSource, which can't send the Authorization header: open
+    # /api/notifications/stream/?ticket=... within expires_in seconds.
+    return Response({"ticket": issue_stream_ticket(request.user), "expires_in": TICKET_TTL}, status=status.HTTP_201_CREATED)
     
 class CollaboratorListView(generics.RetrieveAPIView):
+    queryset = Tasks.objects.prefetch_related("collaborators")
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrCollaborator]
 
     def get(self, request, pk):
         try:
-            task = Tasks.objects.get(pk=pk)
-        except Tasks.DoesNotExist:
+            task = self.get_object()
+        except Http404:
             return Response({"error": "Task not found."}, status=404)
 
-        collaborators = task.collaborators.all()
-        serializer = UserSerializer(collaborators, many=True)
+        serializer = UserSerializer(task.collaborators.all(), many=True)
         return Response(serializer.data)
 
-    
\ No newline at end of file
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def task_statistics(request):
+    return Response(task_stats(request.user))
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def response_cache_stats(request):
+    return Response(cache_stats.snapshot())
+
+class MetricsView(JSONErrorsMixin, APIView):
+    """Request metrics of every worker in Prometheus text format (admin only)."""
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+    throttle_classes = []
+
+    def get(self, request):
+        return HttpResponse(render_metrics(), content_type=PrometheusRenderer.content_type)
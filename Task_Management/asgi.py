@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Task_Management.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up. Notification streams are served outside
+# the Django handler; see Task/events.py.
+from Task.events import EventStreamApp  # noqa: E402
+
+application = EventStreamApp(django_application)
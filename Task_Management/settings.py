@@ -48,8 +48,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "Task.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "Task.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -80,19 +81,21 @@ WSGI_APPLICATION = "Task_Management.wsgi.application"
 # Django REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "Task.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.UserRateThrottle",
-        "rest_framework.throttling.AnonRateThrottle",
+        "Task.throttling.UserRateThrottle",
+        "Task.throttling.AnonRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "user": "1000/day",
         "anon": "100/day",
     },
+    "DEFAULT_PAGINATION_CLASS": "Task.pagination.KeysetPagination",
+    "PAGE_SIZE": 50,
 }
 
 # JWT settings
@@ -108,6 +111,54 @@ DATABASES = {
     "default": env.db("DATABASE_URL", default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}")
 }
 
+# Caches. "responses" backs the per-user list response cache (Task/cache.py)
+# and the JWT user versions; LocMemCache evicts least-recently-used entries
+# past MAX_ENTRIES. With more than one worker point it at a shared backend
+# (Redis, Memcached, database).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "task-responses",
+        "OPTIONS": {"MAX_ENTRIES": 5000, "CULL_FREQUENCY": 10},
+    },
+}
+TASK_RESPONSE_CACHE = "responses"
+TASK_RESPONSE_CACHE_ENABLED = env.bool("TASK_RESPONSE_CACHE_ENABLED", default=True)
+TASK_RESPONSE_CACHE_TIMEOUT = 300
+
+# Serve GET /api/tasks/ through the values_list fast path (Task/fastpath.py).
+TASK_FAST_LIST = env.bool("TASK_FAST_LIST", default=True)
+
+# Rows read and encoded per chunk by GET /api/tasks/export/.
+TASK_EXPORT_CHUNK_SIZE = 2000
+
+# Records validated and inserted per transaction by task imports.
+TASK_IMPORT_CHUNK_SIZE = 1000
+
+# URL names of the task endpoints to serve with the async views in
+# Task/async_views.py, or "*" for all of them. Only useful under asgi.py.
+TASK_ASYNC_VIEWS = env.list("TASK_ASYNC_VIEWS", default=[])
+
+# Per-route request metrics served at /api/metrics (Task/metrics.py). With
+# several worker processes, point this at a directory they share (emptied
+# on deploy) so a scrape adds up every worker's counters.
+TASK_METRICS_DIR = env("TASK_METRICS_DIR", default=None)
+
+# Completed tasks move to the archive tables (Task/archive.py) this many days
+# after completion, when `manage.py archive_tasks` (run periodically) runs.
+TASK_ARCHIVE_AFTER_DAYS = env.int("TASK_ARCHIVE_AFTER_DAYS", default=90)
+
+# How long task history rows and notifications are kept (Task/retention.py),
+# enforced by `manage.py purge_retention` run periodically. Leave a key out
+# (or set it to None) for no limit.
+TASK_RETENTION = {
+    "history": {"max_age_days": 365, "max_rows_per_user": 10_000},
+    "notifications": {"max_age_days": 90, "max_rows_per_user": 1_000, "keep_unread": True},
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -133,6 +184,42 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Custom user model
 AUTH_USER_MODEL = "Task.CustomUser"
 
+# Due-soon notifications: the post_save signal is a fast path for tasks saved
+# into the 24h window; `manage.py sweep_due_soon` (run periodically) catches the
+# rest, including tasks saved into a window it already swept, so the signal can
+# be turned off.
+TASK_DUE_SOON_SIGNAL = env.bool("TASK_DUE_SOON_SIGNAL", default=True)
+
+# Full-text task search: "auto" uses SQLite FTS5 or Postgres tsvector when
+# available, otherwise "icontains".
+TASK_SEARCH_BACKEND = env("TASK_SEARCH_BACKEND", default="auto")
+
+# JWT users are resolved from a per-process cache (Task/authentication.py).
+# Saving or deleting a user invalidates it through versions kept in
+# TASK_RESPONSE_CACHE, which only other workers see if that backend is shared,
+# so None (the default) turns it on only then. True forces it on, which is
+# only safe with a single worker process.
+TASK_AUTH_USER_CACHE = env.bool("TASK_AUTH_USER_CACHE", default=None)
+TASK_AUTH_USER_CACHE_TTL = 60
+TASK_AUTH_USER_CACHE_SIZE = 1024
+
+# Throttle buckets (Task/throttling.py). "Task.throttling.CacheStore" keeps
+# them in a Django cache ({"alias": "default"} by default) so every worker and
+# host shares one limit; "Task.throttling.LocalStore" keeps them in the worker
+# process. Unset, CacheStore is used once that cache is shared (Redis,
+# Memcached, database) and LocalStore while it is the LocMemCache above.
+TASK_THROTTLE_STORE = env("TASK_THROTTLE_STORE", default=None)
+TASK_THROTTLE_STORE_OPTIONS = env.json("TASK_THROTTLE_STORE_OPTIONS", default={})
+
+# Server-sent notification events (Task/events.py, served under ASGI only).
+# LocalHub reaches the streams held by the publishing worker; with several
+# worker processes on one host use "Task.events.SQLiteHub" with options like
+# {"path": "/tmp/task-events.sqlite3"}.
+TASK_EVENT_HUB = env("TASK_EVENT_HUB", default="Task.events.LocalHub")
+TASK_EVENT_HUB_OPTIONS = env.json("TASK_EVENT_HUB_OPTIONS", default={})
+TASK_EVENT_HEARTBEAT = env.int("TASK_EVENT_HEARTBEAT", default=15)
+TASK_EVENT_QUEUE_SIZE = 64
+
 # Email settings
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = env("EMAIL_HOST", default="")